@@ -1,27 +1,34 @@
-from fastapi import APIRouter, HTTPException
-from typing import List
+from fastapi import APIRouter, HTTPException, Query
+from typing import List, Optional
 
-from backend.app.db.crud import get_all_sessions,get_messages_by_session,get_documents_by_session
+from backend.app.db.crud import get_sessions_page,get_messages_page,get_documents_by_session
+from backend.app.db.crud import PAGE_SIZE, MAX_PAGE_SIZE
 from backend.app.db.crud import delete_session,delete_message,delete_document
+from backend.app.db.faiss_instance import remove_document_vectors,remove_session_vectors
 
 
 router = APIRouter()
 
-# List all sessions
+# List sessions, newest first, one page at a time
 @router.get("/admin/sessions")
-async def list_sessions():
+async def list_sessions(limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), before: Optional[str] = None):
     try:
-        sessions = await get_all_sessions()
-        return {"sessions": sessions}
+        sessions, next_cursor = await get_sessions_page(limit=limit, before=before)
+        return {"sessions": sessions, "next_cursor": next_cursor}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-# List messages for a session
+# List messages for a session, latest page first
 @router.get("/admin/sessions/{session_id}/messages")
-async def get_session_messages(session_id: str):
+async def get_session_messages(session_id: str, limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                               before: Optional[str] = None):
     try:
-        messages = await get_messages_by_session(session_id)
-        return {"messages": messages}
+        messages, next_cursor = await get_messages_page(session_id, limit=limit, before=before)
+        return {"messages": messages, "next_cursor": next_cursor}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -40,6 +47,7 @@ async def get_session_documents(session_id: str):
 async def remove_session(session_id: str):
     try:
         await delete_session(session_id)
+        await remove_session_vectors(session_id)
         return {"message": f"Session {session_id} deleted successfully."}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -58,6 +66,7 @@ async def remove_message(message_id: str):
 async def remove_document(document_id: str):
     try:
         await delete_document(document_id)
+        await remove_document_vectors(document_id)
         return {"message": f"Document {document_id} deleted successfully."}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
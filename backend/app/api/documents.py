@@ -1,18 +1,22 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Form
+from fastapi import APIRouter, UploadFile, File, HTTPException, Form, status
 from fastapi.responses import JSONResponse
-from typing import List, Optional
+from typing import Dict, List, Optional
 import logging
 
-from PyPDF2 import PdfReader
+import numpy as np
 
-from backend.app.db.faiss_instance import faiss_client
+from backend.app.db.faiss_instance import get_embedding_store, index_writer, latest_client
 from backend.app.db.crud import create_document
 from backend.app.db.supabase_client import supabase
-from backend.app.db.chunked_docs import chunk_text
+from backend.app.db.chunked_docs import PageChunk, TokenChunker, load_token_counter
+from backend.app.db.faiss_client import EMBEDDING_MODEL
+from backend.app.db.vector_metadata import chunk_hash
 from backend.app.core.embeddings import embed_text
+from backend.app.services.ingest_service import IngestFile, IngestJob, create_job, get_job, submit, run_blocking
+from backend.app.services.pdf_extraction import iter_pdf_pages, page_count
 
 import uuid
-import shutil
+import hashlib
 import os
 
 router = APIRouter()
@@ -21,6 +25,11 @@ logger = logging.getLogger(__name__)
 UPLOAD_DIR = "uploaded_files"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
+EMBED_BATCH_SIZE = int(os.getenv("INGEST_EMBED_BATCH_SIZE", "64"))
+# In embedding-model tokens; all-MiniLM-L6-v2 ignores anything past 256
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "200"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "32"))
+
 @router.post("/upload")
 async def upload_documents(
     files: List[UploadFile] = File(...),
@@ -35,49 +44,28 @@ async def upload_documents(
     if session_id == "":
         session_id = None  # Convert empty string to None to avoid UUID errors
 
-    all_chunks = []
-
     try:
         for file in files:
-            file_ext = os.path.splitext(file.filename)[1].lower()
-            if file_ext != ".pdf":
+            if os.path.splitext(file.filename)[1].lower() != ".pdf":
                 logger.error(f"Unsupported file format: {file.filename}")
                 raise HTTPException(status_code=400, detail="Only PDF files supported")
 
-            saved_path = os.path.join(UPLOAD_DIR, f"{uuid.uuid4()}{file_ext}")
-            with open(saved_path, "wb") as buffer:
-                shutil.copyfileobj(file.file, buffer)
+        saved_files = []
+        for file in files:
+            saved_path = os.path.join(UPLOAD_DIR, f"{uuid.uuid4()}.pdf")
+            file_hash = await run_blocking(save_upload, file, saved_path)
             logger.info(f"Saved uploaded file to {saved_path}")
+            saved_files.append(IngestFile(path=saved_path, file_name=file.filename, file_hash=file_hash))
 
-            file_url = await upload_to_supabase_storage(saved_path, file.filename)
-            logger.info(f"Uploaded file to Supabase storage: {file_url}")
-
-            raw_text = extract_text_from_pdf(saved_path)
-
-            chunks = chunk_text(raw_text, chunk_size=2000, chunk_overlap=200)
-            logger.info(f"Chunked document into {len(chunks)} chunks")
-
-            await create_document(
-                session_id=session_id,
-                file_name=file.filename,
-                file_url=file_url,
-                do_not_store=do_not_store
-            )
-            logger.info(f"Created document record for {file.filename}")
-
-            if not do_not_store:
-                embeddings = embed_text(chunks)
-                faiss_client.add_embeddings(embeddings, chunks)
-                logger.info(f"Added embeddings for {file.filename}")
-
-            os.remove(saved_path)
-            all_chunks.extend(chunks)
-
-        logger.info(f"Uploaded {len(files)} files with total {len(all_chunks)} chunks processed")
+        # Parsing, chunking and embedding run in the ingest workers, off the request
+        job = create_job(saved_files, session_id=session_id, do_not_store=do_not_store)
+        await submit(job, process_upload)
         return JSONResponse(
+            status_code=status.HTTP_202_ACCEPTED,
             content={
-                "message": f"{len(files)} files uploaded, {len(all_chunks)} chunks processed",
-                "chunks_sample": all_chunks[:3],
+                "message": f"{len(files)} files queued for processing",
+                "job_id": job.id,
+                "status": job.status,
             }
         )
     except Exception as e:
@@ -85,17 +73,174 @@ async def upload_documents(
         raise HTTPException(status_code=500, detail=str(e))
 
 
-def extract_text_from_pdf(path: str) -> str:
-    reader = PdfReader(path)
-    text = ""
-    for page in reader.pages:
-        page_text = page.extract_text()
-        if page_text:
-            text += page_text + "\n"
-    return text
+@router.get("/jobs/{job_id}")
+async def get_upload_job(job_id: str):
+    job = get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.model_dump(mode="json", exclude={"files"})
+
+
+async def process_upload(job: IngestJob):
+    try:
+        for item in job.files:
+            await ingest_file(job, item)
+            job.files_done += 1
+    finally:
+        for item in job.files:
+            if os.path.exists(item.path):
+                os.remove(item.path)
+
+
+async def ingest_file(job: IngestJob, item: IngestFile):
+    file_url = await run_blocking(upload_to_supabase_storage, item.path, item.file_name)
+    logger.info(f"Uploaded file to Supabase storage: {file_url}")
+
+    document_id = None
+    if not job.do_not_store and item.file_hash:
+        client = await latest_client()
+        duplicate_of = await run_blocking(client.find_document, item.file_hash)
+        if duplicate_of:
+            # Same file indexed before, point the new document at its vectors
+            document_id = await create_document_record(job, item, file_url)
+            linked = await run_blocking(link_to_document, duplicate_of, document_id, job.session_id, item.file_hash)
+            if linked:
+                job.chunks_total += linked
+                job.chunks_reused += linked
+                logger.info(f"{item.file_name} duplicates document {duplicate_of}, linked {linked} chunks")
+                return
+            # The original was deleted in the meantime, index this copy normally
+
+    total_pages = await run_blocking(page_count, item.path)
+    job.pages_total += total_pages
+
+    # Pages stream from the extraction pool into the chunker, and each full
+    # batch of chunks is embedded while later pages are still being parsed.
+    # Chunks already in the index, or seen earlier in this file, are not embedded again
+    # Dedup lookups only, add_to_index resolves the chunks again under the writer lock
+    client = await latest_client()
+    page_iter = iter_pdf_pages(item.path, total_pages)
+    token_counter = await run_blocking(load_token_counter, EMBEDDING_MODEL)
+    chunker = TokenChunker(CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS, token_counter=token_counter)
+    chunks: List[PageChunk] = []
+    hashes: List[bytes] = []
+    vectors: Dict[bytes, np.ndarray] = {}
+    queued: Dict[bytes, str] = {}
+    try:
+        while True:
+            page = await run_blocking(next, page_iter, None)
+            new_chunks = chunker.feed(*page) if page else chunker.finish()
+            new_hashes = [chunk_hash(chunk.text) for chunk in new_chunks]
+            chunks.extend(new_chunks)
+            hashes.extend(new_hashes)
+            job.chunks_total += len(new_chunks)
+            if page:
+                job.pages_parsed += 1
+            if not job.do_not_store:
+                # The first lookup builds the hash index
+                existing = await run_blocking(client.find_chunks, new_hashes)
+                for chunk, digest, vector_id in zip(new_chunks, new_hashes, existing):
+                    if vector_id == -1 and digest not in vectors:
+                        queued.setdefault(digest, chunk.text)
+                await embed_queued(job, queued, vectors, final=page is None)
+            if page is None:
+                break
+    finally:
+        page_iter.close()
+    logger.info(f"Chunked document into {len(chunks)} chunks")
+
+    if document_id is None:
+        document_id = await create_document_record(job, item, file_url)
+
+    texts = [chunk.text for chunk in chunks]
+    chunk_pages = [chunk.page_start for chunk in chunks]
+    if not job.do_not_store and chunks:
+        added = await run_blocking(add_to_index, texts, hashes, vectors, document_id, job.session_id,
+                                   item.file_hash, chunk_pages)
+        job.chunks_reused += len(chunks) - added
+        logger.info(f"Added embeddings for {item.file_name}: {added} new, {len(chunks) - added} reused")
+
+    if len(job.chunks_sample) < 3:
+        job.chunks_sample.extend(texts[:3 - len(job.chunks_sample)])
+
+
+async def create_document_record(job: IngestJob, item: IngestFile, file_url: str) -> str:
+    document_id = await create_document(
+        session_id=job.session_id,
+        file_name=item.file_name,
+        file_url=file_url,
+        do_not_store=job.do_not_store
+    )
+    job.document_ids.append(document_id)
+    logger.info(f"Created document record for {item.file_name}")
+    return document_id
+
+
+async def embed_queued(job: IngestJob, queued: Dict[bytes, str], vectors: Dict[bytes, np.ndarray], final: bool):
+    # Embed whole batches as they fill up, and the remainder once the document ends
+    while len(queued) >= EMBED_BATCH_SIZE or (final and queued):
+        batch = list(queued.items())[:EMBED_BATCH_SIZE]
+        # Chunks embedded before, e.g. by a deleted document, come from the store
+        embeddings = await run_blocking(get_embedding_store().embed, [text for _, text in batch],
+                                        [digest for digest, _ in batch], embed_text)
+        for (digest, _), vector in zip(batch, embeddings):
+            vectors[digest] = vector
+            del queued[digest]
+        job.chunks_embedded += len(batch)
+
+
+def add_to_index(texts: List[str], hashes: List[bytes], vectors: Dict[bytes, np.ndarray],
+                 document_id: str, session_id: Optional[str], file_hash: Optional[str] = None,
+                 pages: Optional[List[int]] = None) -> int:
+    """Adds the document's new chunks and links the ones already indexed. Returns how many were added."""
+    with index_writer() as client:
+        # Resolved again under the lock, the index may have changed since the chunks were embedded
+        existing = client.find_chunks(hashes)
+        new_positions = {}
+        for position, (digest, vector_id) in enumerate(zip(hashes, existing)):
+            if vector_id == -1:
+                new_positions.setdefault(digest, position)
+        missing = [digest for digest in new_positions if digest not in vectors]
+        if missing:
+            # Skipped as duplicates earlier, but deleted since
+            embeddings = get_embedding_store().embed([texts[new_positions[d]] for d in missing], missing,
+                                                     embed_text)
+            for digest, vector in zip(missing, embeddings):
+                vectors[digest] = vector
+
+        if new_positions:
+            client.add_embeddings(
+                np.vstack([vectors[digest] for digest in new_positions]),
+                [texts[position] for position in new_positions.values()],
+                doc_id=document_id, session_id=session_id,
+                hashes=list(new_positions), file_hash=file_hash,
+                pages=[pages[position] for position in new_positions.values()] if pages else None,
+                # Order within this document, neighbouring chunks are merged by it at answer time
+                positions=list(new_positions.values())
+            )
+        reused = existing[existing != -1]
+        if len(reused):
+            client.link_document(reused, document_id, session_id=session_id, file_hash=file_hash)
+        return len(new_positions)
+
+
+def link_to_document(source_doc_id: str, document_id: str, session_id: Optional[str], file_hash: str) -> int:
+    with index_writer() as client:
+        ids = client.alias_document(source_doc_id, document_id, session_id=session_id, file_hash=file_hash)
+        return len(ids)
+
+
+def save_upload(file: UploadFile, saved_path: str) -> str:
+    """Copies the upload to disk, returns its SHA-256 computed on the way."""
+    digest = hashlib.sha256()
+    with open(saved_path, "wb") as buffer:
+        while block := file.file.read(1024 * 1024):
+            digest.update(block)
+            buffer.write(block)
+    return digest.hexdigest()
 
 
-async def upload_to_supabase_storage(file_path: str, original_filename: str) -> str:
+def upload_to_supabase_storage(file_path: str, original_filename: str) -> str:
     bucket_name = "documents"
     file_id = str(uuid.uuid4())
     file_storage_path = f"{file_id}_{original_filename}"
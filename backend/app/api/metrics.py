@@ -1,7 +1,7 @@
 # Metrics & health APIs
 
 from fastapi import APIRouter
-from prometheus_client import Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client import Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST
 
 router = APIRouter()
 
@@ -24,6 +24,65 @@ ERROR_COUNT = Counter(
     ["method", "endpoint", "http_status"]
 )
 
+CACHE_HITS = Counter(
+    "elara_cache_hits_total",
+    "Cache lookups served from cache",
+    ["cache"]
+)
+
+CACHE_MISSES = Counter(
+    "elara_cache_misses_total",
+    "Cache lookups that had to be computed",
+    ["cache"]
+)
+
+ANSWER_CACHE_SAVED_SECONDS = Counter(
+    "elara_answer_cache_saved_seconds_total",
+    "LLM latency avoided by serving answers from the semantic answer cache"
+)
+
+STARTUP_SECONDS = Gauge(
+    "elara_startup_seconds",
+    "Cold start cost: importing the app, and warming the model and index afterwards",
+    ["phase"]
+)
+
+RERANK_LATENCY = Histogram(
+    "elara_rerank_latency_seconds",
+    "Cross-encoder re-ranking time per query, bypassed queries excluded"
+)
+
+RERANK_BYPASSED = Counter(
+    "elara_rerank_bypassed_total",
+    "Queries answered without cross-encoder re-ranking",
+    ["reason"]
+)
+
+TOOL_ROUTE_HITS = Counter(
+    "elara_tool_route_hits_total",
+    "Chat queries answered by a tool instead of the RAG pipeline",
+    ["route", "matcher"]
+)
+
+TOOL_ROUTE_LATENCY = Histogram(
+    "elara_tool_route_latency_seconds",
+    "Time to route a query and run its tool",
+    ["route"],
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+)
+
+MATH_EVAL_LATENCY = Histogram(
+    "elara_math_eval_latency_seconds",
+    "Time to evaluate a math query in the worker pool, cache misses only",
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 2.0, 5.0)
+)
+
+MATH_LIMITED = Counter(
+    "elara_math_limited_total",
+    "Math queries stopped by the sandbox",
+    ["reason"]
+)
+
 @router.get("/metrics")
 async def metrics():
     # Return latest metrics data in Prometheus format
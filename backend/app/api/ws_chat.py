@@ -1,51 +1,75 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 from typing import Optional
 
-from backend.app.db.crud import create_session , create_message , create_document
-from backend.app.db.crud import get_session,get_messages_by_session,get_all_sessions
+from backend.app.db.crud import create_session , create_document
+from backend.app.db.crud import get_session,get_messages_page,get_sessions_page
 
-from backend.app.core.rag_pipeline import rag_answer
+from backend.app.core.rag_pipeline import embed_query, rag_answer_stream
+from backend.app.core.embeddings import model_loaded
 
-from backend.app.tools.math_tools import calculate
-from backend.app.tools.date_tools import date_diff
+from backend.app.tools.router import build_router
+
+from backend.app.services.ingest_service import IngestJob, add_listener
+from backend.app.services.message_buffer import enqueue_message, pending_messages
 
 import logging
-import re
 
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
-def is_math_query(query: str) -> bool:
-    query_l = query.lower()
-    return (
-        bool(re.match(r'^[\d\+\-*/\(\)\.\s\^%]+$', query_l))
-        or any(key in query_l for key in [
-            "calculate", "compute", "equation", "solve", "derivative",
-            "differentiate", "d/dx", "root", "solution", "trig", "sin", "cos", "tan", "angle"
-        ])
-        or ('=' in query_l and re.search(r'[a-zA-Z]', query_l))
-    )
-
-def is_date_query(query: str) -> bool:
-    ql = query.lower()
-    return (
-        "days between" in ql
-        or "difference between dates" in ql
-        or len(re.findall(r"\d{4}-\d{2}-\d{2}", query)) >= 2
-    )
+# Appended to an answer whose stream broke off, in the chat and in the stored history
+INCOMPLETE_NOTE = "\n\n[The answer was cut off by an error. Please try again.]"
+
+# Open sockets per session, used to push ingest job results
+active_connections: dict[str, set[WebSocket]] = {}
+
+async def notify_ingest_finished(job: IngestJob):
+    if not job.session_id:
+        return
+    payload = {
+        "type": "ingest_complete",
+        "job_id": job.id,
+        "status": job.status,
+        "chunks_embedded": job.chunks_embedded,
+        "error": job.error,
+        "session_id": job.session_id,
+    }
+    for websocket in list(active_connections.get(job.session_id, ())):
+        try:
+            await websocket.send_json(payload)
+        except Exception as e:
+            logger.warning(f"Failed to push ingest result to session {job.session_id}: {e}")
+
+add_listener(notify_ingest_finished)
+
+# Math and date questions are answered by tools; the intent classifier reuses the
+# cached query embedding, so a query it sends on to RAG is not embedded twice
+tool_router = build_router(embed_fn=embed_query, ready=model_loaded)
 
 async def send_chat_history(websocket: WebSocket, session_id: str):
-    messages = await get_messages_by_session(session_id)
+    # Latest page only, older pages are fetched with load_older
+    messages, next_cursor = await get_messages_page(session_id)
+    # Messages still in the write-behind buffer belong at the end of the history
+    stored_ids = {m["id"] for m in messages if "id" in m}
+    messages += [m for m in pending_messages(session_id) if m["id"] not in stored_ids]
     history = [{"role": m["role"], "content": m["content"]} for m in messages]
-    await websocket.send_json({"type": "history", "messages": history, "session_id": session_id})
+    await websocket.send_json({"type": "history", "messages": history, "session_id": session_id,
+                               "next_cursor": next_cursor})
     logger.info(f"Sent chat history for session {session_id}")
 
-async def send_all_sessions(websocket: WebSocket):
-    sessions = await get_all_sessions()
+async def send_older_messages(websocket: WebSocket, session_id: str, before: str):
+    messages, next_cursor = await get_messages_page(session_id, before=before)
+    history = [{"role": m["role"], "content": m["content"]} for m in messages]
+    await websocket.send_json({"type": "older_messages", "messages": history, "session_id": session_id,
+                               "next_cursor": next_cursor})
+
+async def send_all_sessions(websocket: WebSocket, before: Optional[str] = None):
+    sessions, next_cursor = await get_sessions_page(before=before)
     session_list = [{"id": s["id"], "created_at": s.get("created_at"), "status": s.get("status")} for s in sessions]
-    await websocket.send_json({"type": "sessions_list", "sessions": session_list})
-    logger.info("Sent all sessions list to client")
+    await websocket.send_json({"type": "sessions_list", "sessions": session_list,
+                               "cursor": before, "next_cursor": next_cursor})
+    logger.info("Sent sessions list page to client")
 
 @router.websocket("/ws/chat")
 async def websocket_chat(websocket: WebSocket, session_id: Optional[str] = None):
@@ -67,6 +91,7 @@ async def websocket_chat(websocket: WebSocket, session_id: Optional[str] = None)
     # Notify user about session start and send trecent chat history
     await websocket.send_json({"type": "session_start", "session_id": session_id})
     await send_chat_history(websocket, session_id)
+    active_connections.setdefault(session_id, set()).add(websocket)
 
     try:
         while True:
@@ -74,7 +99,20 @@ async def websocket_chat(websocket: WebSocket, session_id: Optional[str] = None)
             msg_type = data.get("type")
 
             if msg_type == "get_sessions":
-                await send_all_sessions(websocket)
+                try:
+                    await send_all_sessions(websocket, data.get("before"))
+                except ValueError as e:
+                    await websocket.send_json({"error": str(e)})
+
+            elif msg_type == "load_older":
+                before = data.get("before")
+                if not before:
+                    await websocket.send_json({"error": "No cursor provided for load_older"})
+                    continue
+                try:
+                    await send_older_messages(websocket, data.get("session_id") or session_id, before)
+                except ValueError as e:
+                    await websocket.send_json({"error": str(e)})
 
             elif msg_type == "select_session":
                 selected_session_id = data.get("session_id")
@@ -93,22 +131,12 @@ async def websocket_chat(websocket: WebSocket, session_id: Optional[str] = None)
                     continue
 
                 logger.info(f"Received query for session {session_id}: {user_query}")
-                await create_message(session_id=session_id, content=user_query, role="user")
-
-                tool_response = None
-                # Check if query matches math pattern
-                if is_math_query(user_query):
-                    tool_response = calculate(user_query)
-                    
-                # Check if query is a date difference type
-                elif is_date_query(user_query):
-                    dates = re.findall(r"\d{4}-\d{2}-\d{2}", user_query)
-                    if len(dates) >= 2:
-                        tool_response = date_diff(dates[0], dates[1])
+                await enqueue_message(session_id=session_id, content=user_query, role="user")
 
+                tool_response = await tool_router.dispatch(user_query)
                 if tool_response:
                     # Send tools response (math/date) instead of RAG-Pipeline
-                    await create_message(session_id=session_id, content=tool_response, role="assistant")
+                    await enqueue_message(session_id=session_id, content=tool_response, role="assistant")
                     await websocket.send_json({
                         "type": "assistant_message",
                         "content": tool_response,
@@ -117,15 +145,37 @@ async def websocket_chat(websocket: WebSocket, session_id: Optional[str] = None)
                     logger.info(f"Sent tool response to session {session_id}")
                     continue
                 
-                # Sent request to the RAG    
-                assistant_response = await rag_answer(user_query, session_id=session_id)
-                await create_message(session_id=session_id, content=assistant_response, role="assistant")
+                # Sent request to the RAG, forwarding tokens as they arrive
+                parts = []
+                incomplete = False
+                try:
+                    async for delta in rag_answer_stream(user_query, session_id=session_id):
+                        parts.append(delta)
+                        await websocket.send_json({
+                            "type": "assistant_delta",
+                            "content": delta,
+                            "session_id": session_id
+                        })
+                except WebSocketDisconnect:
+                    raise
+                except Exception as e:
+                    if not parts:
+                        raise
+                    # The LLM stream broke off mid-answer, keep what was sent but mark it as cut short
+                    logger.error(f"Answer stream for session {session_id} broke off: {e}")
+                    incomplete = True
+                assistant_response = "".join(parts)
+                if incomplete:
+                    assistant_response += INCOMPLETE_NOTE
+                await enqueue_message(session_id=session_id, content=assistant_response, role="assistant")
                 logger.info(f"Sent assistant response to session {session_id}")
                 await websocket.send_json(
                     {
                         "type": "assistant_message",
                         "content": assistant_response,
-                        "session_id": session_id
+                        "session_id": session_id,
+                        "streamed": True,
+                        "incomplete": incomplete
                     })
 
             else:
@@ -135,3 +185,9 @@ async def websocket_chat(websocket: WebSocket, session_id: Optional[str] = None)
     except Exception as e:
         logger.error(f"Unexpected error in WebSocket: {e}")
         await websocket.send_json({"error": "Internal server error"})
+    finally:
+        connections = active_connections.get(session_id)
+        if connections:
+            connections.discard(websocket)
+            if not connections:
+                del active_connections[session_id]
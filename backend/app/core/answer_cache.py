@@ -0,0 +1,102 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+import faiss
+import numpy as np
+
+from backend.app.api.metrics import CACHE_HITS, CACHE_MISSES, ANSWER_CACHE_SAVED_SECONDS
+from backend.app.db.faiss_client import EMBEDDING_DIM
+
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "512"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+# Neighbours checked per lookup, a close query may have retrieved different chunks
+ANSWER_CACHE_CANDIDATES = 4
+
+
+class SemanticAnswerCache:
+    """
+    Reuses an earlier LLM answer when a new query embedding is within
+    threshold cosine similarity of a cached query and the retrieved chunk
+    set is identical. Query embeddings live in a small local FAISS index.
+    """
+
+    def __init__(self, threshold: float = ANSWER_CACHE_THRESHOLD, capacity: int = ANSWER_CACHE_SIZE,
+                 ttl: float = ANSWER_CACHE_TTL, dim: int = EMBEDDING_DIM):
+        self.threshold = threshold
+        self.capacity = capacity
+        self.ttl = ttl
+        self.dim = dim
+        self._index = faiss.IndexIDMap2(faiss.IndexFlatIP(dim))
+        # id -> (created, chunk ids, answer, llm latency), oldest first
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        self._next_id = 0
+        self._version = None
+        self._lock = threading.Lock()
+
+    def lookup(self, query_embedding: np.ndarray, chunk_ids: Iterable[int], version=None) -> Optional[str]:
+        with self._lock:
+            self._check_version(version)
+            answer = self._lookup(query_embedding, frozenset(chunk_ids))
+        if answer is None:
+            CACHE_MISSES.labels(cache="semantic_answer").inc()
+            return None
+        CACHE_HITS.labels(cache="semantic_answer").inc()
+        return answer
+
+    def store(self, query_embedding: np.ndarray, chunk_ids: Iterable[int], answer: str,
+              llm_latency: float = 0.0, version=None):
+        with self._lock:
+            self._check_version(version)
+            now = time.monotonic()
+            # Entries share one ttl, so expired ones are always at the front
+            while self._entries and (len(self._entries) >= self.capacity
+                                     or now - next(iter(self._entries.values()))[0] > self.ttl):
+                oldest_id, _ = self._entries.popitem(last=False)
+                self._index.remove_ids(np.array([oldest_id], dtype=np.int64))
+            entry_id = self._next_id
+            self._next_id += 1
+            self._index.add_with_ids(self._normalized(query_embedding), np.array([entry_id], dtype=np.int64))
+            self._entries[entry_id] = (now, frozenset(chunk_ids), answer, llm_latency)
+
+    def clear(self):
+        with self._lock:
+            self._index.reset()
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _lookup(self, query_embedding: np.ndarray, chunk_ids: frozenset) -> Optional[str]:
+        if not self._entries:
+            return None
+        scores, ids = self._index.search(self._normalized(query_embedding), ANSWER_CACHE_CANDIDATES)
+        now = time.monotonic()
+        for score, entry_id in zip(scores[0], ids[0]):
+            if entry_id == -1 or score < self.threshold:
+                break
+            created, cached_chunk_ids, answer, llm_latency = self._entries[int(entry_id)]
+            if now - created > self.ttl:
+                continue
+            if cached_chunk_ids == chunk_ids:
+                ANSWER_CACHE_SAVED_SECONDS.inc(llm_latency)
+                return answer
+        return None
+
+    def _check_version(self, version):
+        # Answers were produced from documents that have since changed
+        if version != self._version:
+            self._index.reset()
+            self._entries.clear()
+            self._version = version
+
+    def _normalized(self, embedding: np.ndarray) -> np.ndarray:
+        vector = np.array(embedding, dtype="float32").reshape(1, self.dim)
+        faiss.normalize_L2(vector)
+        return vector
+
+
+answer_cache = SemanticAnswerCache()
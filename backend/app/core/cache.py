@@ -0,0 +1,56 @@
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+from backend.app.api.metrics import CACHE_HITS, CACHE_MISSES
+
+
+def normalize_query(query: str) -> str:
+    # MiniLM is uncased, so case and whitespace don't change the embedding
+    return " ".join(query.lower().split())
+
+
+class TTLCache:
+    """
+    Bounded LRU cache whose entries also expire ttl seconds after being set.
+    Hits and misses are reported to Prometheus under the cache name.
+    """
+
+    def __init__(self, name: str, maxsize: int = 1024, ttl: Optional[float] = None):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and self.ttl is not None and time.monotonic() - entry[0] > self.ttl:
+                del self._data[key]
+                entry = None
+            if entry is None:
+                CACHE_MISSES.labels(cache=self.name).inc()
+                return default
+            self._data.move_to_end(key)
+            CACHE_HITS.labels(cache=self.name).inc()
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any):
+        with self._lock:
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
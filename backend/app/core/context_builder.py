@@ -0,0 +1,141 @@
+import os
+from typing import Callable, List, NamedTuple, Sequence
+
+import numpy as np
+
+from backend.app.db.chunked_docs import approximate_token_count
+from backend.app.db.vector_metadata import NO_DOCUMENT, UNKNOWN_POSITION
+
+# Tokens of retrieved text per prompt, citations included
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+# MMR trade-off: 1 ranks by relevance alone, lower values favour diverse passages
+CONTEXT_MMR_LAMBDA = float(os.getenv("CONTEXT_MMR_LAMBDA", "0.7"))
+# Passages this similar to one already chosen add nothing and are dropped
+CONTEXT_DUPLICATE_THRESHOLD = float(os.getenv("CONTEXT_DUPLICATE_THRESHOLD", "0.95"))
+
+# Shortest run of characters accepted as the overlap between neighbouring chunks
+MIN_OVERLAP_CHARS = 20
+
+
+class Passage(NamedTuple):
+    ids: List[int]
+    text: str
+    page: int
+    score: float
+    vector: np.ndarray
+
+
+def merge_overlapping(left: str, right: str, max_overlap: int = 2000) -> str:
+    """Joins two consecutive chunks, writing the text they share only once."""
+    probe = right[:MIN_OVERLAP_CHARS]
+    start = max(0, len(left) - max_overlap)
+    while len(probe) == MIN_OVERLAP_CHARS:
+        position = left.find(probe, start)
+        if position == -1:
+            break
+        if right.startswith(left[position:]):
+            return left[:position] + right
+        start = position + 1
+    return f"{left} {right}"
+
+
+def merge_neighbours(ids: Sequence[int], texts: Sequence[str], slots: Sequence[int], positions: Sequence[int],
+                     pages: Sequence[int], scores: Sequence[float], vectors: np.ndarray) -> List[Passage]:
+    """
+    Merges retrieved chunks that follow each other in the same document (same
+    slot, consecutive positions) into one passage. Chunks of no document or
+    without a recorded position are never merged. Passages keep the best score
+    of their chunks and the vector of the best chunk, in the original rank order.
+    """
+    by_key = {}
+    for index, (slot, position) in enumerate(zip(slots, positions)):
+        if slot != NO_DOCUMENT and position != UNKNOWN_POSITION:
+            by_key.setdefault((int(slot), int(position)), index)
+    passages = []
+    merged = set()
+    for index in range(len(ids)):
+        if index in merged:
+            continue
+        run = [index]
+        if by_key.get((int(slots[index]), int(positions[index]))) == index:
+            # Walk back to the first chunk of the run this one belongs to, then forward
+            slot, first = int(slots[index]), int(positions[index])
+            while (slot, first - 1) in by_key and by_key[(slot, first - 1)] not in merged:
+                first -= 1
+            run = [by_key[(slot, first)]]
+            while (slot, first + len(run)) in by_key and by_key[(slot, first + len(run))] not in merged:
+                run.append(by_key[(slot, first + len(run))])
+        merged.update(run)
+
+        text = texts[run[0]]
+        for next_index in run[1:]:
+            text = merge_overlapping(text, texts[next_index])
+        best = max(run, key=lambda i: scores[i])
+        passages.append(Passage([int(ids[i]) for i in run], text, int(pages[run[0]]), float(scores[best]),
+                                vectors[best]))
+    return passages
+
+
+def select_mmr(passages: List[Passage], lambda_: float = CONTEXT_MMR_LAMBDA,
+               duplicate_threshold: float = CONTEXT_DUPLICATE_THRESHOLD) -> List[Passage]:
+    """
+    Orders passages by maximal marginal relevance. Relevance comes from the
+    rank retrieval gave them, since fused scores are not cosine similarities.
+    Near-duplicates of an already chosen passage are dropped.
+    """
+    if not passages:
+        return []
+    vectors = np.vstack([passage.vector for passage in passages]).astype(np.float32)
+    similarity = vectors @ vectors.T
+    relevance = 1.0 - np.arange(len(passages)) / len(passages)
+
+    chosen: List[int] = []
+    remaining = np.ones(len(passages), dtype=bool)
+    redundancy = np.zeros(len(passages), dtype=np.float32)
+    while remaining.any():
+        candidates = np.flatnonzero(remaining)
+        mmr = lambda_ * relevance[candidates] - (1 - lambda_) * redundancy[candidates]
+        pick = int(candidates[np.argmax(mmr)])
+        chosen.append(pick)
+        remaining[pick] = False
+        redundancy = np.maximum(redundancy, similarity[pick])
+        remaining &= redundancy < duplicate_threshold
+    return [passages[i] for i in chosen]
+
+
+def citation(number: int, passage: Passage) -> str:
+    return f"[{number}] (p. {passage.page})" if passage.page >= 1 else f"[{number}]"
+
+
+def pack(passages: List[Passage], budget_tokens: int = CONTEXT_TOKEN_BUDGET,
+         count_tokens: Callable[[List[str]], List[int]] = approximate_token_count) -> List[Passage]:
+    """
+    Passages, in order, that fit the token budget together with their citations.
+    Passages that don't fit are skipped for smaller ones further down; a first
+    passage over the budget on its own is cut short rather than leaving no context.
+    """
+    # Citation numbers are at most a few tokens apart, count with the widest one
+    counts = count_tokens([f"{citation(len(passages), p)} {p.text}" for p in passages]) if passages else []
+    packed = []
+    used = 0
+    for passage, tokens in zip(passages, counts):
+        if used + tokens <= budget_tokens:
+            packed.append(passage)
+            used += tokens
+        elif not packed:
+            words = passage.text.split(" ")
+            packed.append(passage._replace(text=" ".join(words[:max(1, len(words) * budget_tokens // tokens)])))
+            used = budget_tokens
+    return packed
+
+
+def format_passages(passages: List[Passage]) -> List[str]:
+    return [f"{citation(number, passage)} {passage.text}" for number, passage in enumerate(passages, start=1)]
+
+
+def build_context(ids: Sequence[int], texts: Sequence[str], slots: Sequence[int], positions: Sequence[int],
+                  pages: Sequence[int], scores: Sequence[float], vectors: np.ndarray,
+                  budget_tokens: int = CONTEXT_TOKEN_BUDGET) -> List[str]:
+    """Merge neighbouring chunks, drop near-duplicates and pack to the budget. Returns cited passages."""
+    passages = merge_neighbours(list(ids), texts, slots, positions, pages, scores, vectors)
+    return format_passages(pack(select_mmr(passages), budget_tokens))
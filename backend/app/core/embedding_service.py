@@ -0,0 +1,82 @@
+import os
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+import numpy as np
+
+from backend.app.core.embeddings import embed_text
+
+logger = logging.getLogger(__name__)
+
+EMBED_MAX_BATCH_SIZE = int(os.getenv("EMBED_MAX_BATCH_SIZE", "32"))
+EMBED_MAX_WAIT_MS = float(os.getenv("EMBED_MAX_WAIT_MS", "5"))
+
+
+class EmbeddingBatcher:
+    """
+    Runs query embeddings on a dedicated inference thread and coalesces
+    concurrent requests into micro-batches of up to max_batch_size. Unless a
+    full batch is already queued, the first request waits max_wait_ms for others to join.
+    """
+
+    def __init__(self, embed_fn: Callable[[list[str]], np.ndarray],
+                 max_batch_size: int = EMBED_MAX_BATCH_SIZE, max_wait_ms: float = EMBED_MAX_WAIT_MS):
+        self.embed_fn = embed_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        # Created by _ensure_running, a shut down executor can't be reused after close
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def embed_query(self, text: str) -> np.ndarray:
+        """Returns a (1, dim) float32 array, like embed_text([text])."""
+        self._ensure_running()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, future))
+        return (await future).reshape(1, -1)
+
+    def _ensure_running(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embedding")
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            if self._queue.qsize() < self.max_batch_size - 1:
+                # Give concurrent requests a moment to join the batch
+                await asyncio.sleep(self.max_wait)
+            while len(batch) < self.max_batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            texts = [text for text, _ in batch]
+            try:
+                vectors = await loop.run_in_executor(self._executor, self.embed_fn, texts)
+            except Exception as e:
+                logger.error(f"Embedding batch of {len(texts)} failed: {e}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (_, future), vector in zip(batch, vectors):
+                if not future.done():
+                    future.set_result(np.asarray(vector, dtype="float32"))
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+embedding_batcher = EmbeddingBatcher(embed_text)
@@ -0,0 +1,176 @@
+import os
+import re
+import json
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+META_FILE = "meta.json"
+KEYS_FILE = "keys.bin"
+VECTORS_FILE = "vectors.bin"
+SCALES_FILE = "scales.bin"
+KEY_SIZE = 32  # SHA-256 digest of the chunk text
+
+STORE_DTYPES = ("float32", "float16", "int8")
+
+
+def quantize_int8(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    # Symmetric per-row scale, one float32 per vector on top of dim bytes
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+class EmbeddingStore:
+    """
+    Append-only, memory-mapped store of chunk embeddings keyed by
+    (chunk hash, model). Each model gets its own directory, so switching
+    models never serves vectors from the wrong embedding space. Vectors are
+    kept as float32, float16 or int8 with a per-row scale.
+    """
+
+    def __init__(self, directory: str, model_name: str, dim: int, dtype: str = "float16"):
+        if dtype not in STORE_DTYPES:
+            raise ValueError(f"Unknown embedding store dtype: {dtype}. Expected one of {STORE_DTYPES}")
+        self.directory = os.path.join(directory, re.sub(r"[^A-Za-z0-9_.-]+", "__", model_name))
+        self.model_name = model_name
+        self.dim = dim
+        self.dtype = dtype
+        self._rows: dict[bytes, int] = {}
+        self._count = 0
+        self._vectors: Optional[np.ndarray] = None
+        self._scales: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+        self._open()
+
+    def _open(self):
+        os.makedirs(self.directory, exist_ok=True)
+        meta_path = os.path.join(self.directory, META_FILE)
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+            if meta["dim"] != self.dim:
+                raise ValueError(f"Embedding store {self.directory} holds dim {meta['dim']}, expected {self.dim}")
+            if meta["dtype"] != self.dtype:
+                # Rows already written fix the layout, keep using it
+                logger.warning(f"Embedding store {self.directory} is {meta['dtype']}, ignoring {self.dtype}")
+                self.dtype = meta["dtype"]
+        else:
+            with open(meta_path, "w") as f:
+                json.dump({"model": self.model_name, "dim": self.dim, "dtype": self.dtype}, f)
+        self._refresh()
+
+    @property
+    def _row_bytes(self) -> int:
+        return self.dim * np.dtype(self.dtype).itemsize
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _refresh(self):
+        """Pick up rows appended since the last look, possibly by another process."""
+        keys_path = self._path(KEYS_FILE)
+        if not os.path.exists(keys_path):
+            return
+        # Vectors are written before keys, a row counts once both are complete
+        count = min(os.path.getsize(keys_path) // KEY_SIZE,
+                    os.path.getsize(self._path(VECTORS_FILE)) // self._row_bytes)
+        if self.dtype == "int8":
+            count = min(count, os.path.getsize(self._path(SCALES_FILE)) // 4)
+        if count == self._count:
+            return
+        with open(keys_path, "rb") as f:
+            f.seek(self._count * KEY_SIZE)
+            new_keys = f.read((count - self._count) * KEY_SIZE)
+        for offset in range(0, len(new_keys), KEY_SIZE):
+            self._rows.setdefault(new_keys[offset:offset + KEY_SIZE], self._count + offset // KEY_SIZE)
+        self._count = count
+        self._vectors = np.memmap(self._path(VECTORS_FILE), dtype=self.dtype, mode="r", shape=(count, self.dim))
+        if self.dtype == "int8":
+            self._scales = np.memmap(self._path(SCALES_FILE), dtype=np.float32, mode="r", shape=(count,))
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __contains__(self, key: bytes) -> bool:
+        return key in self._rows
+
+    def get(self, keys: Sequence[bytes]) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns (float32 vectors, found mask), rows for missing keys are zero."""
+        with self._lock:
+            self._refresh()
+            rows = np.array([self._rows.get(key, -1) for key in keys], dtype=np.int64)
+            found = rows != -1
+            vectors = np.zeros((len(keys), self.dim), dtype=np.float32)
+            if found.any():
+                vectors[found] = self._vectors[rows[found]].astype(np.float32)
+                if self.dtype == "int8":
+                    vectors[found] *= self._scales[rows[found]][:, None]
+            return vectors, found
+
+    def put(self, keys: Sequence[bytes], vectors: np.ndarray) -> int:
+        """Appends vectors for keys not stored yet. Returns how many were written."""
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(keys), self.dim)
+        with self._lock, self._file_lock():
+            self._refresh()
+            new = {}
+            for key, vector in zip(keys, vectors):
+                if key not in self._rows and key not in new:
+                    new[key] = vector
+            if not new:
+                return 0
+            self._truncate_partial_rows()
+            batch = np.vstack(list(new.values()))
+            if self.dtype == "int8":
+                batch, scales = quantize_int8(batch)
+                with open(self._path(SCALES_FILE), "ab") as f:
+                    f.write(scales.tobytes())
+            with open(self._path(VECTORS_FILE), "ab") as f:
+                f.write(batch.astype(self.dtype).tobytes())
+            with open(self._path(KEYS_FILE), "ab") as f:
+                f.write(b"".join(new))
+            self._refresh()
+            return len(new)
+
+    def embed(self, texts: List[str], keys: Sequence[bytes], embed_fn: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+        """Embeddings for texts, running embed_fn only on those not stored yet."""
+        vectors, found = self.get(keys)
+        missing = np.flatnonzero(~found)
+        if len(missing):
+            fresh = np.asarray(embed_fn([texts[i] for i in missing]), dtype=np.float32)
+            vectors[missing] = fresh
+            self.put([keys[i] for i in missing], fresh)
+        return vectors
+
+    def _truncate_partial_rows(self):
+        # A writer that died mid-append leaves a torn tail, later rows must not shift
+        files = [(KEYS_FILE, KEY_SIZE), (VECTORS_FILE, self._row_bytes)]
+        if self.dtype == "int8":
+            files.append((SCALES_FILE, 4))
+        for name, row_size in files:
+            path = self._path(name)
+            if os.path.exists(path) and os.path.getsize(path) > self._count * row_size:
+                os.truncate(path, self._count * row_size)
+
+    @contextmanager
+    def _file_lock(self):
+        # Several workers may append at once
+        with open(self._path(".lock"), "w") as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
@@ -1,12 +1,86 @@
-from sentence_transformers import SentenceTransformer
-
 import os
+import sys
+import logging
+import threading
+
+import numpy as np
 from dotenv import load_dotenv
 
+from backend.app.db.faiss_client import EMBEDDING_MODEL
+
 load_dotenv()
+logger = logging.getLogger(__name__)
 token = os.getenv("HUGGINGFACE_HUB_TOKEN")
 
-model = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2', use_auth_token=token)
+# torch (default), torch-int8 (dynamically quantized Linear layers),
+# onnx or onnx-int8 (ONNX Runtime, no torch import at all)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+EMBEDDING_BACKENDS = ("torch", "torch-int8", "onnx", "onnx-int8")
+# Exports shipped in the model repo; EMBEDDING_ONNX_PATH points at a local export instead
+ONNX_FILES = {"onnx": "onnx/model.onnx", "onnx-int8": "onnx/model_quint8_avx2.onnx"}
+EMBEDDING_ONNX_FILE = os.getenv("EMBEDDING_ONNX_FILE")
+EMBEDDING_ONNX_PATH = os.getenv("EMBEDDING_ONNX_PATH")
+# Intra-op threads for ONNX Runtime, 0 lets it use every core
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", "0"))
+MAX_SEQ_LENGTH = 256
+
+# Below this cosine against the torch embeddings a backend changes retrieval quality
+PARITY_THRESHOLD = 0.99
+PARITY_TEXTS = [
+    "What is the refund policy for annual subscriptions?",
+    "Vector search",
+    "The mitochondria is the powerhouse of the cell.",
+    "Summarize section 3 of the uploaded contract, including every termination clause and notice period.",
+    "ünïcode and numbers: 42, 3.14159",
+]
+
+
+def load_model(backend: str = EMBEDDING_BACKEND):
+    """Returns an embedder with an encode(texts) -> numpy array method for the backend."""
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend: {backend}. Expected one of {EMBEDDING_BACKENDS}")
+
+    if backend.startswith("onnx"):
+        try:
+            import onnxruntime  # noqa: F401
+        except ImportError as e:
+            # Optional, most deployments run the torch backend
+            raise ImportError(f"The {backend} embedding backend needs onnxruntime, "
+                              f"install it with: pip install -r requirements-onnx.txt") from e
+        from huggingface_hub import hf_hub_download
+        from backend.app.core.onnx_embedder import OnnxEmbedder
+
+        model_path = EMBEDDING_ONNX_PATH or hf_hub_download(
+            EMBEDDING_MODEL, EMBEDDING_ONNX_FILE or ONNX_FILES[backend], token=token)
+        tokenizer_path = hf_hub_download(EMBEDDING_MODEL, "tokenizer.json", token=token)
+        return OnnxEmbedder(model_path, tokenizer_path, max_length=MAX_SEQ_LENGTH, threads=EMBEDDING_THREADS)
+
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(EMBEDDING_MODEL, use_auth_token=token)
+    if backend == "torch-int8":
+        import torch
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return model
+
+
+# Loaded on first use (or by the lifespan warm-up), importing this module stays cheap
+model = None
+_model_lock = threading.Lock()
+
+
+def get_model():
+    global model
+    if model is None:
+        with _model_lock:
+            if model is None:
+                model = load_model()
+                logger.info(f"Embedding model {EMBEDDING_MODEL} loaded with the {EMBEDDING_BACKEND} backend")
+    return model
+
+
+def model_loaded() -> bool:
+    return model is not None
 
 
 def embed_text(texts: list[str]):
@@ -14,6 +88,25 @@ def embed_text(texts: list[str]):
     Generate embeddings for a list of texts using MiniLM model.
     Returns numpy array of embeddings.
     """
-    embeddings = model.encode(texts, convert_to_numpy=True)
-    return embeddings
+    embeddings = get_model().encode(texts)
+    return np.asarray(embeddings, dtype=np.float32)
+
+
+def check_parity(backend: str, texts: list[str] = PARITY_TEXTS) -> np.ndarray:
+    """Cosine similarity of each text's embedding under backend against plain torch."""
+    from backend.app.core.onnx_embedder import cosine_agreement
+
+    reference = get_model() if EMBEDDING_BACKEND == "torch" else load_model("torch")
+    candidate = get_model() if backend == EMBEDDING_BACKEND else load_model(backend)
+    return cosine_agreement(reference.encode(texts), candidate.encode(texts))
+
 
+if __name__ == "__main__":
+    # python -m backend.app.core.embeddings [backend ...]
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    failed = False
+    for name in sys.argv[1:] or [b for b in EMBEDDING_BACKENDS if b != "torch"]:
+        agreement = check_parity(name)
+        failed |= bool(agreement.min() < PARITY_THRESHOLD)
+        logger.info(f"{name}: min cosine {agreement.min():.5f}, mean {agreement.mean():.5f}")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,66 @@
+from typing import List
+
+import numpy as np
+
+
+def mean_pool(token_embeddings: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+    """Average of the token embeddings, ignoring padding, like sentence-transformers' Pooling."""
+    mask = attention_mask[:, :, None].astype(np.float32)
+    return (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.clip(norms, 1e-12, None)
+
+
+def cosine_agreement(reference: np.ndarray, candidate: np.ndarray) -> np.ndarray:
+    """Row-wise cosine similarity between two embeddings of the same texts."""
+    return (normalize(np.asarray(reference, dtype=np.float32))
+            * normalize(np.asarray(candidate, dtype=np.float32))).sum(axis=1)
+
+
+class OnnxEmbedder:
+    """
+    Runs an exported sentence-transformers model with ONNX Runtime on CPU:
+    tokenize, forward, mean pool and normalize, the same pipeline as
+    all-MiniLM-L6-v2 under PyTorch, without importing torch at all.
+    """
+
+    def __init__(self, model_path: str, tokenizer_path: str, max_length: int = 256,
+                 threads: int = 0, batch_size: int = 32):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+        self.dim = self.session.get_outputs()[0].shape[-1]
+        self.batch_size = batch_size
+
+        self.tokenizer = Tokenizer.from_file(tokenizer_path)
+        self.tokenizer.enable_truncation(max_length)
+        self.tokenizer.enable_padding()
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Returns normalized float32 embeddings, one row per text."""
+        embeddings = np.zeros((len(texts), self.dim), dtype=np.float32)
+        # Batch texts of similar length together so little of each batch is padding
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        for start in range(0, len(order), self.batch_size):
+            positions = order[start:start + self.batch_size]
+            encodings = self.tokenizer.encode_batch([texts[i] for i in positions])
+            input_ids = np.array([encoding.ids for encoding in encodings], dtype=np.int64)
+            attention_mask = np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64)
+            feeds = {
+                "input_ids": input_ids,
+                "attention_mask": attention_mask,
+                "token_type_ids": np.zeros_like(input_ids),
+            }
+            token_embeddings = self.session.run(
+                None, {name: value for name, value in feeds.items() if name in self.input_names})[0]
+            embeddings[positions] = mean_pool(token_embeddings, attention_mask)
+        return normalize(embeddings)
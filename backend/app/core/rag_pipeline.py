@@ -1,23 +1,145 @@
-from typing import List, Optional
-from backend.app.core.embeddings import embed_text
-from backend.app.db.faiss_instance import faiss_client
-from ..services.rag_service import call_llm
-
-# Format retrieved chunks with citations
-def format_context(chunks: List[str]) -> str:
-    context = "\n\n".join(f"[{i+1}] {chunk}" for i, chunk in enumerate(chunks))
+import os
+import time
+from typing import AsyncIterator, List, Optional
+
+import numpy as np
+
+from backend.app.core.answer_cache import answer_cache
+from backend.app.core.cache import TTLCache, normalize_query
+from backend.app.core.context_builder import build_context
+from backend.app.core.embedding_service import embedding_batcher
+from backend.app.core.reranker import RERANK_CANDIDATES, adaptive_cutoff, reranker
+from backend.app.db.bm25_index import RRF_K, reciprocal_rank_fusion
+from backend.app.db.faiss_client import FaissClient
+from backend.app.db.faiss_instance import latest_client
+from ..services.rag_service import call_llm, stream_llm, LLM_ERROR_MESSAGE
+
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "2048"))
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "3600"))
+RETRIEVAL_CACHE_TTL = float(os.getenv("RETRIEVAL_CACHE_TTL", "600"))
+
+# Fuse BM25 with vector search; off, retrieval is vector-only
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "true").lower() == "true"
+# Each retriever ranks this many times top_k candidates for the fusion
+HYBRID_CANDIDATE_FACTOR = int(os.getenv("HYBRID_CANDIDATE_FACTOR", "2"))
+HYBRID_RRF_K = int(os.getenv("HYBRID_RRF_K", str(RRF_K)))
+
+# query -> embedding, and (query, index version, top_k, session) -> search results
+query_embedding_cache = TTLCache("query_embedding", maxsize=QUERY_CACHE_SIZE, ttl=QUERY_CACHE_TTL)
+retrieval_cache = TTLCache("retrieval", maxsize=QUERY_CACHE_SIZE, ttl=RETRIEVAL_CACHE_TTL)
+_retrieval_cache_version = None
+
+# Format retrieved passages, already carrying their citations
+def format_context(passages: List[str]) -> str:
+    context = "\n\n".join(passages)
     return f"Based on the following documents:\n{context}\n\nAnswer the question below."
 
+async def embed_query(query: str) -> np.ndarray:
+    key = normalize_query(query)
+    embedding = query_embedding_cache.get(key)
+    if embedding is None:
+        embedding = await embedding_batcher.embed_query(query)
+        query_embedding_cache.set(key, embedding)
+    # search normalizes in place, keep the cached array untouched
+    return embedding.copy()
+
+async def retrieve(query: str, top_k: int, session_id: Optional[str] = None, client: Optional[FaissClient] = None):
+    """Search results of the query; ids refer to client, by default the index published right now."""
+    global _retrieval_cache_version
+    if client is None:
+        client = await latest_client()
+    version = client.version
+    if version != _retrieval_cache_version:
+        # Ingest, delete or reload changed the index, old results are stale
+        retrieval_cache.clear()
+        _retrieval_cache_version = version
+
+    key = (normalize_query(query), version, top_k, session_id)
+    cached = retrieval_cache.get(key)
+    if cached is not None:
+        return cached
+
+    query_embedding = await embed_query(query)
+    if HYBRID_SEARCH:
+        # Reciprocal rank fusion only looks at ranks, so cosine and BM25 scores need no calibration
+        candidates = top_k * HYBRID_CANDIDATE_FACTOR
+        _, dense_ids = client.search(query_embedding, k=candidates, session_id=session_id)
+        _, lexical_ids = client.search_lexical(query, k=candidates, session_id=session_id)
+        distances, indices = reciprocal_rank_fusion([dense_ids[0], lexical_ids[0]], k=top_k, rrf_k=HYBRID_RRF_K)
+    else:
+        distances, indices = client.search(query_embedding, k=top_k, session_id=session_id)
+    retrieval_cache.set(key, (distances, indices))
+    return distances, indices
+
+async def prepare_answer(query: str, top_k: int, session_id: Optional[str] = None):
+    """Returns (cached answer, None) or (None, (prompt, query embedding, chunk ids, index version))."""
+    # The cross-encoder picks the final top_k from a wider candidate set
+    candidates = max(top_k, RERANK_CANDIDATES) if reranker.enabled else top_k
+    # One client for the whole request: the awaits below may see another one published
+    client = await latest_client()
+    distances, indices = await retrieve(query, candidates, session_id=session_id, client=client)
+    chunk_ids = [int(idx) for idx in indices[0] if idx != -1]
+
+    # Near-duplicate question over the same chunks, reuse the earlier answer
+    query_embedding = await embed_query(query)
+    version = client.version
+    cached_answer = answer_cache.lookup(query_embedding, chunk_ids, version=version)
+    if cached_answer is not None:
+        return cached_answer, None
+
+    ranked = client.boost_results(indices[0], distances[0], query=query)
+    ids = np.array([vector_id for vector_id, _ in ranked], dtype=np.int64)
+    scores = np.array([score for _, score in ranked], dtype=np.float32)
+    texts = [client.get_chunk_text(int(idx)) for idx in ids]
+    rerank_scores = await reranker.rerank(query, texts)
+    if rerank_scores is None:
+        keep = np.arange(min(top_k, len(ids)))
+    else:
+        # Only as many chunks as are relevant, up to top_k
+        keep = adaptive_cutoff(rerank_scores, max_keep=top_k)
+        scores = rerank_scores
+    ids = ids[keep]
+    passages = build_context(
+        ids,
+        [texts[i] for i in keep],
+        client.metadata.vector_docs[ids],
+        client.metadata.positions[ids],
+        client.metadata.pages[ids],
+        scores[keep],
+        client.get_vectors(ids),
+    )
+
+    prompt_context = format_context(passages)
+    prompt = f"{prompt_context}\nQuestion: {query}"
+    return None, (prompt, query_embedding, chunk_ids, version)
+
 # RAG Pipeline
 async def rag_answer(query: str, top_k: int = 10, session_id: Optional[str] = None) -> str:
-    query_embedding = embed_text([query])
-    
-    distances, indices = faiss_client.search(query_embedding, k=top_k)
-    chunks = [faiss_client.get_chunk_text(idx) for idx in indices[0] if idx != -1]
-    chunks = faiss_client.boost_results(chunks, distances, query=query)
-    
-    prompt_context = format_context(chunks)
-    prompt = f"{prompt_context}\nQuestion: {query}"
-    
+    cached_answer, pending = await prepare_answer(query, top_k, session_id=session_id)
+    if cached_answer is not None:
+        return cached_answer
+    prompt, query_embedding, chunk_ids, version = pending
+
+    started = time.perf_counter()
     answer = await call_llm(prompt)
+    if answer != LLM_ERROR_MESSAGE:
+        answer_cache.store(query_embedding, chunk_ids, answer, time.perf_counter() - started, version=version)
     return answer
+
+async def rag_answer_stream(query: str, top_k: int = 10, session_id: Optional[str] = None) -> AsyncIterator[str]:
+    """Same as rag_answer, but yields the answer as the LLM generates it."""
+    cached_answer, pending = await prepare_answer(query, top_k, session_id=session_id)
+    if cached_answer is not None:
+        yield cached_answer
+        return
+    prompt, query_embedding, chunk_ids, version = pending
+
+    started = time.perf_counter()
+    parts = []
+    # A stream that breaks off mid-answer raises here, before anything is cached
+    async for delta in stream_llm(prompt):
+        parts.append(delta)
+        yield delta
+    answer = "".join(parts)
+    if answer and answer != LLM_ERROR_MESSAGE:
+        answer_cache.store(query_embedding, chunk_ids, answer, time.perf_counter() - started, version=version)
@@ -0,0 +1,120 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from backend.app.api.metrics import RERANK_BYPASSED, RERANK_LATENCY
+
+logger = logging.getLogger(__name__)
+
+RERANKER_ENABLED = os.getenv("RERANKER_ENABLED", "false").lower() == "true"
+RERANKER_MODEL = os.getenv("RERANKER_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+# Candidates retrieved for the cross-encoder to choose the final top_k from
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "30"))
+RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "32"))
+RERANK_THREADS = int(os.getenv("RERANK_THREADS", "1"))
+# Past this the query goes on with retrieval order, the scoring finishes in the background
+RERANK_TIMEOUT_MS = float(os.getenv("RERANK_TIMEOUT_MS", "300"))
+# Queries already waiting on the pool before new ones skip re-ranking
+RERANK_MAX_PENDING = int(os.getenv("RERANK_MAX_PENDING", "4"))
+# Relevance probabilities below this are dropped, but at least RERANK_MIN_KEEP stay
+RERANK_MIN_SCORE = float(os.getenv("RERANK_MIN_SCORE", "0.05"))
+RERANK_MIN_KEEP = int(os.getenv("RERANK_MIN_KEEP", "2"))
+# A drop at least this large between neighbouring scores ends the context
+RERANK_KNEE_GAP = float(os.getenv("RERANK_KNEE_GAP", "0.3"))
+
+
+def adaptive_cutoff(scores: np.ndarray, max_keep: int, min_score: float = RERANK_MIN_SCORE,
+                    min_keep: int = RERANK_MIN_KEEP, knee_gap: float = RERANK_KNEE_GAP) -> np.ndarray:
+    """
+    Positions of the candidates to keep, best first: at most max_keep, none
+    below min_score, and none past the knee, the largest drop in the sorted
+    score curve if it is at least knee_gap. min_keep candidates always stay.
+    """
+    order = np.argsort(-scores, kind="stable")[:max_keep]
+    ranked = scores[order]
+    keep = max(int(np.count_nonzero(ranked >= min_score)), min(min_keep, len(order)))
+    if keep > 1:
+        gaps = ranked[:keep - 1] - ranked[1:keep]
+        knee = int(np.argmax(gaps))
+        if gaps[knee] >= knee_gap:
+            keep = max(knee + 1, min(min_keep, len(order)))
+    return order[:keep]
+
+
+class CrossEncoderReranker:
+    """
+    Scores (query, chunk) pairs with a cross-encoder on a dedicated thread
+    pool. Re-ranking is best effort: when the pool is saturated, the scoring
+    misses its latency budget or fails, rerank returns None and the caller
+    keeps the retrieval order.
+    """
+
+    def __init__(self, score_fn: Optional[Callable[[List[Tuple[str, str]]], np.ndarray]] = None,
+                 enabled: bool = RERANKER_ENABLED, timeout_ms: float = RERANK_TIMEOUT_MS,
+                 max_pending: int = RERANK_MAX_PENDING, threads: int = RERANK_THREADS):
+        self.enabled = enabled
+        self.timeout = timeout_ms / 1000
+        self.max_pending = max_pending
+        self._score_fn = score_fn
+        self._model = None
+        self._model_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="rerank")
+        self._pending = 0
+
+    def load(self):
+        """Loads the cross-encoder, on first use or from the warm-up."""
+        if self._score_fn is None and self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    from sentence_transformers import CrossEncoder
+                    self._model = CrossEncoder(RERANKER_MODEL, device="cpu")
+                    logger.info(f"Re-ranker {RERANKER_MODEL} loaded")
+
+    def score(self, query: str, texts: Sequence[str]) -> np.ndarray:
+        pairs = [(query, text) for text in texts]
+        if self._score_fn is not None:
+            return np.asarray(self._score_fn(pairs), dtype=np.float32)
+        self.load()
+        # Single-label cross-encoders apply a sigmoid, scores are relevance probabilities
+        return np.asarray(self._model.predict(pairs, batch_size=RERANK_BATCH_SIZE, convert_to_numpy=True),
+                          dtype=np.float32)
+
+    async def rerank(self, query: str, texts: Sequence[str]) -> Optional[np.ndarray]:
+        """Relevance score per text, or None if re-ranking was bypassed."""
+        if not self.enabled or not texts:
+            return None
+        if self._pending >= self.max_pending:
+            RERANK_BYPASSED.labels(reason="saturated").inc()
+            return None
+
+        self._pending += 1
+        started = time.perf_counter()
+        future = asyncio.get_running_loop().run_in_executor(self._executor, self.score, query, list(texts))
+        future.add_done_callback(self._release)
+        try:
+            # shield: a timed out batch still frees its slot when the thread finishes
+            scores = await asyncio.wait_for(asyncio.shield(future), self.timeout)
+        except asyncio.TimeoutError:
+            RERANK_BYPASSED.labels(reason="timeout").inc()
+            return None
+        except Exception as e:
+            logger.error(f"Re-ranking {len(texts)} chunks failed: {e}")
+            RERANK_BYPASSED.labels(reason="error").inc()
+            return None
+        RERANK_LATENCY.observe(time.perf_counter() - started)
+        return scores
+
+    def _release(self, _future):
+        self._pending -= 1
+
+    async def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+reranker = CrossEncoderReranker()
@@ -0,0 +1,171 @@
+import re
+import math
+from collections import Counter
+from typing import Iterable, List, Optional, Sequence
+
+import numpy as np
+
+# Words, plus codes and ids kept whole ("inv-2024-001", "v1.2", "a/b")
+_TOKEN = re.compile(r"\w+(?:[-./:]\w+)*")
+_PART = re.compile(r"\w+")
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+RRF_K = 60
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens. Compound codes are indexed whole and as their parts."""
+    tokens = []
+    for match in _TOKEN.finditer(text.lower()):
+        token = match.group()
+        tokens.append(token)
+        if not _PART.fullmatch(token):
+            tokens.extend(_PART.findall(token))
+    return tokens
+
+
+class BM25Index:
+    """
+    Inverted index over the chunk store for Okapi BM25 scoring, keyed by
+    vector id. Chunks are added and removed incrementally, so ingest and
+    deletion never rebuild it; compaction, which renumbers ids, does.
+    """
+
+    def __init__(self, k1: float = BM25_K1, b: float = BM25_B):
+        self.k1 = k1
+        self.b = b
+        # term -> {vector id: term frequency}
+        self.postings: dict[str, dict[int, int]] = {}
+        # Token count per vector id, 0 for removed (or never added) ids
+        self.doc_lengths = np.zeros(0, dtype=np.int32)
+        self.num_docs = 0
+        self.total_length = 0
+        # Terms whose posting dict is still shared with the index this one was copied from
+        self._shared: set = set()
+
+    def __len__(self) -> int:
+        return self.num_docs
+
+    def copy(self) -> "BM25Index":
+        """
+        A copy to change while this index keeps serving searches. Posting
+        dicts are shared until the copy first writes to them.
+        """
+        other = BM25Index(self.k1, self.b)
+        other.postings = dict(self.postings)
+        other.doc_lengths = self.doc_lengths.copy()
+        other.num_docs = self.num_docs
+        other.total_length = self.total_length
+        other._shared = set(self.postings)
+        return other
+
+    def _writable(self, term: str) -> dict:
+        postings = self.postings.get(term)
+        if postings is None:
+            postings = self.postings[term] = {}
+        elif term in self._shared:
+            postings = self.postings[term] = dict(postings)
+            self._shared.discard(term)
+        return postings
+
+    def add(self, ids: Iterable[int], texts: Iterable[str]):
+        ids = [int(i) for i in ids]
+        if not ids:
+            return
+        if max(ids) >= len(self.doc_lengths):
+            grown = np.zeros(max(max(ids) + 1, 2 * len(self.doc_lengths)), dtype=np.int32)
+            grown[:len(self.doc_lengths)] = self.doc_lengths
+            self.doc_lengths = grown
+        for vector_id, text in zip(ids, texts):
+            if self.doc_lengths[vector_id]:
+                continue
+            tokens = tokenize(text)
+            if not tokens:
+                continue
+            for term, count in Counter(tokens).items():
+                self._writable(term)[vector_id] = count
+            self.doc_lengths[vector_id] = len(tokens)
+            self.num_docs += 1
+            self.total_length += len(tokens)
+
+    def remove(self, ids: Iterable[int], texts: Iterable[str]):
+        """Drop vectors from the index, texts are needed to find their postings."""
+        for vector_id, text in zip((int(i) for i in ids), texts):
+            if vector_id >= len(self.doc_lengths) or not self.doc_lengths[vector_id]:
+                continue
+            for term in set(tokenize(text)):
+                if term in self.postings:
+                    postings = self._writable(term)
+                    postings.pop(vector_id, None)
+                    if not postings:
+                        del self.postings[term]
+            self.total_length -= int(self.doc_lengths[vector_id])
+            self.doc_lengths[vector_id] = 0
+            self.num_docs -= 1
+
+    def search(self, query: str, k: int = 5, allowed_ids: Optional[np.ndarray] = None):
+        """
+        Top k (scores, ids) for the query, as (1, k) arrays padded with -1
+        like a FAISS search. allowed_ids restricts results to those vector ids.
+        """
+        scores = np.zeros(len(self.doc_lengths), dtype=np.float32)
+        if self.num_docs:
+            avg_length = self.total_length / self.num_docs
+            for term in set(tokenize(query)):
+                postings = self.postings.get(term)
+                if not postings:
+                    continue
+                ids = np.fromiter(postings.keys(), dtype=np.int64, count=len(postings))
+                tf = np.fromiter(postings.values(), dtype=np.float32, count=len(postings))
+                idf = math.log(1 + (self.num_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                length_norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[ids] / avg_length)
+                scores[ids] += idf * tf * (self.k1 + 1) / (tf + length_norm)
+        if allowed_ids is not None:
+            mask = np.zeros(len(scores), dtype=bool)
+            allowed_ids = allowed_ids[allowed_ids < len(scores)]
+            mask[allowed_ids] = True
+            scores[~mask] = 0
+
+        top_scores = np.zeros((1, k), dtype=np.float32)
+        top_ids = np.full((1, k), -1, dtype=np.int64)
+        matched = np.flatnonzero(scores > 0)
+        if len(matched) > k:
+            matched = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        matched = matched[np.argsort(-scores[matched], kind="stable")]
+        top_scores[0, :len(matched)] = scores[matched]
+        top_ids[0, :len(matched)] = matched
+        return top_scores, top_ids
+
+    def contains_any(self, ids: np.ndarray, query: str) -> np.ndarray:
+        """Mask of ids whose chunk has at least one of the query's tokens, read off the postings."""
+        hits = np.zeros(len(ids), dtype=bool)
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            if len(postings) < len(ids):
+                # Rare term, match its few postings against the candidates
+                hits |= np.isin(ids, np.fromiter(postings.keys(), dtype=np.int64, count=len(postings)))
+            else:
+                # Common term, never read the whole posting list
+                hits |= np.fromiter((int(i) in postings for i in ids), dtype=bool, count=len(ids))
+        return hits
+
+
+def reciprocal_rank_fusion(rankings: Sequence[np.ndarray], k: int, rrf_k: int = RRF_K):
+    """
+    Fuse ranked id lists (-1 entries are ignored) by summing 1 / (rrf_k + rank).
+    Returns (scores, ids) as (1, k) arrays padded with -1, best first.
+    """
+    fused: dict[int, float] = {}
+    for ranking in rankings:
+        for rank, vector_id in enumerate(int(i) for i in np.ravel(ranking) if i != -1):
+            fused[vector_id] = fused.get(vector_id, 0.0) + 1.0 / (rrf_k + rank + 1)
+    best = sorted(fused.items(), key=lambda item: -item[1])[:k]
+    scores = np.zeros((1, k), dtype=np.float32)
+    ids = np.full((1, k), -1, dtype=np.int64)
+    for position, (vector_id, score) in enumerate(best):
+        scores[0, position] = score
+        ids[0, position] = vector_id
+    return scores, ids
@@ -0,0 +1,82 @@
+import os
+import mmap
+import numpy as np
+
+CHUNKS_FILE = "chunks.bin"
+OFFSETS_FILE = "chunks.idx.npy"
+
+
+class ChunkStore:
+    """
+    List-like store of chunk texts backed by an offset-indexed file.
+    Chunks loaded from a snapshot stay in a memory-mapped file and are decoded
+    on access, chunks added since then are kept in memory until the next save.
+    """
+
+    def __init__(self):
+        self._file = None
+        self._data = None
+        self._offsets = np.zeros(1, dtype=np.uint64)
+        self._pending: list[str] = []
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1 + len(self._pending)
+
+    def __getitem__(self, idx: int) -> str:
+        stored = len(self._offsets) - 1
+        if idx < 0:
+            idx += len(self)
+        if 0 <= idx < stored:
+            start, end = int(self._offsets[idx]), int(self._offsets[idx + 1])
+            return self._data[start:end].decode("utf-8")
+        if stored <= idx < len(self):
+            return self._pending[idx - stored]
+        raise IndexError("chunk index out of range")
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def copy(self) -> "ChunkStore":
+        # The mapped file is read-only and shared, only the pending chunks are copied
+        store = ChunkStore()
+        store._file, store._data, store._offsets = self._file, self._data, self._offsets
+        store._pending = list(self._pending)
+        return store
+
+    def extend(self, chunks: list[str]):
+        self._pending.extend(chunks)
+
+    def save(self, directory: str):
+        # Stored bytes are copied as-is, only pending chunks need encoding
+        stored_size = int(self._offsets[-1])
+        offsets = [self._offsets]
+        position = stored_size
+        new_offsets = []
+        with open(os.path.join(directory, CHUNKS_FILE), "wb") as f:
+            if stored_size:
+                f.write(self._data[:stored_size])
+            for chunk in self._pending:
+                encoded = chunk.encode("utf-8")
+                f.write(encoded)
+                position += len(encoded)
+                new_offsets.append(position)
+        offsets.append(np.asarray(new_offsets, dtype=np.uint64))
+        np.save(os.path.join(directory, OFFSETS_FILE), np.concatenate(offsets))
+
+    @classmethod
+    def load(cls, directory: str) -> "ChunkStore":
+        store = cls()
+        store._offsets = np.load(os.path.join(directory, OFFSETS_FILE), mmap_mode="r")
+        if int(store._offsets[-1]) > 0:
+            store._file = open(os.path.join(directory, CHUNKS_FILE), "rb")
+            store._data = mmap.mmap(store._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return store
+
+    def close(self):
+        if self._data is not None:
+            self._data.close()
+            self._data = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
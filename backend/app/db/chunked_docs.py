@@ -1,11 +1,189 @@
-from langchain.text_splitter import CharacterTextSplitter
-
-def chunk_text(text: str, chunk_size: int = 2000, chunk_overlap: int = 200):
-    text_splitter = CharacterTextSplitter(
-        separator="\n",
-        chunk_size=chunk_size,
-        chunk_overlap=chunk_overlap,
-        length_function=len
-    )
-    chunks = text_splitter.split_text(text)
-    return chunks
+import re
+import logging
+from functools import lru_cache
+from typing import Callable, List, NamedTuple, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class PageChunk(NamedTuple):
+    text: str
+    page_start: int
+    page_end: int
+
+
+# Token-budgeted chunking
+TokenCounter = Callable[[List[str]], List[int]]
+
+# Markdown headings, "1. Scope" / "2.3 Terms" / "IV. Results", and "Chapter 3" / "PART II" / "Appendix A".
+# Wrapped prose starting "part of", "section A of" or "10 employees" must not match
+_HEADING = re.compile(r"^(#{1,6}\s"
+                      r"|(\d+\.(\d+\.?)*|[IVXLC]+\.)\s+[A-Z]"
+                      r"|(?i:chapter|section|part|appendix)\s+(\d+(\.\d+)*|[IVXLC]+|[A-Z])(\s*[-:.]?\s+[A-Z]|\s*$))")
+_SENTENCE_END = re.compile(r"(?<=[.!?])[\"')\]]*\s+(?=[\"'(\[]?[A-Z0-9])")
+_APPROX_TOKEN = re.compile(r"\w+|[^\w\s]")
+
+
+def approximate_token_count(texts: List[str]) -> List[int]:
+    # Word pieces run a little above words and punctuation marks
+    return [int(len(_APPROX_TOKEN.findall(text)) * 1.3) + 1 for text in texts]
+
+
+@lru_cache(maxsize=4)
+def load_token_counter(model_name: str) -> TokenCounter:
+    """
+    Counts tokens with the embedding model's own tokenizer, so chunks fit its
+    input window. Falls back to an estimate when the tokenizer can't be loaded.
+    """
+    try:
+        from huggingface_hub import hf_hub_download
+        from tokenizers import Tokenizer
+
+        tokenizer = Tokenizer.from_file(hf_hub_download(model_name, "tokenizer.json"))
+        tokenizer.no_truncation()
+        tokenizer.no_padding()
+    except Exception as e:
+        logger.warning(f"Tokenizer for {model_name} unavailable, estimating token counts: {e}")
+        return approximate_token_count
+
+    def count(texts: List[str]) -> List[int]:
+        return [len(encoding.ids) for encoding in tokenizer.encode_batch(texts, add_special_tokens=False)]
+    return count
+
+
+def is_heading(line: str) -> bool:
+    line = line.strip()
+    if not line or len(line) > 80 or line[-1] in ".,;:":
+        return False
+    if line.startswith("#"):
+        return bool(_HEADING.match(line))
+    if _HEADING.match(line) and len(line.split()) <= 10:
+        return True
+    letters = [c for c in line if c.isalpha()]
+    return len(letters) >= 3 and all(c.isupper() for c in letters) and len(line.split()) <= 10
+
+
+class _Unit(NamedTuple):
+    text: str
+    tokens: int
+    page: int
+
+
+class TokenChunker:
+    """
+    Page-fed chunker that budgets in tokenizer tokens rather than characters.
+    Headings start a new chunk, a run of them ("CHAPTER 1" and its title)
+    stays with the body that follows. Paragraphs are kept whole when they fit and
+    otherwise split between sentences, and consecutive chunks of a section
+    overlap by whole sentences. Each chunk records the pages it came from.
+    """
+
+    def __init__(self, max_tokens: int = 200, overlap_tokens: int = 32,
+                 token_counter: TokenCounter = approximate_token_count):
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+        self.count_tokens = token_counter
+        self._current: List[_Unit] = []
+        self._tokens = 0
+        # The current chunk holds only headings so far
+        self._headings_only = False
+
+    def feed(self, page: int, text: str) -> List[PageChunk]:
+        chunks: List[PageChunk] = []
+        blocks = _blocks(text)
+        # One tokenizer call per page
+        sentences = [_sentences(text, start, end) if kind == "paragraph" else [(start, end)]
+                     for kind, start, end in blocks]
+        flat = [" ".join(text[start:end].split()) for spans in sentences for start, end in spans]
+        counts = iter(self.count_tokens(flat) if flat else [])
+        pieces = iter(flat)
+        for (kind, _, _), spans in zip(blocks, sentences):
+            units = [_Unit(next(pieces), next(counts), page) for _ in spans]
+            units = [piece for unit in units if unit.text for piece in self._fit(unit)]
+            if kind == "heading":
+                if not self._headings_only:
+                    self._flush(chunks, overlap=False)
+                self._append(units)
+                self._headings_only = True
+            else:
+                self._add_paragraph(units, chunks)
+                self._headings_only = False
+        return chunks
+
+    def finish(self) -> List[PageChunk]:
+        chunks: List[PageChunk] = []
+        self._flush(chunks, overlap=False)
+        return chunks
+
+    def _add_paragraph(self, units: List[_Unit], chunks: List[PageChunk]):
+        total = sum(unit.tokens for unit in units)
+        if self._tokens + total > self.max_tokens and self._tokens >= self.max_tokens // 2 \
+                and not self._headings_only:
+            # Start the paragraph in a fresh chunk rather than splitting it needlessly
+            self._flush(chunks, overlap=total > self.max_tokens)
+        for unit in units:
+            if self._tokens + unit.tokens > self.max_tokens and self._current:
+                self._flush(chunks, overlap=True)
+            self._append([unit])
+
+    def _append(self, units: List[_Unit]):
+        self._current.extend(units)
+        self._tokens += sum(unit.tokens for unit in units)
+
+    def _flush(self, chunks: List[PageChunk], overlap: bool):
+        if not self._current:
+            return
+        chunks.append(PageChunk(" ".join(unit.text for unit in self._current),
+                                self._current[0].page, self._current[-1].page))
+        carried: List[_Unit] = []
+        if overlap:
+            tokens = 0
+            for unit in reversed(self._current[1:]):
+                if tokens + unit.tokens > self.overlap_tokens:
+                    break
+                carried.insert(0, unit)
+                tokens += unit.tokens
+        self._current = carried
+        self._tokens = sum(unit.tokens for unit in carried)
+
+    def _fit(self, unit: _Unit) -> List[_Unit]:
+        # A sentence longer than the budget is cut between words
+        if unit.tokens <= self.max_tokens:
+            return [unit]
+        words = unit.text.split(" ")
+        if len(words) < 2:
+            return [unit]
+        middle = len(words) // 2
+        left, right = " ".join(words[:middle]), " ".join(words[middle:])
+        left_tokens, right_tokens = self.count_tokens([left, right])
+        return self._fit(_Unit(left, left_tokens, unit.page)) + self._fit(_Unit(right, right_tokens, unit.page))
+
+
+def _blocks(text: str) -> List[Tuple[str, int, int]]:
+    """(kind, start, end) spans of headings and paragraphs, split on blank lines."""
+    blocks = []
+    paragraph_start = None
+    position = 0
+    for line in text.split("\n"):
+        start, end = position, position + len(line)
+        position = end + 1
+        if not line.strip() or is_heading(line):
+            if paragraph_start is not None:
+                blocks.append(("paragraph", paragraph_start, start - 1))
+                paragraph_start = None
+            if line.strip():
+                blocks.append(("heading", start, end))
+        elif paragraph_start is None:
+            paragraph_start = start
+    if paragraph_start is not None:
+        blocks.append(("paragraph", paragraph_start, len(text)))
+    return blocks
+
+
+def _sentences(text: str, start: int, end: int) -> List[Tuple[int, int]]:
+    spans = []
+    for boundary in _SENTENCE_END.finditer(text, start, end):
+        spans.append((start, boundary.start()))
+        start = boundary.end()
+    spans.append((start, end))
+    return spans
@@ -1,37 +1,83 @@
-from typing import Optional, List
-from datetime import datetime
-
-from backend.app.db.supabase_client import supabase
+import os
+import base64
+from typing import Optional, List, Tuple
+from datetime import datetime, timezone
+
+from backend.app.core.cache import TTLCache
+from backend.app.db.database import get_db
+
+PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", "50"))
+MAX_PAGE_SIZE = 200
+
+# Latest page of each session's messages, dropped whenever the session gets a write
+_message_writes = 0
+recent_messages_cache = TTLCache("recent_messages", maxsize=int(os.getenv("RECENT_MESSAGES_CACHE_SIZE", "1024")),
+                                 ttl=float(os.getenv("RECENT_MESSAGES_CACHE_TTL", "300")))
+
+# 0) Pagination cursors, opaque to clients: the (created_at, id) of the last row returned
+def encode_cursor(row: dict) -> str:
+    return base64.urlsafe_b64encode(f"{row['created_at']}|{row['id']}".encode()).decode()
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    try:
+        created_at, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|", 1)
+        datetime.fromisoformat(created_at)
+    except Exception:
+        raise ValueError("Invalid cursor")
+    return created_at, row_id
+
+def _invalidate_recent(session_id: Optional[str] = None):
+    global _message_writes
+    _message_writes += 1
+    if session_id is None:
+        recent_messages_cache.clear()
+    else:
+        recent_messages_cache.pop(session_id)
+
+async def _get_page(table: str, filters: dict, limit: int, before: Optional[Tuple[str, str]]) -> Tuple[List[dict], Optional[str]]:
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    # One extra row tells whether an older page exists
+    rows = await get_db().select_page(table, filters, limit=limit + 1, before=before)
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
 
 # 1) Sessions
 
 # Creating Sessions
 async def create_session(user_id: Optional[str] = None) -> str:
     data = {"user_id": user_id, "status": "active"}
-    response = supabase.table("sessions").insert(data).execute()
-    if hasattr(response, "error") and response.error:
-        raise Exception(f"Failed to create session: {response.error.message}")
-    if not response.data:
-        raise Exception("No data returned from Supabase")
-    return response.data[0]["id"]
+    try:
+        rows = await get_db().insert("sessions", [data])
+    except Exception as e:
+        raise Exception(f"Failed to create session: {e}")
+    if not rows:
+        raise Exception("No data returned from database")
+    return rows[0]["id"]
 
 # Fetch Session
 async def get_session(session_id: str) -> Optional[dict]:
-    response = supabase.table("sessions").select("*").eq("id", session_id).execute()
-    if hasattr(response, "error") and response.error:
+    try:
+        rows = await get_db().select("sessions", {"id": session_id})
+    except Exception:
         return None
-    if not response.data:
+    if not rows:
         return None
-    return response.data[0]
+    return rows[0]
 
 # Get All Session
 async def get_all_sessions() -> list[dict]:
-    response = supabase.table("sessions").select("*").order("created_at", desc=True).execute()
-    if hasattr(response, "error") and response.error:
-        raise Exception(f"Failed to get sessions: {response.error.message}")
-    if not response.data:
-        return []
-    return response.data
+    try:
+        return await get_db().select("sessions", order_by="created_at", desc=True)
+    except Exception as e:
+        raise Exception(f"Failed to get sessions: {e}")
+
+# Get one page of sessions, newest first
+async def get_sessions_page(limit: int = PAGE_SIZE, before: Optional[str] = None) -> Tuple[List[dict], Optional[str]]:
+    keyset = decode_cursor(before) if before else None
+    try:
+        return await _get_page("sessions", {}, limit, keyset)
+    except Exception as e:
+        raise Exception(f"Failed to get sessions: {e}")
 
 
 # 2) Messages
@@ -42,23 +88,58 @@ async def create_message(session_id: str, content: str, role: str = "user", mess
         "content": content,
         "role": role,
         "message_type": message_type,
-        "created_at": datetime.utcnow().isoformat()
+        "created_at": datetime.now(timezone.utc)
     }
-    response = supabase.table("messages").insert(data).execute()
-    if hasattr(response, "error") and response.error:
-        raise Exception(f"Failed to create message: {response.error.message}")
-    if not response.data:
-        raise Exception("No data returned from Supabase")
-    return response.data[0]["id"]
+    try:
+        rows = await get_db().insert("messages", [data])
+    except Exception as e:
+        raise Exception(f"Failed to create message: {e}")
+    finally:
+        _invalidate_recent(session_id)
+    if not rows:
+        raise Exception("No data returned from database")
+    return rows[0]["id"]
+
+# Create many messages in one insert, rows already carry their id and created_at
+async def create_messages(messages: List[dict]) -> List[str]:
+    if not messages:
+        return []
+    try:
+        # Retried batches may have been written already, skip rows whose id exists
+        await get_db().insert("messages", messages, ignore_conflicts=True)
+    except Exception as e:
+        raise Exception(f"Failed to create messages: {e}")
+    finally:
+        for session_id in {m["session_id"] for m in messages}:
+            _invalidate_recent(session_id)
+    return [m["id"] for m in messages]
 
 # Fetch Message By session_id
 async def get_messages_by_session(session_id: str) -> List[dict]:
-    response = supabase.table("messages").select("*").eq("session_id", session_id).order("created_at").execute()
-    if hasattr(response, "error") and response.error:
-        raise Exception(f"Failed to get messages: {response.error.message}")
-    if not response.data:
-        return []
-    return response.data
+    try:
+        return await get_db().select("messages", {"session_id": session_id}, order_by="created_at")
+    except Exception as e:
+        raise Exception(f"Failed to get messages: {e}")
+
+# Fetch one page of a session's messages, oldest first within the page. before=None is the latest page
+async def get_messages_page(session_id: str, limit: int = PAGE_SIZE,
+                            before: Optional[str] = None) -> Tuple[List[dict], Optional[str]]:
+    keyset = decode_cursor(before) if before else None
+    cacheable = keyset is None and limit == PAGE_SIZE
+    if cacheable:
+        cached = recent_messages_cache.get(session_id)
+        if cached is not None:
+            return list(cached[0]), cached[1]
+    writes_before = _message_writes
+    try:
+        rows, next_cursor = await _get_page("messages", {"session_id": session_id}, limit, keyset)
+    except Exception as e:
+        raise Exception(f"Failed to get messages: {e}")
+    rows.reverse()
+    # A write that landed while we were reading may be missing from rows
+    if cacheable and writes_before == _message_writes:
+        recent_messages_cache.set(session_id, (rows, next_cursor))
+    return list(rows), next_cursor
 
 
 # 3) Documents
@@ -69,23 +150,22 @@ async def create_document(session_id: Optional[str], file_name: str, file_url: s
         "file_name": file_name,
         "file_url": file_url,
         "do_not_store": do_not_store,
-        "created_at": datetime.utcnow().isoformat()
+        "created_at": datetime.now(timezone.utc)
     }
-    response = supabase.table("documents").insert(data).execute()
-    if hasattr(response, "error") and response.error:
-        raise Exception(f"Failed to create document: {response.error.message}")
-    if not response.data:
-        raise Exception("No data returned from Supabase")
-    return response.data[0]["id"]
+    try:
+        rows = await get_db().insert("documents", [data])
+    except Exception as e:
+        raise Exception(f"Failed to create document: {e}")
+    if not rows:
+        raise Exception("No data returned from database")
+    return rows[0]["id"]
 
 # Fetch Document By session_id
 async def get_documents_by_session(session_id: str) -> List[dict]:
-    response = supabase.table("documents").select("*").eq("session_id", session_id).order("created_at").execute()
-    if hasattr(response, "error") and response.error:
-        raise Exception(f"Failed to get documents: {response.error.message}")
-    if not response.data:
-        return []
-    return response.data
+    try:
+        return await get_db().select("documents", {"session_id": session_id}, order_by="created_at")
+    except Exception as e:
+        raise Exception(f"Failed to get documents: {e}")
 
 
 
@@ -93,18 +173,26 @@ async def get_documents_by_session(session_id: str) -> List[dict]:
 
 # Delete session
 async def delete_session(session_id: str) -> None:
-    response = supabase.table("sessions").delete().eq("id", session_id).execute()
-    if hasattr(response, "error") and response.error:
-        raise Exception(f"Failed to delete session: {response.error.message}")
+    try:
+        await get_db().delete("sessions", {"id": session_id})
+    except Exception as e:
+        raise Exception(f"Failed to delete session: {e}")
+    finally:
+        _invalidate_recent(session_id)
 
 # Delete message
 async def delete_message(message_id: str) -> None:
-    response = supabase.table("messages").delete().eq("id", message_id).execute()
-    if hasattr(response, "error") and response.error:
-        raise Exception(f"Failed to delete message: {response.error.message}")
+    try:
+        await get_db().delete("messages", {"id": message_id})
+    except Exception as e:
+        raise Exception(f"Failed to delete message: {e}")
+    finally:
+        # Only the id is known here, so every cached tail may be stale
+        _invalidate_recent()
 
 # Delete document
 async def delete_document(document_id: str) -> None:
-    response = supabase.table("documents").delete().eq("id", document_id).execute()
-    if hasattr(response, "error") and response.error:
-        raise Exception(f"Failed to delete document: {response.error.message}")
+    try:
+        await get_db().delete("documents", {"id": document_id})
+    except Exception as e:
+        raise Exception(f"Failed to delete document: {e}")
@@ -0,0 +1,298 @@
+import os
+import re
+import uuid
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+DATABASE_URL = os.getenv("DATABASE_URL")
+# postgres (asyncpg pool), supabase (async PostgREST client) or memory (tests)
+DB_BACKEND = os.getenv("DB_BACKEND", "postgres" if DATABASE_URL else "supabase")
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "2"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "5000"))
+
+# SQLSTATE classes of errors in the statement's data: 22 data exception, 23 integrity constraint violation
+PERMANENT_SQLSTATE_CLASSES = ("22", "23")
+
+_IDENTIFIER = re.compile(r"^[a-z_][a-z0-9_]*$")
+
+
+def _to_json(value: Any) -> Any:
+    # Rows look the same whichever backend they came from: string ids and ISO timestamps
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    return value
+
+
+def _row(record) -> dict:
+    return {key: _to_json(value) for key, value in dict(record).items()}
+
+
+def _parse_time(value) -> datetime:
+    return value if isinstance(value, datetime) else datetime.fromisoformat(value)
+
+
+def is_permanent_error(error: Optional[BaseException]) -> bool:
+    """
+    True when the database rejected the data itself, e.g. a constraint or
+    foreign key violation, which no retry will fix. Connection errors and
+    timeouts are not permanent. Follows wrapped exceptions down the chain.
+    """
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        # asyncpg sets sqlstate, PostgREST errors carry it as code
+        code = getattr(error, "sqlstate", None) or getattr(error, "code", None)
+        if isinstance(code, str) and len(code) == 5 and code[:2] in PERMANENT_SQLSTATE_CLASSES:
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+def _quote(name: str) -> str:
+    if not _IDENTIFIER.match(name):
+        raise ValueError(f"Invalid identifier: {name}")
+    return f'"{name}"'
+
+
+class PostgresBackend:
+    """Talks to Postgres directly over a pooled asyncpg connection."""
+
+    def __init__(self, dsn: str, min_size: int = DB_POOL_MIN_SIZE, max_size: int = DB_POOL_MAX_SIZE,
+                 statement_timeout_ms: int = DB_STATEMENT_TIMEOUT_MS):
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.statement_timeout_ms = statement_timeout_ms
+        self._pool = None
+        self._pool_lock = asyncio.Lock()
+
+    async def _get_pool(self):
+        if self._pool is None:
+            async with self._pool_lock:
+                if self._pool is None:
+                    import asyncpg
+                    self._pool = await asyncpg.create_pool(
+                        self.dsn,
+                        min_size=self.min_size,
+                        max_size=self.max_size,
+                        # Server side limit, plus a client side one in case the server never answers
+                        server_settings={"statement_timeout": str(self.statement_timeout_ms)},
+                        command_timeout=self.statement_timeout_ms / 1000 + 1,
+                    )
+        return self._pool
+
+    @staticmethod
+    def _where(filters: dict, start: int = 1) -> tuple[str, list]:
+        if not filters:
+            return "", []
+        clauses = [f"{_quote(column)} = ${start + i}" for i, column in enumerate(filters)]
+        return " WHERE " + " AND ".join(clauses), list(filters.values())
+
+    async def insert(self, table: str, rows: list[dict], ignore_conflicts: bool = False) -> list[dict]:
+        columns = list(rows[0])
+        values, placeholders = [], []
+        for row in rows:
+            start = len(values)
+            placeholders.append("(" + ", ".join(f"${start + i + 1}" for i in range(len(columns))) + ")")
+            values.extend(row[column] for column in columns)
+        query = (f"INSERT INTO {_quote(table)} ({', '.join(_quote(c) for c in columns)}) "
+                 f"VALUES {', '.join(placeholders)}"
+                 f"{' ON CONFLICT (id) DO NOTHING' if ignore_conflicts else ''} RETURNING *")
+        pool = await self._get_pool()
+        records = await pool.fetch(query, *values)
+        return [_row(record) for record in records]
+
+    async def select(self, table: str, filters: Optional[dict] = None, order_by: Optional[str] = None,
+                     desc: bool = False) -> list[dict]:
+        where, values = self._where(filters or {})
+        query = f"SELECT * FROM {_quote(table)}{where}"
+        if order_by:
+            query += f" ORDER BY {_quote(order_by)} {'DESC' if desc else 'ASC'}"
+        pool = await self._get_pool()
+        records = await pool.fetch(query, *values)
+        return [_row(record) for record in records]
+
+    async def select_page(self, table: str, filters: Optional[dict] = None, limit: int = 50,
+                          before: Optional[tuple[str, str]] = None) -> list[dict]:
+        where, values = self._where(filters or {})
+        if before:
+            keyset = f'("created_at", "id") < (${len(values) + 1}, ${len(values) + 2})'
+            where = f"{where} AND {keyset}" if where else f" WHERE {keyset}"
+            values += [_parse_time(before[0]), before[1]]
+        query = (f'SELECT * FROM {_quote(table)}{where} '
+                 f'ORDER BY "created_at" DESC, "id" DESC LIMIT ${len(values) + 1}')
+        pool = await self._get_pool()
+        records = await pool.fetch(query, *values, limit)
+        return [_row(record) for record in records]
+
+    async def delete(self, table: str, filters: dict):
+        where, values = self._where(filters)
+        pool = await self._get_pool()
+        await pool.execute(f"DELETE FROM {_quote(table)}{where}", *values)
+
+    async def close(self):
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+
+
+class SupabaseBackend:
+    """Goes through Supabase's async PostgREST client, for deployments without a direct DB connection."""
+
+    def __init__(self, url: Optional[str], key: Optional[str], timeout_ms: int = DB_STATEMENT_TIMEOUT_MS):
+        self.url = url
+        self.key = key
+        self.timeout_ms = timeout_ms
+        self._client = None
+        self._client_lock = asyncio.Lock()
+
+    async def _get_client(self):
+        if self._client is None:
+            async with self._client_lock:
+                if self._client is None:
+                    from supabase import acreate_client, AsyncClientOptions
+                    options = AsyncClientOptions(postgrest_client_timeout=self.timeout_ms / 1000)
+                    self._client = await acreate_client(self.url, self.key, options=options)
+        return self._client
+
+    async def insert(self, table: str, rows: list[dict], ignore_conflicts: bool = False) -> list[dict]:
+        client = await self._get_client()
+        payload = [{key: _to_json(value) for key, value in row.items()} for row in rows]
+        if ignore_conflicts:
+            response = await client.table(table).upsert(payload, ignore_duplicates=True).execute()
+        else:
+            response = await client.table(table).insert(payload).execute()
+        return response.data or []
+
+    async def select(self, table: str, filters: Optional[dict] = None, order_by: Optional[str] = None,
+                     desc: bool = False) -> list[dict]:
+        client = await self._get_client()
+        query = client.table(table).select("*")
+        for column, value in (filters or {}).items():
+            query = query.eq(column, _to_json(value))
+        if order_by:
+            query = query.order(order_by, desc=desc)
+        response = await query.execute()
+        return response.data or []
+
+    async def select_page(self, table: str, filters: Optional[dict] = None, limit: int = 50,
+                          before: Optional[tuple[str, str]] = None) -> list[dict]:
+        client = await self._get_client()
+        query = client.table(table).select("*")
+        for column, value in (filters or {}).items():
+            query = query.eq(column, _to_json(value))
+        if before:
+            created_at, row_id = before
+            # Timestamps contain reserved characters (: .), so they are quoted
+            query = query.or_(f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt.{row_id})')
+        response = await query.order("created_at", desc=True).order("id", desc=True).limit(limit).execute()
+        return response.data or []
+
+    async def delete(self, table: str, filters: dict):
+        client = await self._get_client()
+        query = client.table(table).delete()
+        for column, value in filters.items():
+            query = query.eq(column, _to_json(value))
+        await query.execute()
+
+    async def close(self):
+        self._client = None
+
+
+class MemoryBackend:
+    """In-process tables for tests and local runs, fills in ids and created_at like the DB defaults."""
+
+    def __init__(self):
+        self.tables: dict[str, list[dict]] = {}
+        self._last_created: Optional[datetime] = None
+
+    def _now(self) -> datetime:
+        # Strictly increasing, so rows inserted back to back still sort in insert order
+        now = datetime.now(timezone.utc)
+        if self._last_created is not None and now <= self._last_created:
+            now = self._last_created + timedelta(microseconds=1)
+        self._last_created = now
+        return now
+
+    async def insert(self, table: str, rows: list[dict], ignore_conflicts: bool = False) -> list[dict]:
+        inserted = []
+        existing = {row["id"] for row in self.tables.get(table, [])}
+        for row in rows:
+            if row.get("id") in existing:
+                if ignore_conflicts:
+                    continue
+                raise ValueError(f"Duplicate id {row['id']} in {table}")
+            stored = {"id": str(uuid.uuid4()), "created_at": self._now()}
+            stored.update({key: value for key, value in row.items() if value is not None or key not in stored})
+            stored = {key: _to_json(value) for key, value in stored.items()}
+            self.tables.setdefault(table, []).append(stored)
+            existing.add(stored["id"])
+            inserted.append(dict(stored))
+        return inserted
+
+    async def select(self, table: str, filters: Optional[dict] = None, order_by: Optional[str] = None,
+                     desc: bool = False) -> list[dict]:
+        filters = {key: _to_json(value) for key, value in (filters or {}).items()}
+        rows = [dict(row) for row in self.tables.get(table, [])
+                if all(row.get(key) == value for key, value in filters.items())]
+        if order_by:
+            rows.sort(key=lambda row: row.get(order_by) or "", reverse=desc)
+        return rows
+
+    async def select_page(self, table: str, filters: Optional[dict] = None, limit: int = 50,
+                          before: Optional[tuple[str, str]] = None) -> list[dict]:
+        def keyset(row):
+            return _parse_time(row["created_at"]), row["id"]
+
+        rows = await self.select(table, filters)
+        if before:
+            bound = _parse_time(before[0]), before[1]
+            rows = [row for row in rows if keyset(row) < bound]
+        rows.sort(key=keyset, reverse=True)
+        return rows[:limit]
+
+    async def delete(self, table: str, filters: dict):
+        filters = {key: _to_json(value) for key, value in filters.items()}
+        self.tables[table] = [row for row in self.tables.get(table, [])
+                              if not all(row.get(key) == value for key, value in filters.items())]
+
+    async def close(self):
+        pass
+
+
+def create_backend(name: str = DB_BACKEND):
+    if name == "postgres":
+        return PostgresBackend(DATABASE_URL)
+    if name == "supabase":
+        return SupabaseBackend(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_ANON_KEY"))
+    if name == "memory":
+        return MemoryBackend()
+    raise ValueError(f"Unknown DB_BACKEND: {name}")
+
+
+db = create_backend()
+
+
+def get_db():
+    return db
+
+
+def use_backend(backend):
+    """Swaps the backend crud talks to, mainly for tests."""
+    global db
+    db = backend
+    return backend
+
+
+async def close():
+    await db.close()
@@ -1,62 +1,512 @@
+import os
+import copy
+import time
+import uuid
+import shutil
 import faiss
 import numpy as np
-from datetime import datetime, timedelta
+from typing import Optional
 
+from backend.app.db.bm25_index import BM25Index
+from backend.app.db.chunk_store import ChunkStore
+from backend.app.db.vector_metadata import NO_HASH, UNKNOWN_TIME, VectorMetadata, chunk_hash
+
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
 EMBEDDING_DIM = 384
 
+INDEX_FILE = "index.faiss"
+CURRENT_FILE = "CURRENT"
+SNAPSHOTS_TO_KEEP = 2
+
+INDEX_TYPES = ("flat", "hnsw", "ivfpq")
+# k-means wants ~39 points per centroid, the PQ codebooks need 39 * 2^nbits
+TRAINING_POINTS_PER_CENTROID = 39
+MAX_TRAINING_POINTS_PER_CENTROID = 256
+
+# Re-ranking multipliers, and how recent a chunk has to be for the recency boost
+EXACT_MATCH_BOOST = 1.1
+RECENCY_BOOST = 1.2
+RECENCY_WINDOW_SECONDS = 7 * 24 * 3600
+
+
+def build_index(index_type: str, dim: int = EMBEDDING_DIM, hnsw_m: int = 32,
+                ef_construction: int = 80, nlist: int = 256, pq_m: int = 48, pq_nbits: int = 8):
+    """
+    Create an empty inner-product index of the given type.
+    ivfpq indexes have to be trained before vectors can be added.
+    """
+    if index_type == "flat":
+        return faiss.IndexFlatIP(dim)
+    if index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, hnsw_m, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = ef_construction
+        return index
+    if index_type == "ivfpq":
+        quantizer = faiss.IndexFlatIP(dim)
+        return faiss.IndexIVFPQ(quantizer, dim, nlist, pq_m, pq_nbits, faiss.METRIC_INNER_PRODUCT)
+    raise ValueError(f"Unknown index type: {index_type}. Expected one of {INDEX_TYPES}")
+
+
+def index_type_of(index) -> str:
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexIDMap):
+        index = faiss.downcast_index(index.index)
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVF):
+        return "ivfpq"
+    return "flat"
+
+
 class FaissClient:
-    def __init__(self):
-        self.index = faiss.IndexFlatIP(EMBEDDING_DIM)
-        self.chunk_text_store = []
+    def __init__(self, index_type: str = "flat", nprobe: int = 16, ef_search: int = 64,
+                 train_threshold: int = None, embedding_store=None, **index_params):
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown index type: {index_type}. Expected one of {INDEX_TYPES}")
+        self.index_type = index_type
+        self.index_params = index_params
+        self.nprobe = nprobe
+        self.ef_search = ef_search
+        self.train_threshold = train_threshold or self._min_training_points()
+        # Original embeddings by chunk hash, so rebuilds copy vectors instead of reconstructing them
+        self.embedding_store = embedding_store
+
+        # An ivfpq index starts as flat and is trained once enough vectors exist
+        self.index = self._new_index(index_type if index_type == "hnsw" else "flat")
+        self.chunk_text_store = ChunkStore()
+        self.metadata = VectorMetadata()
+        # Lexical side of hybrid search, kept in step with the chunk store
+        self.lexical = BM25Index()
+        self.snapshot = None
+        self.snapshot_path = None
+        self.mapped = False
+        # Bumped on every change to the searchable data, used to invalidate caches
+        self.version = 0
 
-    def add_embeddings(self, embeddings: np.ndarray, chunks: list[str]):
+    def fork(self) -> "FaissClient":
+        """
+        A private, writable copy to change while searches keep using this
+        client, which the copy never touches.
+        """
+        other = copy.copy(self)
+        if self.mapped:
+            # Mapped indexes can be read-only (ivfpq), the copy reads its own from the snapshot
+            other.index = faiss.read_index(os.path.join(self.snapshot_path, INDEX_FILE))
+        else:
+            other.index = faiss.deserialize_index(faiss.serialize_index(self.index))
+        other.chunk_text_store = self.chunk_text_store.copy()
+        other.metadata = self.metadata.copy()
+        other.lexical = self.lexical.copy()
+        other.mapped = False
+        return other
+
+    def _new_index(self, index_type: str):
+        # Vector ids are chunk store positions, kept explicitly so they survive rebuilds
+        return faiss.IndexIDMap2(build_index(index_type, **self.index_params))
+
+    def add_embeddings(self, embeddings: np.ndarray, chunks: list[str], doc_id: str = None,
+                       session_id: str = None, user_id: str = None, hashes: list[bytes] = None,
+                       file_hash: str = None, pages: list[int] = None, positions: list[int] = None):
+        if hashes is None:
+            hashes = [chunk_hash(chunk) for chunk in chunks]
+        if self.embedding_store is not None:
+            # Kept as produced by the model, rebuilds normalize on the way out
+            self.embedding_store.put(hashes, embeddings)
         faiss.normalize_L2(embeddings)
-        self.index.add(embeddings)
+        start = len(self.chunk_text_store)
+        ids = np.arange(start, start + len(chunks), dtype=np.int64)
+        self.index.add_with_ids(embeddings, ids)
         self.chunk_text_store.extend(chunks)
+        self.metadata.add(len(chunks), doc_id=doc_id, session_id=session_id, user_id=user_id,
+                          hashes=hashes, file_hash=file_hash, added_at=time.time(), pages=pages,
+                          positions=positions)
+        self.lexical.add(ids, chunks)
+        self._maybe_train()
+        self.version += 1
+        return ids
+
+    # Deduplication
+    def find_chunks(self, hashes: list[bytes]) -> np.ndarray:
+        """Existing live vector id for each chunk hash, -1 where the chunk is new."""
+        return self.metadata.find_chunks(hashes)
 
-    def search(self, query_embedding: np.ndarray, k: int = 5):
+    def find_document(self, file_hash: str):
+        """Id of an indexed document uploaded from the same file, if any."""
+        return self.metadata.find_document(file_hash)
+
+    def link_document(self, ids: np.ndarray, doc_id: str, session_id: str = None,
+                      user_id: str = None, file_hash: str = None) -> int:
+        """Make already indexed vectors part of doc_id as well, instead of adding copies."""
+        linked = self.metadata.link(ids, doc_id, session_id=session_id, user_id=user_id, file_hash=file_hash)
+        if linked:
+            self.version += 1
+        return linked
+
+    def alias_document(self, source_doc_id: str, doc_id: str, session_id: str = None,
+                       user_id: str = None, file_hash: str = None) -> np.ndarray:
+        """Link every live vector of source_doc_id to doc_id. Returns the ids, empty if the source is gone."""
+        ids = self.metadata.ids_for_document(source_doc_id)
+        if len(ids):
+            self.link_document(ids, doc_id, session_id=session_id, user_id=user_id, file_hash=file_hash)
+        return ids
+
+    def search(self, query_embedding: np.ndarray, k: int = 5, session_id: str = None, user_id: str = None):
+        """
+        Search the index, restricted to the vectors of a session's or user's
+        documents (plus shared ones) when session_id or user_id is given.
+        """
         faiss.normalize_L2(query_embedding)
-        distances, indices = self.index.search(query_embedding, k)
+        selector = None
+        if session_id is not None or user_id is not None:
+            allowed_ids = self.metadata.ids_for_scope(session_id=session_id, user_id=user_id)
+            if len(allowed_ids) == 0:
+                n = len(query_embedding)
+                return np.zeros((n, k), dtype="float32"), np.full((n, k), -1, dtype=np.int64)
+            selector = faiss.IDSelectorBatch(allowed_ids)
+        elif self.metadata.deleted.any():
+            # Tombstoned vectors stay in the index until compaction, skip them
+            deleted_selector = faiss.IDSelectorBatch(self.metadata.deleted_ids())
+            selector = faiss.IDSelectorNot(deleted_selector)
+        distances, indices = self.index.search(query_embedding, k, params=self._search_params(selector))
         return distances, indices
 
+    def search_lexical(self, query: str, k: int = 5, session_id: str = None, user_id: str = None):
+        """BM25 counterpart of search, same scoping and (scores, ids) shape."""
+        allowed_ids = None
+        if session_id is not None or user_id is not None:
+            allowed_ids = self.metadata.ids_for_scope(session_id=session_id, user_id=user_id)
+        # Deleted vectors were removed from the lexical index already
+        return self.lexical.search(query, k, allowed_ids=allowed_ids)
+
+    def _search_params(self, selector=None):
+        active_type = index_type_of(self.index)
+        if active_type == "hnsw":
+            return faiss.SearchParametersHNSW(efSearch=self.ef_search, sel=selector)
+        if active_type == "ivfpq":
+            return faiss.SearchParametersIVF(nprobe=self.nprobe, sel=selector)
+        if selector is not None:
+            return faiss.SearchParameters(sel=selector)
+        return None
+
+    # Index backends
+    def _min_training_points(self) -> int:
+        nlist = self.index_params.get("nlist", 256)
+        pq_nbits = self.index_params.get("pq_nbits", 8)
+        return TRAINING_POINTS_PER_CENTROID * max(nlist, 2 ** pq_nbits)
+
+    def _maybe_train(self):
+        # Switch the flat staging index to the trained ivfpq index once enough vectors exist
+        if (self.index_type == "ivfpq" and index_type_of(self.index) == "flat"
+                and self.index.ntotal >= self.train_threshold):
+            self.migrate()
+
+    def _reconstruct_all(self):
+        """
+        Returns (ids, vectors) of everything stored in the index. Vectors come
+        from the embedding store where it has them, so rebuilds are exact copies
+        even from a lossy ivfpq index, and the index is only decoded for the rest.
+        """
+        index = faiss.downcast_index(self.index)
+        base = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+        if base.ntotal == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros((0, EMBEDDING_DIM), dtype="float32")
+        if base is index:
+            ids = np.arange(base.ntotal, dtype=np.int64)
+        else:
+            ids = faiss.vector_to_array(index.id_map).astype(np.int64)
+        vectors, found = self._stored_vectors(ids)
+        if not found.all():
+            if isinstance(base, faiss.IndexIVF):
+                base.make_direct_map()
+            vectors[~found] = base.reconstruct_n(0, base.ntotal)[~found]
+        return ids, vectors
+
+    def _stored_vectors(self, ids: np.ndarray):
+        # (normalized vectors, found mask) for vector ids, looked up by chunk hash
+        if self.embedding_store is None:
+            return np.zeros((len(ids), EMBEDDING_DIM), dtype="float32"), np.zeros(len(ids), dtype=bool)
+        vectors, found = self.embedding_store.get(self.metadata.chunk_hashes[ids].tolist())
+        faiss.normalize_L2(vectors)
+        # Vectors from before chunk hashing all share NO_HASH, never trust it
+        found &= self.metadata.chunk_hashes[ids] != np.void(NO_HASH)
+        return vectors, found
+
+    def get_vectors(self, ids) -> np.ndarray:
+        """Normalized vectors of the given ids, from the embedding store or else the index."""
+        ids = np.asarray(ids, dtype=np.int64)
+        vectors, found = self._stored_vectors(ids)
+        if not found.all():
+            base = faiss.downcast_index(faiss.downcast_index(self.index).index)
+            if isinstance(base, faiss.IndexIVF):
+                base.make_direct_map()
+            for position in np.flatnonzero(~found):
+                vectors[position] = self.index.reconstruct(int(ids[position]))
+        return vectors
+
+    def backfill_embedding_store(self) -> int:
+        """
+        Copies vectors the embedding store lacks out of an exact (flat or hnsw)
+        index, e.g. for snapshots written before the store existed. Returns how many were stored.
+        """
+        if self.embedding_store is None or index_type_of(self.index) == "ivfpq":
+            return 0
+        live = np.flatnonzero(~self.metadata.deleted & (self.metadata.chunk_hashes != np.void(NO_HASH)))
+        _, found = self._stored_vectors(live)
+        if found.all():
+            return 0
+        ids, vectors = self._reconstruct_all()
+        missing = np.isin(ids, live[~found])
+        return self.embedding_store.put(self.metadata.chunk_hashes[ids[missing]].tolist(), vectors[missing])
+
+    def migrate(self, index_type: str = None) -> bool:
+        """
+        Rebuild the index as index_type (defaults to the configured type) from
+        the vectors already stored, so no chunk has to be embedded again.
+        Without an embedding store, reconstructing from an ivfpq index is lossy.
+        Returns False if the target needs training and there are too few vectors yet.
+        """
+        if index_type is not None:
+            if index_type not in INDEX_TYPES:
+                raise ValueError(f"Unknown index type: {index_type}. Expected one of {INDEX_TYPES}")
+            self.index_type = index_type
+
+        if (self.index_type == "ivfpq" and index_type_of(self.index) == "flat"
+                and self.index.ntotal < self.train_threshold):
+            return False
+        ids, vectors = self._reconstruct_all()
+        self.index = self._build_from(vectors, ids)
+        return index_type_of(self.index) == self.index_type
+
+    def _build_from(self, vectors: np.ndarray, ids: np.ndarray):
+        # Falls back to a flat staging index while there is too little data to train
+        if self.index_type == "ivfpq" and len(vectors) < self.train_threshold:
+            index = self._new_index("flat")
+        else:
+            index = self._new_index(self.index_type)
+        if not index.is_trained:
+            max_points = MAX_TRAINING_POINTS_PER_CENTROID * self.index_params.get("nlist", 256)
+            sample = vectors
+            if len(vectors) > max_points:
+                sample = vectors[np.random.default_rng(0).choice(len(vectors), max_points, replace=False)]
+            index.train(sample)
+        index.add_with_ids(vectors, ids)
+        return index
+
+    def needs_migration(self) -> bool:
+        # True after loading a snapshot built with a different backend
+        active_type = index_type_of(self.index)
+        if active_type == self.index_type:
+            return False
+        if self.index_type == "ivfpq" and active_type == "flat":
+            return self.index.ntotal >= self.train_threshold
+        return True
+
+    # Deletion
+    def delete_document(self, doc_id: str) -> int:
+        """
+        Tombstone a document's vectors, returns how many were newly deleted.
+        Vectors other documents still link to are kept for them.
+        """
+        return self._release([doc_id])
+
+    def delete_session(self, session_id: str) -> int:
+        return self._release(self.metadata.documents_for_session(session_id))
+
+    def _release(self, doc_ids: list[str]) -> int:
+        if not doc_ids:
+            return 0
+        released = self.metadata.release(doc_ids)
+        removed = self.metadata.mark_deleted(released)
+        self.lexical.remove(released, (self.chunk_text_store[int(i)] for i in released))
+        # Even with nothing removed, dropped links change what a session can see
+        self.version += 1
+        return removed
+
+    def tombstone_ratio(self) -> float:
+        return self.metadata.tombstone_ratio()
+
+    def compact(self) -> int:
+        """
+        Rebuild the index, chunk store and metadata from live vectors only.
+        Live vectors are renumbered 0..n-1. Returns the number of vectors dropped.
+        """
+        dropped = int(np.count_nonzero(self.metadata.deleted))
+        if dropped == 0:
+            return 0
+        ids, vectors = self._reconstruct_all()
+        vectors = vectors[np.argsort(ids)]
+        live_ids = np.flatnonzero(~self.metadata.deleted)
+
+        chunk_store = ChunkStore()
+        chunk_store.extend([self.chunk_text_store[int(i)] for i in live_ids])
+        metadata = self.metadata.compacted(live_ids)
+        self.index = self._build_from(vectors[live_ids], np.arange(len(live_ids), dtype=np.int64))
+        self.chunk_text_store = chunk_store
+        self.metadata = metadata
+        self.lexical = _build_lexical(chunk_store, metadata)
+        self.version += 1
+        return dropped
+
     def get_chunk_text(self, idx: int) -> str:
         if 0 <= idx < len(self.chunk_text_store):
             return self.chunk_text_store[idx]
         return ""
 
-    def boost_results(
-        self,chunks: list[str],distances: np.ndarray,
-        boost_recent: bool = True,boost_exact_match: bool = True,
-        query: str = "",chunk_metadata: list = None) -> list[str]:
-        scores = distances.copy()
-
-        # Filter valid chunk indices (exclude invalid -1 index)
-        valid_indices = [i for i in range(len(chunks)) if i >= 0 and i < len(chunks)]
-
-        # Boost exact match chunks by increasing their scores
-        if boost_exact_match:
-            query_terms = set(query.lower().split())
-            for i in valid_indices:
-                chunk_text = chunks[i].lower()
-                if any(term in chunk_text for term in query_terms):
-                    scores[0][i] *= 1.1
-
-        # Boost recent chunks uploaded within last 7 days
-        if boost_recent and chunk_metadata:
-            now = datetime.utcnow()
-            for i in valid_indices:
-                meta = chunk_metadata[i] if i < len(chunk_metadata) else None
-                if meta:
-                    upload_time = meta.get("upload_time")
-                    if upload_time and (now - upload_time) < timedelta(days=7):
-                        scores[0][i] *= 1.2
-
-        # Sort indices based on boosted scores in the descending order
-        sorted_indices = np.argsort(-scores[0])
-
-        # Filter sorted indices to valid range before accessing chunks
-        filtered_sorted_indices = [i for i in sorted_indices if 0 <= i < len(chunks)]
-
-        boosted_chunks = [chunks[i] for i in filtered_sorted_indices]
-
-        return boosted_chunks
+    # Persistence
+    def save(self, directory: str) -> str:
+        """
+        Write the index and chunk store as a new snapshot directory and
+        atomically point CURRENT at it. Returns the snapshot name.
+        """
+        os.makedirs(directory, exist_ok=True)
+        name = f"snapshot-{time.time_ns():020d}-{uuid.uuid4().hex[:8]}"
+        tmp_path = os.path.join(directory, f".{name}.tmp")
+        os.makedirs(tmp_path)
+        try:
+            faiss.write_index(self.index, os.path.join(tmp_path, INDEX_FILE))
+            self.chunk_text_store.save(tmp_path)
+            self.metadata.save(tmp_path)
+            os.rename(tmp_path, os.path.join(directory, name))
+        except Exception:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            raise
+
+        pointer_tmp = os.path.join(directory, f".{CURRENT_FILE}.{name}")
+        with open(pointer_tmp, "w") as f:
+            f.write(name)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(pointer_tmp, os.path.join(directory, CURRENT_FILE))
+
+        self.snapshot = name
+        _prune_snapshots(directory, keep=SNAPSHOTS_TO_KEEP)
+        return name
+
+    def load_snapshot(self, directory: str, mmap: bool = True) -> bool:
+        """
+        Replace the in-memory state with the snapshot CURRENT points at.
+        With mmap the index and chunk texts are mapped read-only, so every
+        worker loading the same snapshot shares the pages.
+        """
+        name = read_current_snapshot(directory)
+        if name is None:
+            return False
+        path = os.path.join(directory, name)
+        flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY if mmap else 0
+        index = faiss.read_index(os.path.join(path, INDEX_FILE), flags)
+        chunk_store = ChunkStore.load(path)
+        metadata = VectorMetadata.load(path, len(chunk_store))
+        if index.ntotal != len(chunk_store) or len(metadata) != len(chunk_store):
+            raise ValueError(f"Snapshot {name} is inconsistent: {index.ntotal} vectors, {len(chunk_store)} chunks")
+
+        if not isinstance(index, faiss.IndexIDMap):
+            index = _wrap_with_ids(faiss.read_index(os.path.join(path, INDEX_FILE)))
+            mmap = False
+        if metadata.missing_hashes():
+            # Snapshot predates chunk dedup, hash the stored texts once
+            metadata.set_hashes([chunk_hash(chunk) for chunk in chunk_store])
+
+        self._sync_lexical(chunk_store, metadata)
+        self.index = index
+        self.chunk_text_store = chunk_store
+        self.metadata = metadata
+        self.snapshot = name
+        self.snapshot_path = path
+        self.mapped = mmap
+        self.version += 1
+        return True
+
+    def _sync_lexical(self, chunk_store: ChunkStore, metadata: VectorMetadata):
+        # Ingest only appends and deletion only tombstones, so a newer snapshot of the
+        # same store just extends the lexical index. After a compaction it is rebuilt
+        previous = self.metadata.chunk_hashes
+        if len(previous) > len(metadata) or not np.array_equal(metadata.chunk_hashes[:len(previous)], previous):
+            self.lexical = _build_lexical(chunk_store, metadata)
+            return
+        added = np.arange(len(previous), len(metadata))
+        added = added[~metadata.deleted[added]]
+        self.lexical.add(added, (chunk_store[int(i)] for i in added))
+        newly_deleted = np.flatnonzero(metadata.deleted[:len(previous)] & ~self.metadata.deleted)
+        self.lexical.remove(newly_deleted, (chunk_store[int(i)] for i in newly_deleted))
+
+    def reload_if_changed(self, directory: str, mmap: bool = True) -> bool:
+        # Picks up snapshots written by other workers
+        name = read_current_snapshot(directory)
+        if name is None or name == self.snapshot:
+            return False
+        return self.load_snapshot(directory, mmap=mmap)
+
+    def reloaded(self, directory: str, mmap: bool = True) -> Optional["FaissClient"]:
+        """
+        Like reload_if_changed, but loads into a new client and leaves this
+        one untouched. Returns None when there is no newer snapshot.
+        """
+        name = read_current_snapshot(directory)
+        if name is None or name == self.snapshot:
+            return None
+        other = copy.copy(self)
+        # Extended in place when the snapshot only appended or tombstoned
+        other.lexical = self.lexical.copy()
+        other.load_snapshot(directory, mmap=mmap)
+        return other
+
+    def boost_results(self, ids: np.ndarray, scores: np.ndarray, query: str = "",
+                      boost_recent: bool = True, boost_exact_match: bool = True, now: float = None):
+        """
+        Re-rank one row of search results (ids and scores as returned by search,
+        -1 padding allowed). Chunks containing a query term and chunks added
+        within the recency window get their score raised. Returns (id, score)
+        pairs, best first.
+        """
+        ids = np.asarray(ids, dtype=np.int64).ravel()
+        scores = np.asarray(scores, dtype=np.float32).ravel()
+        valid = (ids >= 0) & (ids < len(self.metadata))
+        ids, scores = ids[valid], scores[valid].copy()
+
+        boost = np.ones(len(ids), dtype=np.float32)
+        if boost_exact_match and query:
+            boost[self.lexical.contains_any(ids, query)] *= EXACT_MATCH_BOOST
+        if boost_recent:
+            added_at = self.metadata.added_at[ids]
+            now = time.time() if now is None else now
+            recent = (added_at != UNKNOWN_TIME) & (now - added_at < RECENCY_WINDOW_SECONDS)
+            boost[recent] *= RECENCY_BOOST
+        # Dividing negative inner products keeps a boost from pushing a chunk down
+        scores = np.where(scores >= 0, scores * boost, scores / boost)
+
+        order = np.argsort(-scores, kind="stable")
+        return list(zip(ids[order].tolist(), scores[order].tolist()))
+
+def _build_lexical(chunk_store: ChunkStore, metadata: VectorMetadata) -> BM25Index:
+    lexical = BM25Index()
+    live = np.flatnonzero(~metadata.deleted)
+    lexical.add(live, (chunk_store[int(i)] for i in live))
+    return lexical
+
+
+def _wrap_with_ids(index):
+    # Snapshots written before vector ids were explicit use positions as ids
+    base = faiss.clone_index(index)
+    if isinstance(base, faiss.IndexIVF):
+        index.make_direct_map()
+    vectors = index.reconstruct_n(0, index.ntotal) if index.ntotal else None
+    base.reset()
+    wrapped = faiss.IndexIDMap2(base)
+    if vectors is not None:
+        wrapped.add_with_ids(vectors, np.arange(len(vectors), dtype=np.int64))
+    return wrapped
+
+
+def read_current_snapshot(directory: str):
+    try:
+        with open(os.path.join(directory, CURRENT_FILE)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def _prune_snapshots(directory: str, keep: int):
+    # Older snapshots may still be mapped by other workers, unlinking them is safe on POSIX
+    snapshots = sorted(d for d in os.listdir(directory) if d.startswith("snapshot-"))
+    for name in snapshots[:-keep]:
+        shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
@@ -1,4 +1,257 @@
 # Single instance of FAISS client
 
-from backend.app.db.faiss_client import FaissClient
-faiss_client = FaissClient()
+import os
+import asyncio
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from backend.app.core.embedding_store import EmbeddingStore
+from backend.app.db.faiss_client import (EMBEDDING_DIM, EMBEDDING_MODEL, FaissClient, index_type_of,
+                                         read_current_snapshot)
+
+logger = logging.getLogger(__name__)
+
+FAISS_STORE_DIR = os.getenv("FAISS_STORE_DIR", "faiss_store")
+FAISS_MMAP = os.getenv("FAISS_MMAP", "true").lower() == "true"
+
+# Index backend: flat (exact), hnsw or ivfpq
+FAISS_INDEX_TYPE = os.getenv("FAISS_INDEX_TYPE", "flat")
+FAISS_NPROBE = int(os.getenv("FAISS_NPROBE", "16"))
+FAISS_EF_SEARCH = int(os.getenv("FAISS_EF_SEARCH", "64"))
+FAISS_HNSW_M = int(os.getenv("FAISS_HNSW_M", "32"))
+FAISS_NLIST = int(os.getenv("FAISS_NLIST", "256"))
+FAISS_PQ_M = int(os.getenv("FAISS_PQ_M", "48"))
+FAISS_TRAIN_THRESHOLD = int(os.getenv("FAISS_TRAIN_THRESHOLD", "0")) or None
+
+# Compact once this share of the stored vectors is tombstoned
+FAISS_COMPACTION_RATIO = float(os.getenv("FAISS_COMPACTION_RATIO", "0.2"))
+
+# Original embeddings by chunk hash, outlives snapshots so rebuilds never re-embed
+EMBEDDING_STORE_DIR = os.getenv("EMBEDDING_STORE_DIR", os.path.join(FAISS_STORE_DIR, "embeddings"))
+# float32, float16 (default, half the disk) or int8 (a quarter, small recall cost)
+EMBEDDING_STORE_DTYPE = os.getenv("EMBEDDING_STORE_DTYPE", "float16")
+
+# Opened by load_index, opening it creates its directory
+_embedding_store: Optional[EmbeddingStore] = None
+# The published client. Writers never change it: they change a fork and publish that
+# in its place, so searches running meanwhile see one consistent index
+_client = FaissClient(
+    index_type=FAISS_INDEX_TYPE,
+    nprobe=FAISS_NPROBE,
+    ef_search=FAISS_EF_SEARCH,
+    train_threshold=FAISS_TRAIN_THRESHOLD,
+    hnsw_m=FAISS_HNSW_M,
+    nlist=FAISS_NLIST,
+    pq_m=FAISS_PQ_M,
+)
+_write_lock = threading.Lock()
+_publish_lock = threading.Lock()
+_load_lock = threading.Lock()
+_loaded = False
+_compaction_task = None
+
+
+def current_client() -> FaissClient:
+    """
+    The published client. Take it once per request and use that reference
+    throughout: vector ids are only meaningful within one client, a
+    compaction publishes a client with the ids renumbered.
+    """
+    return _client
+
+
+def get_embedding_store() -> EmbeddingStore:
+    ensure_index_loaded()
+    return _embedding_store
+
+
+def _publish(client: FaissClient, base: FaissClient = None) -> bool:
+    """
+    Make client the published one. With base, only if base is still
+    published, so a reload that lost a race never replaces a newer client.
+    """
+    global _client
+    with _publish_lock:
+        if base is not None and _client is not base:
+            return False
+        # Caches key on the version, it must not repeat across clients
+        client.version = max(client.version, _client.version + 1)
+        _client = client
+        return True
+
+
+def _reload(base: FaissClient):
+    client = base.reloaded(FAISS_STORE_DIR, mmap=FAISS_MMAP)
+    if client is not None:
+        _publish(client, base)
+
+
+def refresh_index():
+    ensure_index_loaded()
+    # Cheap check for snapshots written by another worker
+    try:
+        _reload(_client)
+    except Exception as e:
+        logger.error(f"Failed to reload FAISS snapshot: {e}")
+
+
+async def latest_client() -> FaissClient:
+    """
+    refresh_index then current_client, for the event loop: only reading
+    CURRENT happens on the loop, loading a snapshot runs in a thread.
+    """
+    if not _loaded or read_current_snapshot(FAISS_STORE_DIR) != _client.snapshot:
+        await asyncio.to_thread(refresh_index)
+    return _client
+
+
+@contextmanager
+def _store_lock():
+    os.makedirs(FAISS_STORE_DIR, exist_ok=True)
+    with open(os.path.join(FAISS_STORE_DIR, ".lock"), "w") as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _save_and_publish(client: FaissClient):
+    client.save(FAISS_STORE_DIR)
+    if FAISS_MMAP:
+        client.load_snapshot(FAISS_STORE_DIR, mmap=True)
+    _publish(client)
+
+
+def _reload_latest():
+    # Under the store lock: start from the snapshot other workers wrote last
+    _reload(_client)
+
+
+def load_index():
+    """
+    Warm start from the last snapshot instead of an empty index. A snapshot
+    built with another backend is migrated to FAISS_INDEX_TYPE from its stored vectors.
+    """
+    global _embedding_store
+    _embedding_store = EmbeddingStore(EMBEDDING_STORE_DIR, EMBEDDING_MODEL, EMBEDDING_DIM,
+                                      dtype=EMBEDDING_STORE_DTYPE)
+    # Nothing is loaded or published yet, the client is still empty
+    _client.embedding_store = _embedding_store
+    try:
+        client = _client.reloaded(FAISS_STORE_DIR, mmap=FAISS_MMAP)
+        if client is None:
+            return
+        logger.info(f"Loaded FAISS snapshot {client.snapshot} with {client.index.ntotal} vectors")
+    except Exception as e:
+        logger.error(f"Failed to load FAISS snapshot, starting with an empty index: {e}")
+        return
+    _publish(client)
+
+    try:
+        stored = client.backfill_embedding_store()
+        if stored:
+            logger.info(f"Backfilled {stored} vectors into the embedding store")
+    except Exception as e:
+        logger.error(f"Failed to backfill the embedding store: {e}")
+
+    if client.needs_migration():
+        with _write_lock, _store_lock():
+            _reload_latest()
+            client = _client.fork()
+            if client.migrate():
+                logger.info(f"Migrated FAISS index to {index_type_of(client.index)}")
+                _save_and_publish(client)
+
+
+def ensure_index_loaded():
+    """Runs load_index once, on first use or from the lifespan warm-up, not at import."""
+    global _loaded
+    if not _loaded:
+        with _load_lock:
+            if not _loaded:
+                load_index()
+                _loaded = True
+
+
+def index_loaded() -> bool:
+    return _loaded
+
+
+@contextmanager
+def index_writer():
+    """
+    Serialize index writes across threads and worker processes.
+    Starts from the latest snapshot so no other worker's ingest is lost.
+    The block changes a private fork of the published client; once it
+    finishes the fork is saved as a new snapshot and published in one swap,
+    so searches never see a half-applied write. A block that raises or leaves
+    the index unchanged publishes nothing.
+    """
+    ensure_index_loaded()
+    with _write_lock, _store_lock():
+        _reload_latest()
+        base = _client
+        client = base.fork()
+        yield client
+        # Every change bumps the version; an unchanged fork would only invalidate the caches
+        if client.version != base.version:
+            _save_and_publish(client)
+
+
+# Deletion
+def _tombstone(delete_fn, key: str) -> int:
+    with index_writer() as client:
+        return delete_fn(client, key)
+
+
+def _compact() -> int:
+    refresh_index()
+    if _client.tombstone_ratio() < FAISS_COMPACTION_RATIO:
+        return 0
+    with index_writer() as client:
+        # Another worker may have compacted since
+        if client.tombstone_ratio() < FAISS_COMPACTION_RATIO:
+            return 0
+        return client.compact()
+
+
+async def compact_in_background():
+    """Start a compaction task unless one is already running."""
+    global _compaction_task
+    if _compaction_task and not _compaction_task.done():
+        return
+
+    async def run():
+        try:
+            dropped = await asyncio.to_thread(_compact)
+            if dropped:
+                logger.info(f"Compacted FAISS index, dropped {dropped} deleted vectors")
+        except Exception as e:
+            logger.error(f"FAISS compaction failed: {e}")
+
+    _compaction_task = asyncio.create_task(run())
+
+
+async def remove_document_vectors(document_id: str) -> int:
+    # Deleted vectors are filtered out of searches right away and dropped by compaction later
+    removed = await asyncio.to_thread(_tombstone, FaissClient.delete_document, document_id)
+    if _client.tombstone_ratio() >= FAISS_COMPACTION_RATIO:
+        await compact_in_background()
+    return removed
+
+
+async def remove_session_vectors(session_id: str) -> int:
+    removed = await asyncio.to_thread(_tombstone, FaissClient.delete_session, session_id)
+    if _client.tombstone_ratio() >= FAISS_COMPACTION_RATIO:
+        await compact_in_background()
+    return removed
@@ -0,0 +1,298 @@
+import os
+import json
+import hashlib
+import numpy as np
+from typing import Iterable, Optional
+
+VECTOR_DOCS_FILE = "vector_docs.npy"
+DOCUMENTS_FILE = "documents.json"
+DELETED_FILE = "deleted.npy"
+CHUNK_HASHES_FILE = "chunk_hashes.npy"
+LINKS_FILE = "links.npy"
+ADDED_AT_FILE = "added_at.npy"
+PAGES_FILE = "pages.npy"
+POSITIONS_FILE = "positions.npy"
+
+# Vectors from snapshots that predate metadata belong to no document and are shared
+NO_DOCUMENT = -1
+# Raw digests, a bytes dtype would strip trailing NULs. All zeros means unknown
+HASH_DTYPE = "V32"
+NO_HASH = bytes(32)
+# Vectors added before these were recorded
+UNKNOWN_TIME = 0.0
+UNKNOWN_PAGE = -1
+UNKNOWN_POSITION = -1
+
+
+def chunk_hash(text: str) -> bytes:
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+
+class VectorMetadata:
+    """
+    Maps FAISS vector ids to the document rows they were chunked from.
+    Each document gets a slot holding its id and owning session/user,
+    vector_docs[id] is the slot of the document the vector belongs to and
+    deleted[id] marks tombstoned vectors that compaction will drop.
+
+    Identical chunks are stored once: chunk_hashes[id] is the SHA-256 of the
+    chunk text, and a vector shared by further documents gets one
+    (link_ids, link_slots) entry per extra document.
+
+    added_at[id] (epoch seconds) and pages[id] (first page of the chunk)
+    feed re-ranking without a lookup per vector. positions[id] is the chunk's
+    index within the document owning it, chunks of a document with
+    consecutive positions were next to each other in the text.
+    """
+
+    def __init__(self):
+        self.documents: list[dict] = []
+        self.vector_docs = np.zeros(0, dtype=np.int32)
+        self.deleted = np.zeros(0, dtype=bool)
+        self.chunk_hashes = np.zeros(0, dtype=HASH_DTYPE)
+        self.link_ids = np.zeros(0, dtype=np.int64)
+        self.link_slots = np.zeros(0, dtype=np.int32)
+        self.added_at = np.zeros(0, dtype=np.float64)
+        self.pages = np.zeros(0, dtype=np.int32)
+        self.positions = np.zeros(0, dtype=np.int32)
+        self._slots: dict[str, int] = {}
+        # chunk hash -> live vector id, built on first lookup
+        self._hash_ids: Optional[dict[bytes, int]] = None
+
+    def __len__(self) -> int:
+        return len(self.vector_docs)
+
+    def copy(self) -> "VectorMetadata":
+        metadata = VectorMetadata()
+        metadata.documents = list(self.documents)
+        for name in ("vector_docs", "deleted", "chunk_hashes", "link_ids", "link_slots", "added_at", "pages",
+                     "positions"):
+            setattr(metadata, name, getattr(self, name).copy())
+        metadata._slots = dict(self._slots)
+        metadata._hash_ids = dict(self._hash_ids) if self._hash_ids is not None else None
+        return metadata
+
+    def add(self, count: int, doc_id: Optional[str] = None, session_id: Optional[str] = None,
+            user_id: Optional[str] = None, hashes: Optional[Iterable[bytes]] = None, file_hash: Optional[str] = None,
+            added_at: float = UNKNOWN_TIME, pages: Optional[Iterable[int]] = None,
+            positions: Optional[Iterable[int]] = None):
+        start = len(self.vector_docs)
+        slot = self._slot(doc_id, session_id, user_id, file_hash)
+        hashes = np.array(list(hashes) if hashes is not None else [NO_HASH] * count, dtype=HASH_DTYPE)
+        pages = np.array(list(pages) if pages is not None else [UNKNOWN_PAGE] * count, dtype=np.int32)
+        positions = np.array(list(positions) if positions is not None else [UNKNOWN_POSITION] * count,
+                             dtype=np.int32)
+        self.vector_docs = np.concatenate([self.vector_docs, np.full(count, slot, dtype=np.int32)])
+        self.deleted = np.concatenate([self.deleted, np.zeros(count, dtype=bool)])
+        self.chunk_hashes = np.concatenate([self.chunk_hashes, hashes])
+        self.added_at = np.concatenate([self.added_at, np.full(count, added_at, dtype=np.float64)])
+        self.pages = np.concatenate([self.pages, pages])
+        self.positions = np.concatenate([self.positions, positions])
+        if self._hash_ids is not None:
+            for offset, digest in enumerate(hashes.tolist()):
+                if digest != NO_HASH:
+                    self._hash_ids.setdefault(digest, start + offset)
+
+    def _slot(self, doc_id: Optional[str], session_id: Optional[str] = None, user_id: Optional[str] = None,
+              file_hash: Optional[str] = None) -> int:
+        if doc_id is None:
+            return NO_DOCUMENT
+        slot = self._slots.get(doc_id)
+        if slot is None:
+            slot = len(self.documents)
+            self.documents.append({"doc_id": doc_id, "session_id": session_id, "user_id": user_id,
+                                   "file_hash": file_hash})
+            self._slots[doc_id] = slot
+        return slot
+
+    # Deduplication
+    def missing_hashes(self) -> bool:
+        return len(self.chunk_hashes) > 0 and bool((self.chunk_hashes == np.void(NO_HASH)).any())
+
+    def set_hashes(self, hashes: list[bytes]):
+        self.chunk_hashes = np.array(hashes, dtype=HASH_DTYPE)
+        self._hash_ids = None
+
+    def find_chunks(self, hashes: Iterable[bytes]) -> np.ndarray:
+        """Live vector id holding each chunk hash, or -1."""
+        if self._hash_ids is None:
+            live = np.flatnonzero(~self.deleted)
+            self._hash_ids = {}
+            for vector_id, digest in zip(live.tolist(), self.chunk_hashes[live].tolist()):
+                if digest != NO_HASH:
+                    self._hash_ids.setdefault(digest, vector_id)
+        return np.array([self._hash_ids.get(digest, -1) for digest in hashes], dtype=np.int64)
+
+    def find_document(self, file_hash: str) -> Optional[str]:
+        """A document with this file hash that still has live vectors."""
+        for doc in self.documents:
+            if doc.get("file_hash") == file_hash and len(self.ids_for_document(doc["doc_id"])):
+                return doc["doc_id"]
+        return None
+
+    def link(self, ids: np.ndarray, doc_id: str, session_id: Optional[str] = None,
+             user_id: Optional[str] = None, file_hash: Optional[str] = None) -> int:
+        """Makes existing vectors part of doc_id too. Returns how many links were added."""
+        slot = self._slot(doc_id, session_id, user_id, file_hash)
+        ids = np.unique(np.asarray(ids, dtype=np.int64))
+        already = self.vector_docs[ids] == slot
+        already |= np.isin(ids, self.link_ids[self.link_slots == slot])
+        ids = ids[~already]
+        self.link_ids = np.concatenate([self.link_ids, ids])
+        self.link_slots = np.concatenate([self.link_slots, np.full(len(ids), slot, dtype=np.int32)])
+        return len(ids)
+
+    def release(self, doc_ids: Iterable[str]) -> np.ndarray:
+        """
+        Detach documents from their vectors. A vector still linked to another
+        document passes to that document, the ids returned have no owner left.
+        """
+        slots = [self._slots[doc_id] for doc_id in doc_ids if doc_id in self._slots]
+        if not slots:
+            return np.zeros(0, dtype=np.int64)
+        keep = ~np.isin(self.link_slots, slots)
+        self.link_ids, self.link_slots = self.link_ids[keep], self.link_slots[keep]
+
+        owned = np.flatnonzero(np.isin(self.vector_docs, slots) & ~self.deleted)
+        # Hand shared vectors to the first remaining linked document
+        linked_ids, first = np.unique(self.link_ids, return_index=True)
+        handed = np.isin(owned, linked_ids)
+        if handed.any():
+            heirs = owned[handed]
+            positions = first[np.searchsorted(linked_ids, heirs)]
+            self.vector_docs[heirs] = self.link_slots[positions]
+            # Their position was in the released document, not the heir's
+            self.positions[heirs] = UNKNOWN_POSITION
+            keep = np.ones(len(self.link_ids), dtype=bool)
+            keep[positions] = False
+            self.link_ids, self.link_slots = self.link_ids[keep], self.link_slots[keep]
+        return owned[~handed].astype(np.int64)
+
+    def get_document(self, vector_id: int) -> Optional[dict]:
+        if 0 <= vector_id < len(self.vector_docs):
+            slot = self.vector_docs[vector_id]
+            if slot != NO_DOCUMENT:
+                return self.documents[slot]
+        return None
+
+    def ids_for_document(self, doc_id: str) -> np.ndarray:
+        """Live vector ids of a document, owned or linked."""
+        slot = self._slots.get(doc_id)
+        if slot is None:
+            return np.zeros(0, dtype=np.int64)
+        owned = self.vector_docs == slot
+        owned[self.link_ids[self.link_slots == slot]] = True
+        return np.flatnonzero(owned & ~self.deleted).astype(np.int64)
+
+    def documents_for_session(self, session_id: str) -> list[str]:
+        return [doc["doc_id"] for doc in self.documents if doc["session_id"] == session_id]
+
+    # Tombstones
+    def mark_deleted(self, ids: np.ndarray) -> int:
+        newly_deleted = int(np.count_nonzero(~self.deleted[ids]))
+        self.deleted[ids] = True
+        if newly_deleted:
+            self._hash_ids = None
+        return newly_deleted
+
+    def deleted_ids(self) -> np.ndarray:
+        return np.flatnonzero(self.deleted).astype(np.int64)
+
+    def tombstone_ratio(self) -> float:
+        if len(self.deleted) == 0:
+            return 0.0
+        return float(np.count_nonzero(self.deleted)) / len(self.deleted)
+
+    def compacted(self, live_ids: np.ndarray) -> "VectorMetadata":
+        """Metadata for live_ids renumbered 0..n-1, documents without live vectors are dropped."""
+        metadata = VectorMetadata()
+        old_slots = self.vector_docs[live_ids]
+        id_remap = np.full(len(self.vector_docs), -1, dtype=np.int64)
+        id_remap[live_ids] = np.arange(len(live_ids), dtype=np.int64)
+        live_links = id_remap[self.link_ids] != -1
+        # Documents that still own or link a live vector
+        kept = np.union1d(old_slots[old_slots != NO_DOCUMENT], self.link_slots[live_links]).astype(np.int64)
+        # The extra last entry maps NO_DOCUMENT (-1) to itself
+        remap = np.full(len(self.documents) + 1, NO_DOCUMENT, dtype=np.int32)
+        remap[kept] = np.arange(len(kept), dtype=np.int32)
+        metadata.documents = [self.documents[slot] for slot in kept]
+        metadata.vector_docs = remap[old_slots]
+        metadata.deleted = np.zeros(len(live_ids), dtype=bool)
+        metadata.chunk_hashes = self.chunk_hashes[live_ids]
+        metadata.added_at = self.added_at[live_ids]
+        metadata.pages = self.pages[live_ids]
+        metadata.positions = self.positions[live_ids]
+        metadata.link_ids = id_remap[self.link_ids[live_links]]
+        metadata.link_slots = remap[self.link_slots[live_links]]
+        metadata._slots = {doc["doc_id"]: slot for slot, doc in enumerate(metadata.documents)}
+        return metadata
+
+    def ids_for_scope(self, session_id: Optional[str] = None, user_id: Optional[str] = None) -> np.ndarray:
+        """
+        Vector ids visible to a session and/or user: their own documents plus
+        documents uploaded without a session, which are shared by everyone.
+        """
+        allowed = [NO_DOCUMENT]
+        for slot, doc in enumerate(self.documents):
+            if doc["session_id"] is None and doc["user_id"] is None:
+                allowed.append(slot)
+            elif session_id is not None and doc["session_id"] == session_id:
+                allowed.append(slot)
+            elif user_id is not None and doc["user_id"] == user_id:
+                allowed.append(slot)
+        visible = np.isin(self.vector_docs, allowed)
+        visible[self.link_ids[np.isin(self.link_slots, allowed)]] = True
+        return np.flatnonzero(visible & ~self.deleted).astype(np.int64)
+
+    def save(self, directory: str):
+        np.save(os.path.join(directory, VECTOR_DOCS_FILE), self.vector_docs)
+        np.save(os.path.join(directory, DELETED_FILE), self.deleted)
+        np.save(os.path.join(directory, CHUNK_HASHES_FILE), self.chunk_hashes)
+        np.save(os.path.join(directory, LINKS_FILE), np.stack([self.link_ids, self.link_slots.astype(np.int64)]))
+        np.save(os.path.join(directory, ADDED_AT_FILE), self.added_at)
+        np.save(os.path.join(directory, PAGES_FILE), self.pages)
+        np.save(os.path.join(directory, POSITIONS_FILE), self.positions)
+        with open(os.path.join(directory, DOCUMENTS_FILE), "w") as f:
+            json.dump(self.documents, f)
+
+    @classmethod
+    def load(cls, directory: str, count: int) -> "VectorMetadata":
+        metadata = cls()
+        docs_path = os.path.join(directory, VECTOR_DOCS_FILE)
+        if not os.path.exists(docs_path):
+            metadata.add(count)
+            return metadata
+        metadata.vector_docs = np.load(docs_path)
+        deleted_path = os.path.join(directory, DELETED_FILE)
+        if os.path.exists(deleted_path):
+            metadata.deleted = np.load(deleted_path)
+        else:
+            metadata.deleted = np.zeros(len(metadata.vector_docs), dtype=bool)
+        hashes_path = os.path.join(directory, CHUNK_HASHES_FILE)
+        if os.path.exists(hashes_path):
+            metadata.chunk_hashes = np.load(hashes_path)
+        else:
+            metadata.chunk_hashes = np.zeros(len(metadata.vector_docs), dtype=HASH_DTYPE)
+        links_path = os.path.join(directory, LINKS_FILE)
+        if os.path.exists(links_path):
+            links = np.load(links_path)
+            metadata.link_ids, metadata.link_slots = links[0], links[1].astype(np.int32)
+        added_at_path = os.path.join(directory, ADDED_AT_FILE)
+        if os.path.exists(added_at_path):
+            metadata.added_at = np.load(added_at_path)
+        else:
+            metadata.added_at = np.full(len(metadata.vector_docs), UNKNOWN_TIME, dtype=np.float64)
+        pages_path = os.path.join(directory, PAGES_FILE)
+        if os.path.exists(pages_path):
+            metadata.pages = np.load(pages_path)
+        else:
+            metadata.pages = np.full(len(metadata.vector_docs), UNKNOWN_PAGE, dtype=np.int32)
+        positions_path = os.path.join(directory, POSITIONS_FILE)
+        if os.path.exists(positions_path):
+            metadata.positions = np.load(positions_path)
+        else:
+            metadata.positions = np.full(len(metadata.vector_docs), UNKNOWN_POSITION, dtype=np.int32)
+        with open(os.path.join(directory, DOCUMENTS_FILE)) as f:
+            metadata.documents = json.load(f)
+        metadata._slots = {doc["doc_id"]: slot for slot, doc in enumerate(metadata.documents)}
+        return metadata
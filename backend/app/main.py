@@ -1,17 +1,73 @@
+import time
+
+_import_start = time.perf_counter()
+
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
 
-from starlette.responses import Response
+from starlette.responses import JSONResponse, Response
 
 import os
-import time
+import asyncio
+import logging
+from contextlib import asynccontextmanager
 from pathlib import Path
 
 from backend.app.api import ws_chat, documents, rag, chat, metrics, admin ,auth
+from backend.app.api.metrics import STARTUP_SECONDS
+from backend.app.core.embedding_service import embedding_batcher
+from backend.app.core.embeddings import embed_text, model_loaded
+from backend.app.core.reranker import reranker
+from backend.app.db import database
+from backend.app.db.faiss_instance import ensure_index_loaded, index_loaded
+from backend.app.services import http_client, ingest_service, message_buffer, pdf_extraction
+from backend.app.tools.math_sandbox import math_sandbox
+
+logger = logging.getLogger(__name__)
 
-app = FastAPI(title="ELARA AI Chatbot : Chat With Your Data")
+# Load the model and index right after startup; off, a worker only loads them on first use
+WARM_UP_ON_START = os.getenv("WARM_UP_ON_START", "true").lower() == "true"
+
+STARTUP_SECONDS.labels(phase="import").set(time.perf_counter() - _import_start)
+
+
+def warm_up():
+    start = time.perf_counter()
+    try:
+        ensure_index_loaded()
+        # Loads the model and runs one forward pass, so the first query is not the slow one
+        embed_text(["warm up"])
+        if reranker.enabled:
+            reranker.load()
+    except Exception as e:
+        logger.error(f"Warm-up failed, loading on first use instead: {e}")
+        return
+    elapsed = time.perf_counter() - start
+    STARTUP_SECONDS.labels(phase="warmup").set(elapsed)
+    logger.info(f"Model and index warmed up in {elapsed:.2f}s")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await http_client.start()
+    # The app serves requests (and /health) while the model loads
+    warm_up_task = asyncio.create_task(asyncio.to_thread(warm_up)) if WARM_UP_ON_START else None
+    yield
+    if warm_up_task:
+        warm_up_task.cancel()
+    await ingest_service.shutdown()
+    pdf_extraction.shutdown()
+    math_sandbox.shutdown()
+    await embedding_batcher.close()
+    await reranker.close()
+    await http_client.close()
+    # Unwritten chat messages go out before the pool closes
+    await message_buffer.shutdown()
+    await database.close()
+
+app = FastAPI(title="ELARA AI Chatbot : Chat With Your Data", lifespan=lifespan)
 
 # Get the root directory (one level up from backend/)
 BASE_DIR = Path(__file__).parent.parent.parent
@@ -77,4 +133,11 @@ app.include_router(auth.router)
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "message": "ELARA AI Chatbot is running"}
\ No newline at end of file
+    return {"status": "healthy", "message": "ELARA AI Chatbot is running"}
+
+@app.get("/health/ready")
+async def readiness_check():
+    # Alive is /health, ready means queries will not wait on a model or index load
+    checks = {"model": model_loaded(), "index": index_loaded()}
+    ready = all(checks.values())
+    return JSONResponse({"status": "ready" if ready else "warming_up", **checks}, status_code=200 if ready else 503)
@@ -1,7 +1,8 @@
 import os
-import httpx
 from dotenv import load_dotenv
 
+from backend.app.services.http_client import post_json
+
 load_dotenv()
 
 OPENROUTER_API_URL = "https://openrouter.ai/api/v1/chat/completions"
@@ -36,10 +37,9 @@ IMPORTANT INSTRUCTIONS:
         "max_tokens": 512
     }
 
-    async with httpx.AsyncClient() as client:
-        response = await client.post(OPENROUTER_API_URL, json=payload, headers=headers)
-        response.raise_for_status()
-        data = response.json()
+    response = await post_json(OPENROUTER_API_URL, payload, headers)
+    response.raise_for_status()
+    data = response.json()
 
     # Extracted rag's reply text
     return data["choices"][0]["message"]["content"]
\ No newline at end of file
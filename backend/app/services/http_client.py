@@ -0,0 +1,104 @@
+import os
+import random
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", "60"))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+LLM_MAX_KEEPALIVE = int(os.getenv("LLM_MAX_KEEPALIVE", "10"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", "0.5"))
+LLM_RETRY_MAX_DELAY = 20.0
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Failures where the provider never started on the request, safe to send again
+RETRY_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout, httpx.RemoteProtocolError)
+
+_client: Optional[httpx.AsyncClient] = None
+_semaphore: Optional[asyncio.Semaphore] = None
+
+
+async def start():
+    """Opens the shared client, called from the app lifespan."""
+    get_client()
+
+
+async def close():
+    global _client, _semaphore
+    if _client is not None:
+        await _client.aclose()
+    _client = None
+    _semaphore = None
+
+
+def get_client() -> httpx.AsyncClient:
+    # Created on first use too, so scripts and tests work without the lifespan
+    global _client, _semaphore
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            http2=True,
+            timeout=httpx.Timeout(LLM_READ_TIMEOUT, connect=LLM_CONNECT_TIMEOUT),
+            limits=httpx.Limits(max_connections=LLM_MAX_CONNECTIONS,
+                                max_keepalive_connections=LLM_MAX_KEEPALIVE),
+        )
+        _semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+    return _client
+
+
+def _retry_delay(attempt: int, response: Optional[httpx.Response] = None) -> float:
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    if retry_after:
+        try:
+            return min(float(retry_after), LLM_RETRY_MAX_DELAY)
+        except ValueError:
+            pass
+    # Full jitter keeps a burst of failed requests from retrying in lockstep
+    return random.uniform(0, min(LLM_RETRY_MAX_DELAY, LLM_RETRY_BASE_DELAY * 2 ** attempt))
+
+
+async def _send(request: httpx.Request, stream: bool) -> httpx.Response:
+    client = get_client()
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        last_attempt = attempt == LLM_MAX_RETRIES
+        try:
+            response = await client.send(request, stream=stream)
+        except RETRY_ERRORS as e:
+            if last_attempt:
+                raise
+            delay = _retry_delay(attempt)
+            logger.warning(f"LLM request failed ({e!r}), retry {attempt + 1} in {delay:.2f}s")
+        else:
+            if response.status_code not in RETRY_STATUSES or last_attempt:
+                return response
+            await response.aclose()
+            delay = _retry_delay(attempt, response)
+            logger.warning(f"LLM request got {response.status_code}, retry {attempt + 1} in {delay:.2f}s")
+        await asyncio.sleep(delay)
+
+
+async def post_json(url: str, payload: dict, headers: dict) -> httpx.Response:
+    """POST with retries on 429/5xx and connection errors, within the global concurrency limit."""
+    client = get_client()
+    async with _semaphore:
+        return await _send(client.build_request("POST", url, json=payload, headers=headers), stream=False)
+
+
+@asynccontextmanager
+async def stream_post(url: str, payload: dict, headers: dict) -> AsyncIterator[httpx.Response]:
+    """Like post_json, but yields the response unread so the body can be streamed."""
+    client = get_client()
+    # The slot is held until the stream is consumed
+    async with _semaphore:
+        response = await _send(client.build_request("POST", url, json=payload, headers=headers), stream=True)
+        try:
+            yield response
+        finally:
+            await response.aclose()
@@ -0,0 +1,140 @@
+import os
+import uuid
+import asyncio
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Awaitable, Callable, List, Optional
+
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+INGEST_THREADS = int(os.getenv("INGEST_THREADS", "4"))
+# Finished jobs kept around for status polling
+INGEST_JOB_HISTORY = int(os.getenv("INGEST_JOB_HISTORY", "500"))
+
+
+class IngestFile(BaseModel):
+    path: str
+    file_name: str
+    file_hash: Optional[str] = None  # SHA-256 of the upload, for dedup
+
+
+class IngestJob(BaseModel):
+    id: str
+    session_id: Optional[str] = None
+    do_not_store: bool = False
+    files: List[IngestFile]
+    status: str = "queued"  # queued | running | completed | failed
+    files_done: int = 0
+    pages_total: int = 0
+    pages_parsed: int = 0
+    chunks_total: int = 0
+    chunks_embedded: int = 0
+    chunks_reused: int = 0  # served by vectors already in the index
+    document_ids: List[str] = []
+    chunks_sample: List[str] = []
+    error: Optional[str] = None
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+
+
+JobHandler = Callable[[IngestJob], Awaitable[None]]
+JobListener = Callable[[IngestJob], Awaitable[None]]
+
+_jobs: "OrderedDict[str, IngestJob]" = OrderedDict()
+_queue: Optional[asyncio.Queue] = None
+_workers: list[asyncio.Task] = []
+_listeners: list[JobListener] = []
+# Created on first use and dropped by shutdown, so the next lifespan gets fresh ones on its own loop
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def create_job(files: List[IngestFile], session_id: Optional[str] = None, do_not_store: bool = False) -> IngestJob:
+    job = IngestJob(
+        id=str(uuid.uuid4()),
+        session_id=session_id,
+        do_not_store=do_not_store,
+        files=files,
+        created_at=datetime.utcnow(),
+    )
+    _jobs[job.id] = job
+    _trim_history()
+    return job
+
+
+def get_job(job_id: str) -> Optional[IngestJob]:
+    return _jobs.get(job_id)
+
+
+def add_listener(listener: JobListener):
+    # Called with the job once it completes or fails
+    _listeners.append(listener)
+
+
+async def run_blocking(fn, *args):
+    """Run blocking parsing/embedding/storage work on the ingest thread pool."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=INGEST_THREADS, thread_name_prefix="ingest")
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, fn, *args)
+
+
+async def submit(job: IngestJob, handler: JobHandler):
+    _ensure_workers()
+    await _queue.put((job, handler))
+    logger.info(f"Queued ingest job {job.id} with {len(job.files)} files")
+
+
+async def shutdown():
+    global _queue, _executor
+    for worker in _workers:
+        worker.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
+    _queue = None
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def _ensure_workers():
+    global _queue
+    if _queue is None:
+        _queue = asyncio.Queue()
+    if not _workers:
+        for i in range(INGEST_WORKERS):
+            _workers.append(asyncio.create_task(_worker(i)))
+
+
+async def _worker(worker_id: int):
+    while True:
+        job, handler = await _queue.get()
+        job.status = "running"
+        try:
+            await handler(job)
+            job.status = "completed"
+            logger.info(f"Ingest job {job.id} completed: {job.chunks_embedded} chunks embedded")
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+            logger.error(f"Ingest job {job.id} failed: {e}", exc_info=True)
+        finally:
+            job.finished_at = datetime.utcnow()
+            _queue.task_done()
+
+        for listener in _listeners:
+            try:
+                await listener(job)
+            except Exception as e:
+                logger.error(f"Ingest listener failed for job {job.id}: {e}")
+
+
+def _trim_history():
+    finished = [job_id for job_id, job in _jobs.items() if job.status in ("completed", "failed")]
+    for job_id in finished[:max(0, len(finished) - INGEST_JOB_HISTORY)]:
+        del _jobs[job_id]
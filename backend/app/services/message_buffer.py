@@ -0,0 +1,154 @@
+import os
+import uuid
+import random
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+from backend.app.db.crud import create_messages
+from backend.app.db.database import is_permanent_error
+
+logger = logging.getLogger(__name__)
+
+MESSAGE_FLUSH_SIZE = int(os.getenv("MESSAGE_FLUSH_SIZE", "100"))
+MESSAGE_FLUSH_INTERVAL_MS = float(os.getenv("MESSAGE_FLUSH_INTERVAL_MS", "200"))
+# Past this many unwritten messages, enqueue waits for the database to catch up
+MESSAGE_BUFFER_LIMIT = int(os.getenv("MESSAGE_BUFFER_LIMIT", "10000"))
+MESSAGE_RETRY_MAX_DELAY = 30.0
+MESSAGE_SHUTDOWN_RETRIES = 3
+
+# Unwritten messages in arrival order, a single flusher writes them front to back
+_pending: List[dict] = []
+_last_created: Optional[datetime] = None
+_flush_lock = asyncio.Lock()
+_wakeup: Optional[asyncio.Event] = None
+_drained: Optional[asyncio.Event] = None
+_flusher: Optional[asyncio.Task] = None
+
+
+async def enqueue_message(session_id: str, content: str, role: str = "user", message_type: str = "text") -> str:
+    """
+    Buffers a message for the next bulk insert and returns its id right away.
+    The id is generated here so callers can reference the row before it is written.
+    """
+    global _last_created
+    _ensure_flusher()
+    if len(_pending) >= MESSAGE_BUFFER_LIMIT:
+        logger.warning(f"Message buffer full ({len(_pending)}), waiting for flush")
+        _wakeup.set()
+        while len(_pending) >= MESSAGE_BUFFER_LIMIT:
+            _drained.clear()
+            await _drained.wait()
+
+    created_at = datetime.now(timezone.utc)
+    if _last_created is not None and created_at <= _last_created:
+        # Keep created_at strictly increasing so history order matches arrival order
+        created_at = _last_created + timedelta(microseconds=1)
+    _last_created = created_at
+
+    message = {
+        "id": str(uuid.uuid4()),
+        "session_id": session_id,
+        "content": content,
+        "role": role,
+        "message_type": message_type,
+        "created_at": created_at,
+    }
+    _pending.append(message)
+    if len(_pending) >= MESSAGE_FLUSH_SIZE:
+        _wakeup.set()
+    return message["id"]
+
+
+def pending_messages(session_id: str) -> List[dict]:
+    """Messages of the session not yet confirmed written, oldest first."""
+    return [
+        {**message, "created_at": message["created_at"].isoformat()}
+        for message in _pending if message["session_id"] == session_id
+    ]
+
+
+async def flush(retries: Optional[int] = None) -> bool:
+    """Writes everything buffered so far. Returns False if a batch still failed after retries."""
+    async with _flush_lock:
+        return await _flush(retries)
+
+
+async def _flush(retries: Optional[int]) -> bool:
+    attempt = 0
+    while _pending:
+        batch = _pending[:MESSAGE_FLUSH_SIZE]
+        try:
+            await create_messages(batch)
+        except Exception as e:
+            attempt += 1
+            if retries is not None and attempt > retries:
+                logger.error(f"Giving up on {len(_pending)} buffered messages: {e}")
+                return False
+            if is_permanent_error(e) and await _write_rows(batch):
+                # The batch is out of the way, the rows the database rejected were dropped
+                attempt = 0
+                if _drained is not None:
+                    _drained.set()
+                continue
+            delay = random.uniform(0, min(MESSAGE_RETRY_MAX_DELAY, 0.5 * 2 ** attempt))
+            logger.warning(f"Flushing {len(batch)} messages failed ({e}), retry in {delay:.2f}s")
+            await asyncio.sleep(delay)
+            continue
+        # Only drop the batch once written, so a failure retries the same rows in the same order
+        del _pending[:len(batch)]
+        attempt = 0
+        if _drained is not None:
+            _drained.set()
+    return True
+
+
+async def _write_rows(batch: List[dict]) -> bool:
+    """
+    Writes a batch the database rejected one row at a time and drops the rows
+    it rejects for good (e.g. their session was deleted), so they can't hold up
+    every message behind them, even when they are the whole batch. Any other
+    failure means the database is unreachable: the batch stays buffered for
+    the next retry, which skips the rows written already, and False is returned.
+    """
+    rejected = []
+    for message in batch:
+        try:
+            await create_messages([message])
+        except Exception as e:
+            if not is_permanent_error(e):
+                return False
+            rejected.append((message, e))
+    for message, e in rejected:
+        logger.error(f"Dropping message {message['id']} ({message['role']}) of session "
+                     f"{message['session_id']}, the database rejected it: {e}")
+    del _pending[:len(batch)]
+    return True
+
+
+async def shutdown():
+    global _flusher
+    if _flusher is not None:
+        _flusher.cancel()
+        await asyncio.gather(_flusher, return_exceptions=True)
+        _flusher = None
+    await flush(retries=MESSAGE_SHUTDOWN_RETRIES)
+
+
+def _ensure_flusher():
+    global _wakeup, _drained, _flusher
+    if _flusher is None or _flusher.done():
+        _wakeup = asyncio.Event()
+        _drained = asyncio.Event()
+        _flusher = asyncio.create_task(_run())
+
+
+async def _run():
+    while True:
+        try:
+            await asyncio.wait_for(_wakeup.wait(), timeout=MESSAGE_FLUSH_INTERVAL_MS / 1000)
+        except asyncio.TimeoutError:
+            pass
+        _wakeup.clear()
+        await flush()
@@ -0,0 +1,69 @@
+import os
+import logging
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Optional, Tuple
+
+from PyPDF2 import PdfReader
+
+logger = logging.getLogger(__name__)
+
+PDF_PROCESSES = int(os.getenv("PDF_PROCESSES", str(os.cpu_count() or 1)))
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "8"))
+# Page ranges parsed ahead of the consumer, bounds memory for large files
+PDF_PREFETCH_TASKS = int(os.getenv("PDF_PREFETCH_TASKS", str(2 * PDF_PROCESSES)))
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def page_count(path: str) -> int:
+    return len(PdfReader(path).pages)
+
+
+def extract_page_range(path: str, start: int, end: int) -> List[Tuple[int, str]]:
+    """Runs in a worker process: text of pages [start, end), numbered from 1."""
+    reader = PdfReader(path)
+    return [(i + 1, reader.pages[i].extract_text() or "") for i in range(start, end)]
+
+
+def iter_pdf_pages(path: str, total: Optional[int] = None) -> Iterator[Tuple[int, str]]:
+    """
+    Yields (page number, text) in page order. Page ranges are parsed in a
+    process pool, with at most PDF_PREFETCH_TASKS ranges in flight.
+    """
+    total = page_count(path) if total is None else total
+    if total <= PDF_PAGES_PER_TASK or PDF_PROCESSES <= 1:
+        # Not worth the process round trip
+        yield from extract_page_range(path, 0, total)
+        return
+
+    pool = _get_pool()
+    ranges = deque((start, min(start + PDF_PAGES_PER_TASK, total)) for start in range(0, total, PDF_PAGES_PER_TASK))
+    in_flight = deque()
+    try:
+        while ranges or in_flight:
+            while ranges and len(in_flight) < PDF_PREFETCH_TASKS:
+                start, end = ranges.popleft()
+                in_flight.append(pool.submit(extract_page_range, path, start, end))
+            yield from in_flight.popleft().result()
+    finally:
+        # Consumer stopped early or parsing failed, don't leave work queued
+        for future in in_flight:
+            future.cancel()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn, since forking a process that runs faiss/torch threads is unsafe
+        _pool = ProcessPoolExecutor(max_workers=PDF_PROCESSES, mp_context=multiprocessing.get_context("spawn"))
+        logger.info(f"Started PDF extraction pool with {PDF_PROCESSES} processes")
+    return _pool
+
+
+def shutdown():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
@@ -1,10 +1,18 @@
 import os
-import httpx
+import json
+import logging
+from typing import AsyncIterator
+
+from backend.app.services.http_client import post_json, stream_post
 
 OPENROUTER_API_URL = "https://openrouter.ai/api/v1/chat/completions"
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
 
-async def call_llm(prompt: str) -> str:
+logger = logging.getLogger(__name__)
+
+LLM_ERROR_MESSAGE = "I'm experiencing technical difficulties. Please try again later."
+
+def build_request(prompt: str, stream: bool = False) -> tuple[dict, dict]:
     headers = {
         "Authorization": f"Bearer {OPENROUTER_API_KEY}",
         "Content-Type": "application/json",
@@ -38,15 +46,56 @@ CRITICAL INSTRUCTIONS FOR RAG ASSIGNMENT:
             {"role": "user", "content": prompt}  # User question second
         ],
         "temperature": 0.3,
-        "max_tokens": 1024
+        "max_tokens": 1024,
+        "stream": stream
     }
-    
+    return headers, payload
+
+async def call_llm(prompt: str) -> str:
+    headers, payload = build_request(prompt)
+    try:
+        resp = await post_json(OPENROUTER_API_URL, payload, headers)
+        resp.raise_for_status()
+        data = resp.json()
+        return data["choices"][0]["message"]["content"]
+    except Exception as e:
+        logger.error(f"Error calling LLM: {e}")
+        return LLM_ERROR_MESSAGE
+
+def parse_sse_line(line: str):
+    """Returns the content delta of one SSE line, None for keep-alives, or False at [DONE]."""
+    # OpenRouter sends ": OPENROUTER PROCESSING" comments while waiting on the provider
+    if not line.startswith("data:"):
+        return None
+    data = line[len("data:"):].strip()
+    if data == "[DONE]":
+        return False
+    chunk = json.loads(data)
+    if "error" in chunk:
+        raise RuntimeError(chunk["error"].get("message", chunk["error"]))
+    choices = chunk.get("choices") or [{}]
+    return choices[0].get("delta", {}).get("content") or None
+
+async def stream_llm(prompt: str) -> AsyncIterator[str]:
+    """
+    Yields content deltas as OpenRouter streams them (SSE). Failures before the
+    first token yield LLM_ERROR_MESSAGE, later ones are raised.
+    """
+    headers, payload = build_request(prompt, stream=True)
+    started = False
     try:
-        async with httpx.AsyncClient() as client:
-            resp = await client.post(OPENROUTER_API_URL, json=payload, headers=headers)
+        async with stream_post(OPENROUTER_API_URL, payload, headers) as resp:
             resp.raise_for_status()
-            data = resp.json()
-            return data["choices"][0]["message"]["content"]
+            async for line in resp.aiter_lines():
+                delta = parse_sse_line(line)
+                if delta is False:
+                    break
+                if delta:
+                    started = True
+                    yield delta
     except Exception as e:
-        print(f"Error calling LLM: {e}")
-        return "I'm experiencing technical difficulties. Please try again later."
\ No newline at end of file
+        logger.error(f"Error streaming LLM: {e}")
+        # Part of the answer already reached the caller, let it decide how to end
+        if started:
+            raise
+        yield LLM_ERROR_MESSAGE
@@ -0,0 +1,120 @@
+import os
+import time
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Optional
+
+from backend.app.api.metrics import MATH_EVAL_LATENCY, MATH_LIMITED
+from backend.app.core.cache import TTLCache
+from backend.app.tools.math_tools import ComputationLimit, calculate, calculate_limited, init_worker
+
+logger = logging.getLogger(__name__)
+
+MATH_PROCESSES = int(os.getenv("MATH_PROCESSES", "2"))
+# CPU time one expression may use before it is stopped
+MATH_CPU_SECONDS = float(os.getenv("MATH_CPU_SECONDS", "2"))
+# Address space per worker, sympy itself takes about 150 MB of it
+MATH_MEMORY_MB = int(os.getenv("MATH_MEMORY_MB", "512"))
+# Expressions queued or running before new ones are turned away
+MATH_MAX_PENDING = int(os.getenv("MATH_MAX_PENDING", str(4 * MATH_PROCESSES)))
+MATH_CACHE_SIZE = int(os.getenv("MATH_CACHE_SIZE", "1024"))
+
+BUSY_MESSAGE = "The calculator is busy right now, please try again in a moment."
+RESTARTED_MESSAGE = "The calculator had to restart while working on this, please try again."
+
+
+class MathSandbox:
+    """
+    Evaluates math queries in a pool of worker processes with a CPU time and
+    memory limit per expression, so an expensive one never runs on the event
+    loop or holds a worker for long. Answers, limit hits included, are cached
+    by expression.
+    """
+
+    def __init__(self, processes: int = MATH_PROCESSES, cpu_seconds: float = MATH_CPU_SECONDS,
+                 memory_mb: int = MATH_MEMORY_MB, max_pending: int = MATH_MAX_PENDING,
+                 cache_size: int = MATH_CACHE_SIZE, fn: Callable[[str], str] = calculate):
+        self.processes = processes
+        self.cpu_seconds = cpu_seconds
+        self.memory_mb = memory_mb
+        self.max_pending = max_pending
+        self.fn = fn
+        self.cache = TTLCache("math", maxsize=cache_size)
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pending = 0
+
+    async def calculate(self, expression: str) -> str:
+        key = " ".join(expression.split())
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        if self._pending >= self.max_pending:
+            MATH_LIMITED.labels(reason="saturated").inc()
+            return BUSY_MESSAGE
+
+        loop = asyncio.get_running_loop()
+        pool = self._get_pool()
+        started = time.perf_counter()
+        try:
+            future = pool.submit(calculate_limited, key, self.cpu_seconds, self.fn)
+        except BrokenProcessPool:
+            # Broken by a killed worker before this expression was submitted
+            MATH_LIMITED.labels(reason="killed").inc()
+            self._reset(pool)
+            return RESTARTED_MESSAGE
+        # Counted only once submitted, a submit that raises holds no slot
+        self._pending += 1
+        # Released when the worker is done, not when the caller stops waiting
+        future.add_done_callback(lambda _: loop.call_soon_threadsafe(self._release))
+        try:
+            # Backstop for the worker limits; cancelling the caller drops a queued expression
+            answer = await asyncio.wait_for(asyncio.wrap_future(future), self.cpu_seconds * 2 + 5)
+        except asyncio.TimeoutError:
+            # Includes time queued behind other expressions, not worth caching
+            MATH_LIMITED.labels(reason="timeout").inc()
+            return f"Stopped: this takes more than {self.cpu_seconds:g} seconds to compute."
+        except ComputationLimit:
+            MATH_LIMITED.labels(reason="cpu").inc()
+            answer = f"Stopped: this takes more than {self.cpu_seconds:g} seconds to compute."
+        except MemoryError:
+            MATH_LIMITED.labels(reason="memory").inc()
+            answer = f"Stopped: this needs more than {self.memory_mb} MB of memory to compute."
+        except BrokenProcessPool:
+            # A worker was killed by its CPU limit inside a C call, every expression it had queued is lost
+            MATH_LIMITED.labels(reason="killed").inc()
+            self._reset(pool)
+            return RESTARTED_MESSAGE
+        else:
+            MATH_EVAL_LATENCY.observe(time.perf_counter() - started)
+        self.cache.set(key, answer)
+        return answer
+
+    def _release(self):
+        self._pending -= 1
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn, since forking a process that runs faiss/torch threads is unsafe
+            self._pool = ProcessPoolExecutor(max_workers=self.processes,
+                                             mp_context=multiprocessing.get_context("spawn"),
+                                             initializer=init_worker, initargs=(self.memory_mb,))
+            logger.info(f"Started math pool with {self.processes} processes")
+        return self._pool
+
+    def _reset(self, pool: ProcessPoolExecutor):
+        # Callers sharing the broken pool all land here, only the first one replaces it
+        if self._pool is pool:
+            logger.warning("Math worker killed, restarting the pool")
+            self._pool = None
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+math_sandbox = MathSandbox()
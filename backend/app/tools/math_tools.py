@@ -1,8 +1,34 @@
 import ast
 import operator as op
 import math
-import sympy as sp
 import re
+import signal
+
+try:
+    import resource
+except ImportError:  # Windows, no CPU or memory limits
+    resource = None
+
+# Largest integer result, in bits, arithmetic may produce before it is refused
+MAX_RESULT_BITS = 100_000
+
+
+class ComputationLimit(BaseException):
+    # BaseException, so the tools' own "except Exception" don't turn it into an answer
+    pass
+
+
+def _sympy():
+    # sympy takes seconds to import, only pay for it when a symbolic query arrives
+    import sympy
+    return sympy
+
+# Parse with sympy's parser: "2x" is 2*x and "x^2" a power
+def parse_math(text: str):
+    from sympy.parsing.sympy_parser import (convert_xor, implicit_multiplication_application, parse_expr,
+                                            standard_transformations)
+    return parse_expr(text, transformations=standard_transformations + (implicit_multiplication_application,
+                                                                       convert_xor))
 
 # Supported operators
 operators = {
@@ -10,26 +36,40 @@ operators = {
     ast.Pow: op.pow, ast.Mod: op.mod, ast.USub: op.neg
 }
 
+# Functions and constants of the math module, e.g. sqrt(16) or 2*pi
+math_names = {name: value for name, value in math.__dict__.items() if not name.startswith("__")}
+
 # Safely evaluate math expressions without using eval().
 def safe_eval(expr):
 
     def eval_node(node):
-        if isinstance(node, ast.Num):  # <number>
-            return node.n
-        elif isinstance(node, ast.BinOp):  # operator
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):  # <number>
+            return node.value
+        elif isinstance(node, ast.Name) and isinstance(math_names.get(node.id), float):  # pi, e
+            return math_names[node.id]
+        elif isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and callable(math_names.get(node.func.id)) \
+                and not node.keywords:  # sqrt(16)
+            return math_names[node.func.id](*[eval_node(arg) for arg in node.args])
+        elif isinstance(node, ast.BinOp) and type(node.op) in operators:  # operator
             left = eval_node(node.left)
             right = eval_node(node.right)
+            if isinstance(node.op, ast.Pow) and isinstance(left, int) and isinstance(right, int) \
+                    and abs(left) > 1 and right * math.log2(abs(left)) > MAX_RESULT_BITS:
+                # 9**9**9 would hold the worker for minutes inside a single C call
+                raise ValueError("result too large")
             return operators[type(node.op)](left, right)
-        elif isinstance(node, ast.UnaryOp):  # unary minus
+        elif isinstance(node, ast.UnaryOp) and type(node.op) in operators:  # unary minus
             operand = eval_node(node.operand)
             return operators[type(node.op)](operand)
         else:
-            raise TypeError(f"Unsupported expression: {node}")
-    node = ast.parse(expr, mode='eval').body
+            raise TypeError(f"Unsupported expression: {ast.dump(node)}")
+    # '^' means power to users, not xor
+    node = ast.parse(expr.replace("^", "**"), mode='eval').body
     return eval_node(node)
 
 # Solve algebraic equations
 def solve_equation(expression: str) -> str:
+    sp = _sympy()
     try:
         # Better regex pattern that handles spaces and complex equations
         equation_match = re.search(r'(.+?)\s*=\s*(.+)', expression)
@@ -41,9 +81,10 @@ def solve_equation(expression: str) -> str:
             return "Please provide an equation with '=' sign. Example: 'solve x^2 - 4 = 0'"
         
         lhs, rhs = equation_match.groups()
+        lhs = re.sub(r'^\s*solve\s+', '', lhs, flags=re.IGNORECASE)
         
         x = sp.symbols('x')
-        equation = sp.Eq(sp.sympify(lhs.strip()), sp.sympify(rhs.strip()))
+        equation = sp.Eq(parse_math(lhs.strip()), parse_math(rhs.strip()))
         solutions = sp.solve(equation, x)
         
         if solutions:
@@ -51,11 +92,15 @@ def solve_equation(expression: str) -> str:
         else:
             return "No solution found."
             
+    except MemoryError:
+        # Reported by the sandbox as its memory limit, not as a math error
+        raise
     except Exception as e:
         return f"Error: {str(e)}. Try: 'solve x^2 - 4 = 0'"
 
 # Calculate derivatives    
 def calculate_derivative(expression: str) -> str:
+    sp = _sympy()
     try:
         if "derivative of" in expression.lower():
             expr_str = expression.lower().split("derivative of")[-1].strip()
@@ -67,17 +112,20 @@ def calculate_derivative(expression: str) -> str:
         expr_str = re.sub(r'[^\w\s\+\-\*\/\^\(\)\.]', '', expr_str)
         
         x = sp.symbols('x')
-        expr = sp.sympify(expr_str)
+        expr = parse_math(expr_str)
         
         derivative = sp.diff(expr, x)
         
         return f"Derivative of: \n {expr} is: \n {derivative}"
         
+    except MemoryError:
+        raise
     except Exception as e:
         return f"Error While calculating derivative:\n {str(e)}. \n  Try this type of queries : 'derivative of x^2'"
 
 # Calculate trigonometric functions and solve trig equations
 def solve_trigonometry(expression: str) -> str:
+    sp = _sympy()
     try:
         trig_match = re.search(r'(sin|cos|tan|csc|sec|cot)\(([^)]+)\)', expression.lower())
         
@@ -119,6 +167,8 @@ def solve_trigonometry(expression: str) -> str:
         else:
             return "Try: 'sin(30 degrees)' or 'solve sin(x) = 0.5'"
             
+    except MemoryError:
+        raise
     except Exception as e:
         return f"Error In Tool trigonometry with your equation: \n {str(e)}. \n You Can Try Below Some Equation For Better Response: \n 'sin(30)' \n 'cos(45 degrees)'"
 
@@ -138,12 +188,43 @@ def calculate(expression: str) -> str:
     
     else:
         try:
-            allowed_names = {}
-            for name, value in math.__dict__.items():
-                if not name.startswith("__"):
-                    allowed_names[name] = value
-            
-            result = eval(expression, {"__builtins__": None}, allowed_names)
-            return str(result)
+            return str(safe_eval(clean_expr))
+        except MemoryError:
+            raise
         except Exception as e:
             return f"Error For Evaluating Expressions : {e}"
+
+
+# Worker process side of tools/math_sandbox.py
+def _cpu_time_exceeded(signum, frame):
+    raise ComputationLimit("cpu")
+
+
+def init_worker(memory_mb: int):
+    """Process pool initializer: imports sympy, then caps the worker's memory."""
+    _sympy()
+    if resource is None:
+        return
+    signal.signal(signal.SIGPROF, _cpu_time_exceeded)
+    if memory_mb > 0:
+        _, hard = resource.getrlimit(resource.RLIMIT_AS)
+        resource.setrlimit(resource.RLIMIT_AS, (memory_mb * 1024 * 1024, hard))
+
+
+def calculate_limited(expression: str, cpu_seconds: float, fn=calculate) -> str:
+    """
+    Runs in a math worker process: fn(expression) with at most cpu_seconds of
+    CPU time. Python code is interrupted by ComputationLimit; work stuck inside
+    a C call past one more second gets the worker killed by RLIMIT_CPU.
+    """
+    if resource is None:
+        return fn(expression)
+    used = sum(resource.getrusage(resource.RUSAGE_SELF)[:2])
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    soft = math.ceil(used + cpu_seconds) + 1
+    resource.setrlimit(resource.RLIMIT_CPU, (soft if hard == resource.RLIM_INFINITY else min(soft, hard), hard))
+    signal.setitimer(signal.ITIMER_PROF, cpu_seconds)
+    try:
+        return fn(expression)
+    finally:
+        signal.setitimer(signal.ITIMER_PROF, 0)
@@ -0,0 +1,149 @@
+import os
+import re
+import time
+import asyncio
+import logging
+from typing import Awaitable, Callable, List, NamedTuple, Optional, Pattern, Sequence, Union
+
+import numpy as np
+
+from backend.app.api.metrics import TOOL_ROUTE_HITS, TOOL_ROUTE_LATENCY
+from backend.app.tools.date_tools import date_diff
+from backend.app.tools.math_sandbox import math_sandbox
+
+logger = logging.getLogger(__name__)
+
+# Route on query embeddings when no pattern matched; only if the model is loaded already
+TOOL_INTENT_CLASSIFIER = os.getenv("TOOL_INTENT_CLASSIFIER", "false").lower() == "true"
+# Cosine similarity to a tool's closest example needed to route to it
+TOOL_INTENT_THRESHOLD = float(os.getenv("TOOL_INTENT_THRESHOLD", "0.8"))
+
+EmbedFn = Callable[[str], Awaitable[np.ndarray]]
+
+
+class Tool(NamedTuple):
+    name: str
+    # Returns the answer, or None to hand the query on to the RAG pipeline. Handlers
+    # that may run long are coroutines that take the work off the event loop.
+    handler: Callable[[str], Union[Optional[str], Awaitable[Optional[str]]]]
+    patterns: Sequence[Pattern]
+    examples: Sequence[str] = ()
+
+
+class ToolRouter:
+    """
+    Registry of tools answering chat queries without an LLM call. Tools are
+    tried in registration order against their precompiled patterns, then,
+    optionally, by embedding similarity to their example queries.
+    """
+
+    def __init__(self, embed_fn: Optional[EmbedFn] = None, use_classifier: bool = TOOL_INTENT_CLASSIFIER,
+                 threshold: float = TOOL_INTENT_THRESHOLD, ready: Callable[[], bool] = lambda: True):
+        self.tools: List[Tool] = []
+        self.embed_fn = embed_fn
+        self.use_classifier = use_classifier and embed_fn is not None
+        self.threshold = threshold
+        self.ready = ready
+        # Normalized example embeddings per tool, computed on first classification
+        self._examples: Optional[List[np.ndarray]] = None
+
+    def register(self, tool: Tool):
+        self.tools.append(tool)
+        self._examples = None
+
+    async def route(self, query: str):
+        """(tool, matcher) for the query, or (None, None) when it belongs to the RAG pipeline."""
+        for tool in self.tools:
+            if any(pattern.search(query) for pattern in tool.patterns):
+                return tool, "pattern"
+        if self.use_classifier and self.ready():
+            tool = await self._classify(query)
+            if tool is not None:
+                return tool, "intent"
+        return None, None
+
+    async def dispatch(self, query: str) -> Optional[str]:
+        """The tool's answer, or None if no tool answered the query."""
+        started = time.perf_counter()
+        tool, matcher = await self.route(query)
+        if tool is None:
+            return None
+        try:
+            answer = tool.handler(query)
+            if asyncio.iscoroutine(answer):
+                answer = await answer
+        except Exception as e:
+            logger.error(f"Tool {tool.name} failed on {query!r}: {e}")
+            answer = None
+        if answer is not None:
+            TOOL_ROUTE_HITS.labels(route=tool.name, matcher=matcher).inc()
+            TOOL_ROUTE_LATENCY.labels(route=tool.name).observe(time.perf_counter() - started)
+        return answer
+
+    async def _classify(self, query: str) -> Optional[Tool]:
+        if self._examples is None:
+            examples = []
+            for tool in self.tools:
+                vectors = [(await self.embed_fn(example)).ravel() for example in tool.examples]
+                examples.append(_normalize(np.vstack(vectors)) if vectors else np.zeros((0, 1), dtype=np.float32))
+            self._examples = examples
+        query_vector = _normalize((await self.embed_fn(query)).reshape(1, -1))[0]
+        best_tool, best_score = None, self.threshold
+        for tool, vectors in zip(self.tools, self._examples):
+            if len(vectors):
+                score = float((vectors @ query_vector).max())
+                if score >= best_score:
+                    best_tool, best_score = tool, score
+        return best_tool
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+
+
+# Built-in tools
+_ISO_DATE = re.compile(r"\b\d{4}-\d{2}-\d{2}\b")
+_MATH_COMMAND = re.compile(r"^\s*(?:calculate|compute|evaluate|what\s+is|what's)\s+", re.IGNORECASE)
+
+MATH_PATTERNS = [
+    # Plain arithmetic, optionally asked for: "2 * (3 + 4)", "what is 15 % 4?"
+    re.compile(r"^\s*(?:(?:calculate|compute|evaluate|what\s+is|what's)\s+)?"
+               r"[\d.\s()]*\d[\d.\s()]*(?:[-+*/^%][\d.\s()]*\d[\d.\s()]*)+\??\s*$", re.IGNORECASE),
+    # Equations in x: "solve x^2 - 4 = 0", "2x + 3 = 7"
+    re.compile(r"^\s*(?:solve\s+)?[-+*/^().\dx\s]*x[-+*/^().\dx\s]*=[-+*/^().\dx\s]+$", re.IGNORECASE),
+    re.compile(r"\b(?:derivative\s+of|differentiate|d/dx)\b", re.IGNORECASE),
+    # Trig functions written as calls: "sin(30 degrees)"
+    re.compile(r"\b(?:sin|cos|tan|csc|sec|cot)\s*\(", re.IGNORECASE),
+]
+
+DATE_PATTERNS = [
+    re.compile(r"\b\d{4}-\d{2}-\d{2}\b.*\b\d{4}-\d{2}-\d{2}\b", re.DOTALL),
+]
+
+
+async def answer_math(query: str) -> Optional[str]:
+    # "calculate 2 + 2" evaluates the expression, not the sentence
+    return await math_sandbox.calculate(_MATH_COMMAND.sub("", query, count=1).rstrip("? "))
+
+
+def answer_date(query: str) -> Optional[str]:
+    dates = _ISO_DATE.findall(query)
+    if len(dates) < 2:
+        return None
+    return date_diff(dates[0], dates[1])
+
+
+def build_router(embed_fn: Optional[EmbedFn] = None, **kwargs) -> ToolRouter:
+    router = ToolRouter(embed_fn=embed_fn, **kwargs)
+    router.register(Tool("date", answer_date, DATE_PATTERNS, examples=(
+        "how many days between 2024-01-01 and 2024-03-15",
+        "difference between dates 2023-05-01 and 2023-06-30",
+    )))
+    router.register(Tool("math", answer_math, MATH_PATTERNS, examples=(
+        "solve x^2 - 4 = 0",
+        "derivative of x^3 + 2x",
+        "calculate 15 * 24 + 7",
+        "sin(30 degrees)",
+    )))
+    return router
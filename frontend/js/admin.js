@@ -3,12 +3,27 @@
   // Fix: Use relative paths instead of absolute
   const API_BASE = '';
 
-  async function fetchSessions() {
+  // "Load more" row that fetches the next page with the given cursor
+  function loadMoreItem(label, onClick) {
+    const li = document.createElement('li');
+    li.className = 'list-group-item list-group-item-action text-center load-more';
+    li.style.cursor = 'pointer';
+    li.textContent = label;
+    li.onclick = onClick;
+    return li;
+  }
+
+  async function fetchSessions(before = null) {
     try {
-      const res = await fetch(`${API_BASE}/admin/sessions`);
+      const params = before ? `?before=${encodeURIComponent(before)}` : '';
+      const res = await fetch(`${API_BASE}/admin/sessions${params}`);
       const data = await res.json();
       const sessionsList = document.getElementById('sessions-list');
-      sessionsList.innerHTML = '';
+      if (before) {
+        sessionsList.querySelector('.load-more')?.remove();
+      } else {
+        sessionsList.innerHTML = '';
+      }
       data.sessions.forEach(session => {
         const li = document.createElement('li');
         li.className = 'list-group-item list-group-item-action d-flex justify-content-between align-items-center';
@@ -41,17 +56,27 @@
         };
         sessionsList.appendChild(li);
       });
+      if (data.next_cursor) {
+        sessionsList.appendChild(loadMoreItem('Load more sessions', () => fetchSessions(data.next_cursor)));
+      }
     } catch (err) {
       alert("Failed to load sessions: " + err);
     }
   }
 
-  async function fetchMessages(sessionId) {
+  async function fetchMessages(sessionId, before = null) {
     try {
-      const res = await fetch(`${API_BASE}/admin/sessions/${sessionId}/messages`);
+      const params = before ? `?before=${encodeURIComponent(before)}` : '';
+      const res = await fetch(`${API_BASE}/admin/sessions/${sessionId}/messages${params}`);
       const data = await res.json();
       const messagesList = document.getElementById('messages-list');
-      messagesList.innerHTML = '';
+      // Older pages go above what is already shown
+      const anchor = before ? messagesList.querySelector('.load-more')?.nextSibling : null;
+      if (before) {
+        messagesList.querySelector('.load-more')?.remove();
+      } else {
+        messagesList.innerHTML = '';
+      }
       data.messages.forEach(msg => {
         const li = document.createElement('li');
         li.className = 'list-group-item d-flex justify-content-between align-items-center';
@@ -72,8 +97,14 @@
 
         li.appendChild(msgText);
         li.appendChild(delBtn);
-        messagesList.appendChild(li);
+        messagesList.insertBefore(li, anchor || null);
       });
+      if (data.next_cursor) {
+        messagesList.insertBefore(
+          loadMoreItem('Load older messages', () => fetchMessages(sessionId, data.next_cursor)),
+          messagesList.firstChild
+        );
+      }
     } catch (err) {
       alert("Failed to load messages: " + err);
     }
@@ -1,6 +1,11 @@
 let socket;
 let sessionId = null;
 let isConnected = false;
+// Assistant bubble currently receiving streamed tokens
+let streamingBubble = null;
+let streamingText = "";
+// Cursor for the next older page of the open session's history, null when it is fully loaded
+let historyCursor = null;
 
 // DOM elements
 const chatInput = document.getElementById('chat-input');
@@ -157,12 +162,22 @@ function handleWebSocketMessage(data) {
         socket.send(JSON.stringify({ type: "get_sessions" }));
     }
     else if (data.type === "sessions_list" && data.sessions) {
-        renderSessionsList(data.sessions);
+        renderSessionsList(data.sessions, Boolean(data.cursor), data.next_cursor);
+    }
+    else if (data.type === "older_messages" && data.messages) {
+        // Insert in reverse right below the button, which leaves them in order
+        const anchor = document.getElementById('load-older-btn');
+        data.messages.slice().reverse().forEach(msg => {
+            const bubble = appendMessage(msg.role, msg.content, false);
+            chatMessages.insertBefore(bubble.parentElement, anchor ? anchor.nextSibling : chatMessages.firstChild);
+        });
+        setHistoryCursor(data.next_cursor);
     }
     else if (data.type === "history" && data.messages) {
         sessionId = data.session_id || sessionId;  // Update sessionId if provided
         clearChatMessages();
         data.messages.forEach(msg => appendMessage(msg.role, msg.content));
+        setHistoryCursor(data.next_cursor);
         // Refresh sessions list to highlight current session
         socket.send(JSON.stringify({ type: "get_sessions" }));
         
@@ -171,17 +186,62 @@ function handleWebSocketMessage(data) {
             hideSidebar();
         }
     }
+    else if (data.type === "assistant_delta") {
+        // Tokens stream into one bubble until the final assistant_message
+        if (!streamingBubble) {
+            streamingBubble = appendMessage("assistant", "");
+            streamingText = "";
+        }
+        streamingText += data.content;
+        streamingBubble.innerHTML = formatMessage(streamingText);
+        chatMessagesContainer.scrollTop = chatMessagesContainer.scrollHeight;
+    }
     else if (data.type === "assistant_message") {
-        appendMessage("assistant", data.content);
+        if (data.streamed && streamingBubble) {
+            streamingBubble.innerHTML = formatMessage(data.content);
+            streamingBubble = null;
+        } else {
+            appendMessage("assistant", data.content);
+        }
+    }
+    else if (data.type === "ingest_complete") {
+        if (data.status === "completed") {
+            appendMessage("system", `Document processed, ${data.chunks_embedded} chunks indexed.`);
+        } else {
+            appendMessage("system", `Document processing failed: ${data.error}`);
+        }
     }
     else if (data.error) {
         appendMessage("system", `Error: ${data.error}`);
     }
 }
 
-// Fetch All session by ID
-function renderSessionsList(sessions) {
-    sessionsListContainer.innerHTML = ""; // Clear existing
+function setHistoryCursor(cursor) {
+    historyCursor = cursor || null;
+    let button = document.getElementById('load-older-btn');
+    if (!historyCursor) {
+        if (button) button.remove();
+        return;
+    }
+    if (!button) {
+        button = document.createElement('button');
+        button.id = 'load-older-btn';
+        button.className = 'mx-auto text-sm text-purple-300 hover:text-purple-100';
+        button.textContent = 'Load older messages';
+        button.onclick = () => {
+            socket.send(JSON.stringify({ type: "load_older", session_id: sessionId, before: historyCursor }));
+        };
+        chatMessages.insertBefore(button, chatMessages.firstChild);
+    }
+}
+
+// Fetch All session by ID. append adds a further page below the current list
+function renderSessionsList(sessions, append = false, nextCursor = null) {
+    if (append) {
+        sessionsListContainer.querySelector('.load-more-sessions')?.remove();
+    } else {
+        sessionsListContainer.innerHTML = ""; // Clear existing
+    }
 
     // Sort sessions by creation date (newest first)
     sessions.sort((a, b) => new Date(b.created_at) - new Date(a.created_at));
@@ -217,8 +277,16 @@ function renderSessionsList(sessions) {
         sessionsListContainer.appendChild(sessionElem);
     });
 
+    if (nextCursor) {
+        const moreElem = document.createElement("div");
+        moreElem.className = "session-item load-more-sessions text-center text-gray-400";
+        moreElem.textContent = "Load more sessions";
+        moreElem.onclick = () => socket.send(JSON.stringify({ type: "get_sessions", before: nextCursor }));
+        sessionsListContainer.appendChild(moreElem);
+    }
+
     // Add message if no sessions
-    if (sessions.length === 0) {
+    if (sessions.length === 0 && !append) {
         const noSessionsElem = document.createElement("div");
         noSessionsElem.className = "session-item text-center text-gray-400";
         noSessionsElem.textContent = "No recent sessions";
@@ -263,13 +331,14 @@ function uploadDocument(event) {
         body: formData
     }).then(resp => resp.json())
     .then(data => {
-        appendMessage("system", data.message || "Upload complete.");
+        // Processing continues in the background, the result arrives as an ingest_complete message
+        appendMessage("system", data.message || "Upload queued for processing.");
     }).catch(err => {
         appendMessage("system", `Upload error: ${err}`);
     });
 }
 
-function appendMessage(role, text) {
+function appendMessage(role, text, scroll = true) {
     if (welcomeMessage.style.display !== 'none') {
         welcomeMessage.style.display = 'none';
     }
@@ -303,22 +372,29 @@ function appendMessage(role, text) {
         contentDiv.classList.add('bg-purple-900', 'bg-opacity-20', 'border', 'border-purple-500', 'border-opacity-50', 'text-purple-300', 'text-sm', 'text-center', 'max-w-md');
     }
 
-    let formattedText = text
-        .replace(/\*\*(.*?)\*\*/g, '<strong>$1</strong>')
-        .replace(/\*(.*?)\*/g, '<em>$1</em>')
-        .replace(/`(.*?)`/g, '<code class="bg-gray-800 px-1 py-0.5 rounded">$1</code>');
-
-    contentDiv.innerHTML = formattedText;
+    contentDiv.innerHTML = formatMessage(text);
 
     messageDiv.appendChild(profileDiv);
     messageDiv.appendChild(contentDiv);
 
     chatMessages.appendChild(messageDiv);
-    chatMessagesContainer.scrollTop = chatMessagesContainer.scrollHeight;
+    if (scroll) {
+        chatMessagesContainer.scrollTop = chatMessagesContainer.scrollHeight;
+    }
+    return contentDiv;
+}
+
+function formatMessage(text) {
+    return text
+        .replace(/\*\*(.*?)\*\*/g, '<strong>$1</strong>')
+        .replace(/\*(.*?)\*/g, '<em>$1</em>')
+        .replace(/`(.*?)`/g, '<code class="bg-gray-800 px-1 py-0.5 rounded">$1</code>');
 }
 
 function clearChatMessages() {
     chatMessages.innerHTML = '';
+    streamingBubble = null;
+    historyCursor = null;
     welcomeMessage.style.display = 'flex';
 }
 
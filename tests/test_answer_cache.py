@@ -0,0 +1,36 @@
+import numpy as np
+
+from backend.app.core.answer_cache import SemanticAnswerCache
+
+
+def unit(vector):
+    vector = np.asarray(vector, dtype="float32")
+    return vector / np.linalg.norm(vector)
+
+
+def test_similar_query_with_same_chunks_hits():
+    cache = SemanticAnswerCache(threshold=0.95, dim=3)
+    cache.store(unit([1, 0, 0]), [1, 2], "cached answer", llm_latency=1.5)
+
+    assert cache.lookup(unit([1, 0.05, 0]), [2, 1]) == "cached answer"
+    assert cache.lookup(unit([1, 0.05, 0]), [1, 3]) is None
+    assert cache.lookup(unit([0, 1, 0]), [1, 2]) is None
+
+
+def test_capacity_evicts_oldest():
+    cache = SemanticAnswerCache(capacity=2, dim=3)
+    cache.store(unit([1, 0, 0]), [1], "first")
+    cache.store(unit([0, 1, 0]), [1], "second")
+    cache.store(unit([0, 0, 1]), [1], "third")
+
+    assert len(cache) == 2
+    assert cache.lookup(unit([1, 0, 0]), [1]) is None
+    assert cache.lookup(unit([0, 0, 1]), [1]) == "third"
+
+
+def test_index_version_change_invalidates():
+    cache = SemanticAnswerCache(dim=3)
+    cache.store(unit([1, 0, 0]), [1], "answer", version=1)
+    assert cache.lookup(unit([1, 0, 0]), [1], version=1) == "answer"
+    assert cache.lookup(unit([1, 0, 0]), [1], version=2) is None
+    assert len(cache) == 0
@@ -0,0 +1,42 @@
+import numpy as np
+
+from backend.app.db.bm25_index import BM25Index, reciprocal_rank_fusion, tokenize
+
+
+def test_tokenize_keeps_codes_whole_and_split():
+    assert tokenize("Invoice INV-2024-001, v1.2") == ["invoice", "inv-2024-001", "inv", "2024", "001", "v1.2", "v1", "2"]
+
+
+def test_exact_code_ranks_first_and_removal_is_incremental():
+    index = BM25Index()
+    index.add([0, 1, 2], ["invoice INV-2024-001 for march", "an invoice for april", "unrelated notes"])
+    scores, ids = index.search("invoice INV-2024-001", k=3)
+    assert ids[0].tolist() == [0, 1, -1]
+    assert scores[0][0] > scores[0][1] > 0
+
+    index.remove([0], ["invoice INV-2024-001 for march"])
+    _, ids = index.search("invoice INV-2024-001", k=3)
+    assert ids[0].tolist() == [1, -1, -1]
+    assert len(index) == 2 and "inv-2024-001" not in index.postings
+
+
+def test_search_restricted_to_allowed_ids():
+    index = BM25Index()
+    index.add([0, 1], ["shared term", "shared term again"])
+    _, ids = index.search("shared", k=2, allowed_ids=np.array([1]))
+    assert ids[0].tolist() == [1, -1]
+
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    scores, ids = reciprocal_rank_fusion([np.array([1, 2, 3]), np.array([3, 1, -1])], k=4, rrf_k=60)
+    assert ids[0].tolist() == [1, 3, 2, -1]
+    assert scores[0][0] == np.float32(1 / 61 + 1 / 62)
+
+
+def test_contains_any_for_rare_and_common_terms():
+    index = BM25Index()
+    index.add(range(5), ["common rare", "common", "common", "common", "other"])
+    ids = np.array([4, 0, 2])
+    assert index.contains_any(ids, "rare").tolist() == [False, True, False]
+    assert index.contains_any(ids, "common").tolist() == [False, True, True]
+    assert index.contains_any(ids, "missing").tolist() == [False, False, False]
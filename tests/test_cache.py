@@ -0,0 +1,36 @@
+import time
+
+from backend.app.api.metrics import CACHE_HITS, CACHE_MISSES
+from backend.app.core.cache import TTLCache, normalize_query
+
+
+def test_lru_eviction():
+    cache = TTLCache("test_lru", maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # "b" is now least recently used
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+
+def test_ttl_expiry():
+    cache = TTLCache("test_ttl", maxsize=10, ttl=0.01)
+    cache.set("a", 1)
+    time.sleep(0.02)
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_hits_and_misses_are_counted():
+    cache = TTLCache("test_metrics")
+    cache.get("missing")
+    cache.set("key", "value")
+    cache.get("key")
+    assert CACHE_HITS.labels(cache="test_metrics")._value.get() == 1
+    assert CACHE_MISSES.labels(cache="test_metrics")._value.get() == 1
+
+
+def test_normalize_query():
+    assert normalize_query("  What is  ELARA? ") == "what is elara?"
@@ -0,0 +1,65 @@
+import numpy as np
+
+from backend.app.core.context_builder import (Passage, build_context, merge_neighbours, merge_overlapping, pack,
+                                              select_mmr)
+
+
+def unit(*values):
+    vector = np.array(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def test_merge_overlapping_writes_shared_sentences_once():
+    left = "First sentence of the chunk. The shared closing sentence."
+    right = "The shared closing sentence. Next chunk goes on."
+    assert merge_overlapping(left, right) == "First sentence of the chunk. The shared closing sentence. Next chunk goes on."
+    assert merge_overlapping("No overlap here at all.", "Completely different text.") == \
+        "No overlap here at all. Completely different text."
+
+
+def test_neighbours_merge_and_near_duplicates_drop():
+    vectors = np.vstack([unit(1, 0, 0), unit(0, 1, 0), unit(1, 0.01, 0), unit(0, 0, 1)])
+    passages = build_context(
+        ids=[11, 10, 30, 20],
+        texts=["Chunk eleven continues here.", "Chunk ten opens the section.", "Copy of ten.", "Other doc."],
+        slots=[1, 1, 2, 3],
+        positions=[6, 5, 0, 0],
+        pages=[4, 3, 1, -1],
+        scores=[0.9, 0.8, 0.7, 0.6],
+        vectors=vectors,
+    )
+    # 10 and 11 become one passage starting on page 3; 30 duplicates it and is dropped
+    assert passages == [
+        "[1] (p. 3) Chunk ten opens the section. Chunk eleven continues here.",
+        "[2] Other doc.",
+    ]
+
+
+def test_only_neighbours_in_the_document_merge():
+    vectors = np.vstack([unit(1, 0, 0), unit(0, 1, 0), unit(0, 0, 1), unit(1, 1, 0), unit(0, 1, 1)])
+    passages = merge_neighbours(
+        # 20 and 21 were added together, but a reused chunk sat between them in the document
+        ids=[20, 21, 7, 8, 9],
+        texts=["Before the reused chunk.", "After the reused chunk.", "Reused.", "Legacy one.", "Legacy two."],
+        slots=[4, 4, 1, -1, -1],
+        positions=[2, 4, 3, -1, -1],
+        pages=[1, 1, 1, -1, -1],
+        scores=[0.9, 0.8, 0.7, 0.6, 0.5],
+        vectors=vectors,
+    )
+    assert [passage.ids for passage in passages] == [[20], [21], [7], [8], [9]]
+
+
+def test_mmr_prefers_diverse_passages():
+    passages = [Passage([0], "a", 1, 1.0, unit(1, 0)), Passage([1], "b", 1, 0.9, unit(1, 0.3)),
+                Passage([2], "c", 1, 0.8, unit(0, 1))]
+    chosen = select_mmr(passages, lambda_=0.5, duplicate_threshold=1.1)
+    assert [p.text for p in chosen] == ["a", "c", "b"]
+
+
+def test_pack_respects_budget():
+    passages = [Passage([i], "word " * 50, 1, 1.0, unit(1, 0)) for i in range(5)]
+    packed = pack(passages, budget_tokens=150, count_tokens=lambda texts: [len(t.split()) for t in texts])
+    assert len(packed) == 2
+    cut = pack(passages[:1], budget_tokens=10, count_tokens=lambda texts: [len(t.split()) for t in texts])
+    assert len(cut[0].text.split()) < 10
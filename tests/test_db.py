@@ -0,0 +1,84 @@
+import pytest
+
+from backend.app.db import crud, database
+from backend.app.db.database import MemoryBackend, PostgresBackend
+
+
+@pytest.fixture(autouse=True)
+def memory_db():
+    previous = database.get_db()
+    yield database.use_backend(MemoryBackend())
+    database.use_backend(previous)
+
+
+@pytest.mark.asyncio
+async def test_session_and_messages_roundtrip():
+    session_id = await crud.create_session()
+    assert (await crud.get_session(session_id))["status"] == "active"
+
+    first = await crud.create_message(session_id, "hello", role="user")
+    await crud.create_message(session_id, "hi there", role="assistant")
+    messages = await crud.get_messages_by_session(session_id)
+    assert [m["content"] for m in messages] == ["hello", "hi there"]
+    assert isinstance(messages[0]["created_at"], str)
+
+    await crud.delete_message(first)
+    assert [m["content"] for m in await crud.get_messages_by_session(session_id)] == ["hi there"]
+
+
+@pytest.mark.asyncio
+async def test_missing_session_and_documents():
+    assert await crud.get_session("missing") is None
+    document_id = await crud.create_document("s1", "a.pdf", "http://files/a.pdf")
+    assert [d["id"] for d in await crud.get_documents_by_session("s1")] == [document_id]
+    await crud.delete_document(document_id)
+    assert await crud.get_documents_by_session("s1") == []
+
+
+def test_postgres_where_clause():
+    where, values = PostgresBackend._where({"session_id": "s1", "role": "user"})
+    assert where == ' WHERE "session_id" = $1 AND "role" = $2'
+    assert values == ["s1", "user"]
+    with pytest.raises(ValueError):
+        PostgresBackend._where({"id; drop table x": 1})
+
+
+@pytest.mark.asyncio
+async def test_messages_keyset_pagination():
+    session_id = await crud.create_session()
+    for i in range(7):
+        await crud.create_message(session_id, f"m{i}")
+
+    page, cursor = await crud.get_messages_page(session_id, limit=3)
+    assert [m["content"] for m in page] == ["m4", "m5", "m6"]
+    page, cursor = await crud.get_messages_page(session_id, limit=3, before=cursor)
+    assert [m["content"] for m in page] == ["m1", "m2", "m3"]
+    page, cursor = await crud.get_messages_page(session_id, limit=3, before=cursor)
+    assert [m["content"] for m in page] == ["m0"]
+    assert cursor is None
+
+    with pytest.raises(ValueError):
+        await crud.get_messages_page(session_id, before="not-a-cursor")
+
+
+@pytest.mark.asyncio
+async def test_recent_messages_cache_invalidated_on_write():
+    session_id = await crud.create_session()
+    await crud.create_message(session_id, "first")
+    page, _ = await crud.get_messages_page(session_id)
+    assert len(page) == 1
+    assert crud.recent_messages_cache.get(session_id) is not None
+
+    await crud.create_messages([{"id": "m-2", "session_id": session_id, "content": "second",
+                                 "role": "assistant", "message_type": "text", "created_at": "2999-01-01T00:00:00+00:00"}])
+    page, _ = await crud.get_messages_page(session_id)
+    assert [m["content"] for m in page] == ["first", "second"]
+
+
+@pytest.mark.asyncio
+async def test_sessions_pagination():
+    ids = [await crud.create_session() for _ in range(3)]
+    page, cursor = await crud.get_sessions_page(limit=2)
+    rest, end = await crud.get_sessions_page(limit=2, before=cursor)
+    assert [s["id"] for s in page + rest] == ids[::-1]
+    assert end is None
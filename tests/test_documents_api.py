@@ -1,5 +1,6 @@
 import pytest
 from fastapi.testclient import TestClient
+from unittest.mock import AsyncMock
 from backend.app.main import app
 
 client = TestClient(app)
@@ -7,27 +8,33 @@ client = TestClient(app)
 def mock_upload_to_supabase_storage(path, filename):
     return "http://fake-storage-url.com/fake.pdf"
 
-def mock_create_document(session_id, file_name, file_url, do_not_store):
-    return "dummy-doc-id"
-
-def mock_extract_text_from_pdf(path):
-    return "Dummy text extracted from pdf"
+def mock_iter_pdf_pages(path, total=None):
+    yield 1, "Dummy text extracted from pdf"
 
 def test_upload_valid_pdf(monkeypatch):
     monkeypatch.setattr("backend.app.api.documents.upload_to_supabase_storage", mock_upload_to_supabase_storage)
-    monkeypatch.setattr("backend.app.db.crud.create_document", mock_create_document)
-    monkeypatch.setattr("backend.app.api.documents.extract_text_from_pdf", mock_extract_text_from_pdf)
+    monkeypatch.setattr("backend.app.api.documents.create_document", AsyncMock(return_value="dummy-doc-id"))
+    monkeypatch.setattr("backend.app.api.documents.page_count", lambda path: 1)
+    monkeypatch.setattr("backend.app.api.documents.iter_pdf_pages", mock_iter_pdf_pages)
 
     pdf_content = b"%PDF-1.4 fake pdf content"
     files = {"files": ("test.pdf", pdf_content, "application/pdf")}
-    data = {"session_id": "session123", "do_not_store": False}
+    data = {"session_id": "session123", "do_not_store": True}
 
     response = client.post("/documents/upload", data=data, files=files)
 
-    assert response.status_code == 200
+    assert response.status_code == 202
     json_resp = response.json()
     assert "message" in json_resp
-    assert "chunks_sample" in json_resp
+    assert "job_id" in json_resp
+
+    status_resp = client.get(f"/documents/jobs/{json_resp['job_id']}")
+    assert status_resp.status_code == 200
+    assert status_resp.json()["status"] in ("queued", "running", "completed")
+
+def test_unknown_job_returns_404():
+    response = client.get("/documents/jobs/does-not-exist")
+    assert response.status_code == 404
 
 def test_upload_invalid_file_extension():
     files = {"files": ("test.txt", b"text content", "text/plain")}
@@ -37,4 +44,3 @@ def test_upload_invalid_file_extension():
 def test_upload_no_files():
     response = client.post("/documents/upload", files={})
     assert response.status_code == 422  # FastAPI validation error
-
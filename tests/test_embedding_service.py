@@ -0,0 +1,42 @@
+import asyncio
+import numpy as np
+import pytest
+
+from backend.app.core.embedding_service import EmbeddingBatcher
+
+
+@pytest.mark.asyncio
+async def test_concurrent_queries_are_batched():
+    batch_sizes = []
+
+    def fake_embed(texts):
+        batch_sizes.append(len(texts))
+        return np.array([[float(len(t)), 0.0] for t in texts], dtype="float32")
+
+    batcher = EmbeddingBatcher(fake_embed, max_batch_size=8, max_wait_ms=20)
+    results = await asyncio.gather(*(batcher.embed_query("x" * i) for i in range(1, 6)))
+    await batcher.close()
+
+    assert batch_sizes == [5]
+    assert [r.shape for r in results] == [(1, 2)] * 5
+    assert [r[0][0] for r in results] == [1.0, 2.0, 3.0, 4.0, 5.0]
+
+
+@pytest.mark.asyncio
+async def test_batch_failure_propagates_to_callers():
+    def failing_embed(texts):
+        raise RuntimeError("model unavailable")
+
+    batcher = EmbeddingBatcher(failing_embed, max_wait_ms=1)
+    with pytest.raises(RuntimeError):
+        await batcher.embed_query("hello")
+    await batcher.close()
+
+
+@pytest.mark.asyncio
+async def test_batcher_works_again_after_close():
+    batcher = EmbeddingBatcher(lambda texts: np.ones((len(texts), 2), dtype="float32"), max_wait_ms=1)
+    await batcher.embed_query("first lifespan")
+    await batcher.close()
+    assert (await batcher.embed_query("second lifespan")).shape == (1, 2)
+    await batcher.close()
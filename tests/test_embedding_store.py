@@ -0,0 +1,59 @@
+import numpy as np
+
+from backend.app.core.embedding_store import EmbeddingStore
+from backend.app.db.faiss_client import FaissClient, EMBEDDING_DIM
+from backend.app.db.vector_metadata import chunk_hash
+
+MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+
+def random_embeddings(n):
+    return np.random.rand(n, EMBEDDING_DIM).astype("float32")
+
+
+def test_put_get_roundtrip_per_dtype(tmp_path):
+    vectors = random_embeddings(4)
+    keys = [chunk_hash(str(i)) for i in range(4)]
+    for dtype, tolerance in (("float32", 0), ("float16", 1e-3), ("int8", 1e-2)):
+        store = EmbeddingStore(str(tmp_path / dtype), MODEL, EMBEDDING_DIM, dtype=dtype)
+        assert store.put(keys, vectors) == 4
+        assert store.put(keys[:2], vectors[:2]) == 0
+
+        found_vectors, found = store.get(keys + [chunk_hash("missing")])
+        assert found.tolist() == [True] * 4 + [False]
+        np.testing.assert_allclose(found_vectors[:4], vectors, atol=tolerance)
+
+
+def test_embed_only_computes_missing_and_persists(tmp_path):
+    calls = []
+
+    def embed_fn(texts):
+        calls.append(list(texts))
+        return random_embeddings(len(texts))
+
+    store = EmbeddingStore(str(tmp_path), MODEL, EMBEDDING_DIM)
+    texts = ["a", "b", "c"]
+    keys = [chunk_hash(text) for text in texts]
+    first = store.embed(texts[:2], keys[:2], embed_fn)
+    second = store.embed(texts, keys, embed_fn)
+    assert calls == [["a", "b"], ["c"]]
+    np.testing.assert_allclose(second[:2], first, atol=1e-3)
+
+    reopened = EmbeddingStore(str(tmp_path), MODEL, EMBEDDING_DIM)
+    assert len(reopened) == 3
+    assert keys[2] in reopened
+    # Vectors of another model live in their own space
+    assert len(EmbeddingStore(str(tmp_path), "other-model", EMBEDDING_DIM)) == 0
+
+
+def test_ivfpq_migration_copies_exact_vectors(tmp_path):
+    store = EmbeddingStore(str(tmp_path), MODEL, EMBEDDING_DIM, dtype="float32")
+    client = FaissClient(index_type="ivfpq", train_threshold=100, nlist=4, pq_m=8, pq_nbits=4,
+                         embedding_store=store)
+    vectors = random_embeddings(120)
+    client.add_embeddings(vectors.copy(), [f"chunk {i}" for i in range(120)])
+    assert client.index_type == "ivfpq" and client.index.ntotal == 120
+    assert client.migrate("flat")
+
+    expected = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    np.testing.assert_allclose(client.index.reconstruct_n(0, 120), expected, atol=1e-6)
@@ -0,0 +1,246 @@
+import numpy as np
+
+from backend.app.db.faiss_client import FaissClient, EMBEDDING_DIM, index_type_of, read_current_snapshot
+from backend.app.db.vector_metadata import chunk_hash
+
+
+def random_embeddings(n):
+    return np.random.rand(n, EMBEDDING_DIM).astype("float32")
+
+
+def test_snapshot_roundtrip(tmp_path):
+    client = FaissClient()
+    client.add_embeddings(random_embeddings(3), ["first", "second", "ünïcode"])
+    name = client.save(str(tmp_path))
+    assert read_current_snapshot(str(tmp_path)) == name
+
+    loaded = FaissClient()
+    assert loaded.load_snapshot(str(tmp_path))
+    assert loaded.index.ntotal == 3
+    assert [loaded.get_chunk_text(i) for i in range(3)] == ["first", "second", "ünïcode"]
+
+
+def test_add_after_mmap_load_and_resave(tmp_path):
+    client = FaissClient()
+    client.add_embeddings(random_embeddings(2), ["a", "b"])
+    client.save(str(tmp_path))
+
+    loaded = FaissClient()
+    loaded.load_snapshot(str(tmp_path), mmap=True)
+    loaded.add_embeddings(random_embeddings(1), ["c"])
+    loaded.save(str(tmp_path))
+
+    reloaded = FaissClient()
+    reloaded.load_snapshot(str(tmp_path))
+    assert reloaded.index.ntotal == 3
+    assert reloaded.get_chunk_text(2) == "c"
+
+
+def test_reload_if_changed(tmp_path):
+    writer = FaissClient()
+    reader = FaissClient()
+    assert not reader.reload_if_changed(str(tmp_path))
+
+    writer.add_embeddings(random_embeddings(1), ["only"])
+    writer.save(str(tmp_path))
+    assert reader.reload_if_changed(str(tmp_path))
+    assert not reader.reload_if_changed(str(tmp_path))
+    assert reader.get_chunk_text(0) == "only"
+
+
+def test_hnsw_backend_search():
+    client = FaissClient(index_type="hnsw", ef_search=32)
+    embeddings = random_embeddings(50)
+    client.add_embeddings(embeddings.copy(), [str(i) for i in range(50)])
+    _, indices = client.search(embeddings[7:8].copy(), k=1)
+    assert indices[0][0] == 7
+
+
+def test_ivfpq_trains_after_threshold():
+    client = FaissClient(index_type="ivfpq", nlist=4, pq_m=8, pq_nbits=4, train_threshold=200)
+    client.add_embeddings(random_embeddings(100), ["x"] * 100)
+    assert index_type_of(client.index) == "flat"
+    client.add_embeddings(random_embeddings(150), ["y"] * 150)
+    assert index_type_of(client.index) == "ivfpq"
+    assert client.index.ntotal == 250
+
+
+def test_migrate_flat_to_hnsw_keeps_vectors():
+    client = FaissClient()
+    embeddings = random_embeddings(20)
+    client.add_embeddings(embeddings.copy(), [str(i) for i in range(20)])
+    client.index_type = "hnsw"
+    assert client.needs_migration()
+    assert client.migrate()
+    assert index_type_of(client.index) == "hnsw"
+    _, indices = client.search(embeddings[3:4].copy(), k=1)
+    assert indices[0][0] == 3
+
+
+def test_search_restricted_to_session_documents():
+    client = FaissClient()
+    embeddings = random_embeddings(3)
+    client.add_embeddings(embeddings[0:1].copy(), ["mine"], doc_id="doc-a", session_id="session-a")
+    client.add_embeddings(embeddings[1:2].copy(), ["theirs"], doc_id="doc-b", session_id="session-b")
+    client.add_embeddings(embeddings[2:3].copy(), ["shared"], doc_id="doc-c")
+
+    _, indices = client.search(embeddings[1:2].copy(), k=3, session_id="session-a")
+    assert set(indices[0]) - {-1} == {0, 2}
+    _, indices = client.search(embeddings[1:2].copy(), k=3)
+    assert set(indices[0]) == {0, 1, 2}
+    assert client.metadata.get_document(1)["doc_id"] == "doc-b"
+
+
+def test_deleted_document_is_filtered_then_compacted(tmp_path):
+    client = FaissClient()
+    embeddings = random_embeddings(4)
+    client.add_embeddings(embeddings[:2].copy(), ["gone-1", "gone-2"], doc_id="doc-a", session_id="s")
+    client.add_embeddings(embeddings[2:].copy(), ["kept-1", "kept-2"], doc_id="doc-b", session_id="s")
+
+    assert client.delete_document("doc-a") == 2
+    assert client.tombstone_ratio() == 0.5
+    _, indices = client.search(embeddings[:1].copy(), k=4)
+    assert set(indices[0]) - {-1} == {2, 3}
+    _, indices = client.search(embeddings[:1].copy(), k=4, session_id="s")
+    assert set(indices[0]) - {-1} == {2, 3}
+
+    assert client.compact() == 2
+    assert client.index.ntotal == 2
+    assert [client.get_chunk_text(i) for i in range(2)] == ["kept-1", "kept-2"]
+    assert client.metadata.get_document(0)["doc_id"] == "doc-b"
+
+    client.save(str(tmp_path))
+    reloaded = FaissClient()
+    reloaded.load_snapshot(str(tmp_path))
+    _, indices = reloaded.search(embeddings[3:4].copy(), k=1)
+    assert indices[0][0] == 1
+
+
+def test_shared_chunks_survive_deleting_one_document(tmp_path):
+    client = FaissClient()
+    ids = client.add_embeddings(random_embeddings(2), ["shared", "only-a"], doc_id="a", session_id="s1")
+    assert client.find_chunks([chunk_hash("shared"), chunk_hash("new")]).tolist() == [ids[0], -1]
+
+    client.link_document(ids[:1], "b", session_id="s2")
+    query = random_embeddings(1)
+    _, found = client.search(query.copy(), k=5, session_id="s2")
+    assert set(found[0].tolist()) - {-1} == {ids[0]}
+
+    assert client.delete_document("a") == 1  # only-a, shared now belongs to b
+    _, found = client.search(query.copy(), k=5, session_id="s2")
+    assert set(found[0].tolist()) - {-1} == {ids[0]}
+
+    client.compact()
+    client.save(str(tmp_path))
+    loaded = FaissClient()
+    loaded.load_snapshot(str(tmp_path))
+    assert loaded.metadata.ids_for_document("b").tolist() == [0]
+    assert loaded.find_chunks([chunk_hash("shared")]).tolist() == [0]
+    assert loaded.delete_document("b") == 1
+
+
+def test_alias_document_by_file_hash():
+    client = FaissClient()
+    client.add_embeddings(random_embeddings(3), ["x", "y", "z"], doc_id="a", session_id="s1", file_hash="f1")
+    assert client.find_document("f1") == "a"
+    assert len(client.alias_document("a", "b", session_id="s2", file_hash="f1")) == 3
+    client.delete_document("a")
+    assert client.find_document("f1") == "b"
+    client.delete_session("s2")
+    assert client.find_document("f1") is None
+    assert client.tombstone_ratio() == 1.0
+
+
+def test_lexical_index_follows_delete_compaction_and_reload(tmp_path):
+    writer = FaissClient()
+    writer.add_embeddings(random_embeddings(2), ["order A-17 shipped", "order B-22 pending"], doc_id="doc-1")
+    writer.add_embeddings(random_embeddings(1), ["order A-17 refunded"], doc_id="doc-2")
+    writer.save(str(tmp_path))
+
+    reader = FaissClient()
+    reader.load_snapshot(str(tmp_path))
+    _, ids = reader.search_lexical("a-17", k=3)
+    assert sorted(ids[0][:2].tolist()) == [0, 2]
+
+    writer.delete_document("doc-2")
+    writer.save(str(tmp_path))
+    assert reader.reload_if_changed(str(tmp_path))
+    _, ids = reader.search_lexical("a-17", k=3)
+    assert ids[0].tolist() == [0, -1, -1]
+
+    writer.delete_document("doc-1")
+    writer.add_embeddings(random_embeddings(1), ["order A-17 reopened"], doc_id="doc-3")
+    writer.compact()
+    writer.save(str(tmp_path))
+    assert reader.reload_if_changed(str(tmp_path))
+    _, ids = reader.search_lexical("a-17", k=3)
+    assert ids[0].tolist() == [0, -1, -1]
+    assert reader.get_chunk_text(0) == "order A-17 reopened"
+
+
+def test_fork_leaves_the_original_untouched():
+    client = FaissClient()
+    client.add_embeddings(random_embeddings(2), ["order A-17 shipped", "order B-22 pending"], doc_id="doc-1")
+
+    fork = client.fork()
+    fork.add_embeddings(random_embeddings(1), ["order A-17 refunded"], doc_id="doc-2")
+    fork.delete_document("doc-1")
+
+    assert client.index.ntotal == 2 and fork.index.ntotal == 3
+    _, ids = client.search_lexical("a-17", k=3)
+    assert ids[0].tolist() == [0, -1, -1]
+    assert client.get_chunk_text(0) == "order A-17 shipped"
+    assert client.tombstone_ratio() == 0.0
+
+
+def test_compacted_fork_and_reload_keep_held_ids_valid(tmp_path):
+    writer = FaissClient()
+    writer.add_embeddings(random_embeddings(2), ["gone", "kept"], doc_id="doc-a")
+    writer.add_embeddings(random_embeddings(1), ["order A-17 kept too"], doc_id="doc-b")
+    writer.save(str(tmp_path))
+    reader = FaissClient()
+    held = reader.reloaded(str(tmp_path))
+    assert reader.index.ntotal == 0 and held.index.ntotal == 3
+
+    compacted = writer.fork()
+    compacted.delete_document("doc-a")
+    assert compacted.compact() == 2
+    compacted.save(str(tmp_path))
+    latest = held.reloaded(str(tmp_path))
+
+    # A request still holding the old client resolves its ids as before
+    assert held.get_chunk_text(2) == "order A-17 kept too"
+    assert held.metadata.get_document(2)["doc_id"] == "doc-b"
+    _, ids = held.search_lexical("a-17", k=1)
+    assert ids[0].tolist() == [2]
+    assert latest.get_chunk_text(0) == "order A-17 kept too"
+    _, ids = latest.search_lexical("a-17", k=1)
+    assert ids[0].tolist() == [0]
+    assert latest.reloaded(str(tmp_path)) is None
+
+
+def test_chunk_positions_survive_compaction_and_hand_over(tmp_path):
+    client = FaissClient()
+    ids = client.add_embeddings(random_embeddings(3), ["a", "shared", "c"], doc_id="a", positions=[0, 1, 2])
+    client.add_embeddings(random_embeddings(1), ["d"], doc_id="b", positions=[0])
+    client.link_document(ids[1:2], "b")
+    client.delete_document("a")
+    client.compact()
+    client.save(str(tmp_path))
+    loaded = FaissClient()
+    loaded.load_snapshot(str(tmp_path))
+    # The shared chunk passed to b, its position in a means nothing there
+    assert loaded.metadata.positions.tolist() == [-1, 0]
+
+
+def test_boost_results_aligns_scores_with_ids():
+    client = FaissClient()
+    client.add_embeddings(random_embeddings(3), ["alpha report", "beta report", "gamma notes"], pages=[1, 2, 3])
+    # An old chunk without the query term, everything else recent
+    client.metadata.added_at[2] = 1.0
+    ranked = client.boost_results(np.array([2, -1, 1, 0]), np.array([0.5, 0.9, 0.45, 0.3]), query="beta")
+    assert [vector_id for vector_id, _ in ranked] == [1, 2, 0]
+    assert np.isclose(ranked[0][1], 0.45 * 1.1 * 1.2)
+    assert np.isclose(ranked[1][1], 0.5)
+    assert np.isclose(ranked[2][1], 0.3 * 1.2)
+    assert client.metadata.pages.tolist() == [1, 2, 3]
@@ -0,0 +1,53 @@
+import asyncio
+import httpx
+import pytest
+
+from backend.app.services import http_client
+
+
+def use_transport(monkeypatch, handler, concurrency=8):
+    monkeypatch.setattr(http_client, "LLM_RETRY_BASE_DELAY", 0.001)
+    monkeypatch.setattr(http_client, "_client", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    monkeypatch.setattr(http_client, "_semaphore", asyncio.Semaphore(concurrency))
+
+
+@pytest.mark.asyncio
+async def test_retries_on_rate_limit_then_succeeds(monkeypatch):
+    statuses = iter([429, 503, 200])
+    use_transport(monkeypatch, lambda request: httpx.Response(next(statuses), json={"ok": True}))
+
+    response = await http_client.post_json("https://llm.test/v1", {"q": 1}, {})
+    assert response.status_code == 200
+    await http_client.close()
+
+
+@pytest.mark.asyncio
+async def test_gives_up_after_max_retries(monkeypatch):
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(500)
+
+    use_transport(monkeypatch, handler)
+    monkeypatch.setattr(http_client, "LLM_MAX_RETRIES", 2)
+
+    response = await http_client.post_json("https://llm.test/v1", {}, {})
+    assert response.status_code == 500
+    assert len(calls) == 3
+    await http_client.close()
+
+
+@pytest.mark.asyncio
+async def test_client_errors_are_not_retried(monkeypatch):
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(400)
+
+    use_transport(monkeypatch, handler)
+    async with http_client.stream_post("https://llm.test/v1", {}, {}) as response:
+        assert response.status_code == 400
+    assert len(calls) == 1
+    await http_client.close()
@@ -0,0 +1,56 @@
+import asyncio
+import pytest
+
+from backend.app.services import ingest_service
+from backend.app.services.ingest_service import IngestFile
+
+
+@pytest.mark.asyncio
+async def test_job_runs_off_request_and_notifies_listeners():
+    finished = asyncio.Event()
+
+    async def handler(job):
+        job.chunks_embedded = await ingest_service.run_blocking(sum, [1, 2, 3])
+
+    async def listener(job):
+        finished.set()
+
+    ingest_service.add_listener(listener)
+    job = ingest_service.create_job([IngestFile(path="a.pdf", file_name="a.pdf")], session_id="s1")
+    assert ingest_service.get_job(job.id).status == "queued"
+
+    await ingest_service.submit(job, handler)
+    await asyncio.wait_for(finished.wait(), timeout=5)
+
+    assert job.status == "completed"
+    assert job.chunks_embedded == 6
+    assert job.finished_at is not None
+    ingest_service._listeners.remove(listener)
+    await ingest_service.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_failed_job_records_error():
+    async def handler(job):
+        raise ValueError("broken pdf")
+
+    job = ingest_service.create_job([IngestFile(path="b.pdf", file_name="b.pdf")])
+    await ingest_service.submit(job, handler)
+    await ingest_service._queue.join()
+
+    assert job.status == "failed"
+    assert job.error == "broken pdf"
+    await ingest_service.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_service_starts_again_after_shutdown():
+    async def handler(job):
+        job.chunks_embedded = await ingest_service.run_blocking(len, "abc")
+
+    for _ in range(2):
+        job = ingest_service.create_job([IngestFile(path="c.pdf", file_name="c.pdf")])
+        await ingest_service.submit(job, handler)
+        await ingest_service._queue.join()
+        assert job.status == "completed" and job.chunks_embedded == 3
+        await ingest_service.shutdown()
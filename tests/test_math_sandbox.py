@@ -0,0 +1,95 @@
+import pytest
+from concurrent.futures.process import BrokenProcessPool
+
+from backend.app.tools.math_sandbox import BUSY_MESSAGE, RESTARTED_MESSAGE, MathSandbox
+from backend.app.tools import math_tools
+from backend.app.tools.math_tools import calculate
+
+
+def spin(expression):
+    while True:
+        pass
+
+
+def hog(expression):
+    return str(len(bytearray(2 * 1024 ** 3)))
+
+
+def test_arithmetic_is_evaluated_without_eval():
+    assert calculate("2^10") == "1024"
+    assert calculate("sqrt(16) + 1") == "5.0"
+    assert "too large" in calculate("9**9**9")
+    assert "Unsupported" in calculate("__import__('os').getcwd()")
+    assert "Unsupported" in calculate("(1).__class__")
+
+
+@pytest.mark.asyncio
+async def test_sandbox_evaluates_and_caches():
+    sandbox = MathSandbox(processes=1)
+    try:
+        assert await sandbox.calculate("6 * 7") == "42"
+        assert sandbox.cache.get("6 * 7") == "42"
+    finally:
+        sandbox.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_sandbox_stops_expensive_expressions():
+    sandbox = MathSandbox(processes=1, cpu_seconds=0.2, fn=spin)
+    try:
+        assert (await sandbox.calculate("forever")).startswith("Stopped")
+        # The worker survives and the verdict is cached
+        assert sandbox.cache.get("forever").startswith("Stopped")
+        sandbox.fn = calculate
+        assert await sandbox.calculate("1 + 1") == "2"
+    finally:
+        sandbox.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_sandbox_reports_memory_limit():
+    sandbox = MathSandbox(processes=1, memory_mb=512, fn=hog)
+    try:
+        assert "512 MB" in await sandbox.calculate("huge")
+        sandbox.fn = calculate
+        assert await sandbox.calculate("2 + 2") == "4"
+    finally:
+        sandbox.shutdown()
+
+
+def test_tools_let_memory_errors_through(monkeypatch):
+    def exhausted(text):
+        raise MemoryError()
+
+    monkeypatch.setattr(math_tools, "parse_math", exhausted)
+    with pytest.raises(MemoryError):
+        math_tools.solve_equation("x = 1")
+    with pytest.raises(MemoryError):
+        math_tools.calculate_derivative("derivative of x")
+
+
+@pytest.mark.asyncio
+async def test_sandbox_turns_away_work_when_saturated():
+    sandbox = MathSandbox(processes=1, max_pending=0)
+    assert await sandbox.calculate("1 + 1") == BUSY_MESSAGE
+    sandbox.shutdown()
+
+
+class BrokenPool:
+    def submit(self, *args):
+        raise BrokenProcessPool()
+
+    def shutdown(self, **kwargs):
+        pass
+
+
+@pytest.mark.asyncio
+async def test_broken_pool_on_submit_holds_no_slot():
+    sandbox = MathSandbox(processes=1, max_pending=1)
+    sandbox._pool = BrokenPool()
+    try:
+        assert await sandbox.calculate("1 + 1") == RESTARTED_MESSAGE
+        assert sandbox._pending == 0 and sandbox._pool is None
+        assert await sandbox.calculate("1 + 1") == "2"
+    finally:
+        sandbox.shutdown()
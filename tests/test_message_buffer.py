@@ -0,0 +1,113 @@
+import asyncio
+
+import pytest
+
+from backend.app.db import crud, database
+from backend.app.db.database import MemoryBackend
+from backend.app.services import message_buffer
+
+
+class ForeignKeyViolation(Exception):
+    sqlstate = "23503"
+
+
+@pytest.fixture
+def memory_db():
+    previous = database.get_db()
+    yield database.use_backend(MemoryBackend())
+    database.use_backend(previous)
+
+
+@pytest.mark.asyncio
+async def test_buffered_messages_flush_in_order(memory_db):
+    ids = [await message_buffer.enqueue_message("s1", f"m{i}") for i in range(5)]
+    await message_buffer.enqueue_message("s2", "other")
+    assert [m["id"] for m in message_buffer.pending_messages("s1")] == ids
+    assert await crud.get_messages_by_session("s1") == []
+
+    await message_buffer.shutdown()
+    assert message_buffer.pending_messages("s1") == []
+    messages = await crud.get_messages_by_session("s1")
+    assert [m["id"] for m in messages] == ids
+    assert [m["content"] for m in messages] == [f"m{i}" for i in range(5)]
+
+
+@pytest.mark.asyncio
+async def test_failed_flush_keeps_and_retries_batch(memory_db, monkeypatch):
+    calls = []
+    real_create_messages = message_buffer.create_messages
+
+    async def flaky_create_messages(batch):
+        calls.append(len(batch))
+        if len(calls) == 1:
+            raise ConnectionError("db down")
+        return await real_create_messages(batch)
+
+    monkeypatch.setattr(message_buffer, "create_messages", flaky_create_messages)
+    monkeypatch.setattr(message_buffer, "MESSAGE_RETRY_MAX_DELAY", 0.01)
+    message_id = await message_buffer.enqueue_message("s1", "hello")
+
+    assert await message_buffer.flush(retries=0) is False
+    assert [m["id"] for m in message_buffer.pending_messages("s1")] == [message_id]
+
+    await message_buffer.shutdown()
+    assert calls == [1, 1]
+    assert [m["id"] for m in await crud.get_messages_by_session("s1")] == [message_id]
+
+
+@pytest.mark.asyncio
+async def test_rejected_row_is_dropped_without_blocking_others(memory_db, monkeypatch):
+    real_create_messages = message_buffer.create_messages
+
+    async def create_messages(batch):
+        if any(m["session_id"] == "deleted" for m in batch):
+            # Wrapped the way crud wraps driver errors
+            try:
+                raise ForeignKeyViolation("violates foreign key constraint messages_session_id_fkey")
+            except ForeignKeyViolation as e:
+                raise Exception(f"Failed to create messages: {e}")
+        return await real_create_messages(batch)
+
+    monkeypatch.setattr(message_buffer, "create_messages", create_messages)
+    monkeypatch.setattr(message_buffer, "MESSAGE_RETRY_MAX_DELAY", 0.01)
+    # Alone in its batch, the rejected row must not block the buffer either
+    await message_buffer.enqueue_message("deleted", "orphan")
+    assert await asyncio.wait_for(message_buffer.flush(), timeout=1) is True
+    assert message_buffer.pending_messages("deleted") == []
+
+    first = await message_buffer.enqueue_message("s1", "before")
+    await message_buffer.enqueue_message("deleted", "orphan")
+    last = await message_buffer.enqueue_message("s1", "after")
+    assert await message_buffer.flush() is True
+    assert message_buffer.pending_messages("deleted") == []
+    assert [m["id"] for m in await crud.get_messages_by_session("s1")] == [first, last]
+    await message_buffer.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_outage_keeps_every_row(memory_db, monkeypatch):
+    async def create_messages(batch):
+        raise ConnectionError("db down")
+
+    monkeypatch.setattr(message_buffer, "create_messages", create_messages)
+    monkeypatch.setattr(message_buffer, "MESSAGE_RETRY_MAX_DELAY", 0.01)
+    ids = [await message_buffer.enqueue_message("s1", f"m{i}") for i in range(3)]
+
+    with pytest.raises(asyncio.TimeoutError):
+        await asyncio.wait_for(message_buffer.flush(), timeout=0.2)
+    assert [m["id"] for m in message_buffer.pending_messages("s1")] == ids
+    monkeypatch.undo()
+    await message_buffer.shutdown()
+
+
+def test_only_data_errors_are_permanent():
+    assert database.is_permanent_error(ForeignKeyViolation())
+    try:
+        try:
+            raise ForeignKeyViolation()
+        except ForeignKeyViolation as e:
+            raise Exception(f"Failed to create messages: {e}")
+    except Exception as wrapped:
+        assert database.is_permanent_error(wrapped)
+    assert not database.is_permanent_error(ConnectionError("db down"))
+    assert not database.is_permanent_error(asyncio.TimeoutError())
@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+
+from backend.app.core.onnx_embedder import cosine_agreement, mean_pool
+
+
+def test_mean_pool_ignores_padding():
+    token_embeddings = np.array([[[1.0, 2.0], [3.0, 4.0], [100.0, 100.0]]], dtype=np.float32)
+    attention_mask = np.array([[1, 1, 0]])
+    np.testing.assert_allclose(mean_pool(token_embeddings, attention_mask), [[2.0, 3.0]])
+
+
+def test_cosine_agreement_is_scale_invariant():
+    reference = np.array([[1.0, 0.0], [0.0, 2.0]], dtype=np.float32)
+    candidate = np.array([[3.0, 0.0], [2.0, 0.0]], dtype=np.float32)
+    np.testing.assert_allclose(cosine_agreement(reference, candidate), [1.0, 0.0], atol=1e-6)
+
+
+@pytest.mark.parametrize("backend", ["onnx", "onnx-int8", "torch-int8"])
+def test_backends_agree_with_torch(backend):
+    pytest.importorskip("sentence_transformers")
+    if backend.startswith("onnx"):
+        pytest.importorskip("onnxruntime")
+    from backend.app.core.embeddings import PARITY_THRESHOLD, check_parity
+
+    assert check_parity(backend).min() >= PARITY_THRESHOLD
@@ -0,0 +1,77 @@
+import sys
+import time
+
+from PyPDF2 import PdfWriter
+
+from backend.app.db.chunked_docs import TokenChunker, approximate_token_count, is_heading
+from backend.app.services import pdf_extraction
+
+
+def test_iter_pdf_pages_keeps_page_order_across_workers(tmp_path, monkeypatch):
+    writer = PdfWriter()
+    for _ in range(7):
+        writer.add_blank_page(width=72, height=72)
+    path = tmp_path / "blank.pdf"
+    with open(path, "wb") as f:
+        writer.write(f)
+
+    monkeypatch.setattr(pdf_extraction, "PDF_PROCESSES", 2)
+    monkeypatch.setattr(pdf_extraction, "PDF_PAGES_PER_TASK", 2)
+    monkeypatch.setattr(pdf_extraction, "PDF_PREFETCH_TASKS", 2)
+    try:
+        pages = list(pdf_extraction.iter_pdf_pages(str(path)))
+    finally:
+        pdf_extraction.shutdown()
+    assert [number for number, _ in pages] == list(range(1, 8))
+
+
+def test_token_chunker_respects_budget_headings_and_provenance():
+    body = " ".join(f"Sentence {i} of the body text." for i in range(80))
+    pages = ["1. Introduction\nShort opening paragraph. It ends here.\n\nSECTION TWO\n" + body,
+             "Closing words on the second page."]
+    chunker = TokenChunker(max_tokens=60, overlap_tokens=15)
+    chunks = chunker.feed(1, pages[0]) + chunker.feed(2, pages[1]) + chunker.finish()
+
+    assert all(count <= 60 for count in approximate_token_count([c.text for c in chunks]))
+    assert chunks[0].text == "1. Introduction Short opening paragraph. It ends here."
+    assert chunks[1].text.startswith("SECTION TWO Sentence 0")
+    # Neighbouring chunks of a section share whole sentences
+    assert chunks[2].text.split(". ")[0] + "." in chunks[1].text
+    assert chunks[-1].page_start == 2 and chunks[-1].text == "Closing words on the second page."
+
+
+def test_wrapped_prose_is_not_a_heading():
+    for line in ("part of the contract that covers", "10 employees were hired in", "section of the year where",
+                 "Section A of the agreement applies to", "Chapter 3 was the hardest"):
+        assert not is_heading(line), line
+    for line in ("# Overview", "2.3 Terms and definitions", "IV. Results", "PART II", "Appendix A",
+                 "Section 4: Scope of Work", "CHAPTER 1"):
+        assert is_heading(line), line
+
+    text = ("The agreement was signed in May and\npart of the contract covers support,\n"
+            "10 employees were assigned to it. The\nsection of the year after was quiet.")
+    chunker = TokenChunker(max_tokens=200)
+    assert len(chunker.feed(1, text) + chunker.finish()) == 1
+
+
+def test_heading_runs_stay_with_their_body():
+    chunker = TokenChunker(max_tokens=60)
+    chunks = chunker.feed(1, "Closing line of the preface.\nCHAPTER 1\nTHE BEGINNING\nIt was a quiet start.") \
+        + chunker.finish()
+    assert [c.text for c in chunks] == ["Closing line of the preface.",
+                                        "CHAPTER 1 THE BEGINNING It was a quiet start."]
+
+
+if __name__ == "__main__":
+    # python -m tests.test_pdf_extraction file.pdf: chunking throughput on a real PDF
+    from backend.app.db.chunked_docs import load_token_counter
+    from backend.app.db.faiss_client import EMBEDDING_MODEL
+
+    pages = list(pdf_extraction.iter_pdf_pages(sys.argv[1]))
+    pdf_extraction.shutdown()
+    chunker = TokenChunker(token_counter=load_token_counter(EMBEDDING_MODEL))
+    start = time.perf_counter()
+    chunks = [chunk for number, text in pages for chunk in chunker.feed(number, text)] + chunker.finish()
+    elapsed = time.perf_counter() - start
+    print(f"tokens 200/32: {len(chunks)} chunks from {len(pages)} pages in {elapsed:.3f}s, "
+          f"{len(chunks) / elapsed:.0f} chunks/s, {len(pages) / elapsed:.0f} pages/s")
@@ -0,0 +1,16 @@
+import pytest
+
+from backend.app.services.rag_service import parse_sse_line
+
+
+def test_parse_sse_line():
+    assert parse_sse_line(": OPENROUTER PROCESSING") is None
+    assert parse_sse_line("") is None
+    assert parse_sse_line('data: {"choices": [{"delta": {"content": "Hel"}}]}') == "Hel"
+    assert parse_sse_line('data: {"choices": [{"delta": {}, "finish_reason": "stop"}]}') is None
+    assert parse_sse_line("data: [DONE]") is False
+
+
+def test_parse_sse_line_error():
+    with pytest.raises(RuntimeError):
+        parse_sse_line('data: {"error": {"message": "rate limited"}}')
@@ -0,0 +1,39 @@
+import time
+import asyncio
+
+import numpy as np
+import pytest
+
+from backend.app.core.reranker import CrossEncoderReranker, adaptive_cutoff
+
+
+def test_adaptive_cutoff_threshold_and_knee():
+    scores = np.array([0.2, 0.95, 0.9, 0.01, 0.85], dtype=np.float32)
+    # 0.01 is below the threshold, and the knee between 0.85 and 0.2 ends the context
+    assert adaptive_cutoff(scores, max_keep=5, min_score=0.05, knee_gap=0.3).tolist() == [1, 2, 4]
+    assert adaptive_cutoff(scores, max_keep=2, min_score=0.05, knee_gap=0.3).tolist() == [1, 2]
+    # Nothing relevant still leaves min_keep chunks
+    assert adaptive_cutoff(np.array([0.01, 0.02]), max_keep=5, min_score=0.5, min_keep=1).tolist() == [1]
+
+
+@pytest.mark.asyncio
+async def test_rerank_scores_in_pool():
+    reranker = CrossEncoderReranker(score_fn=lambda pairs: [len(text) for _, text in pairs], enabled=True)
+    scores = await reranker.rerank("q", ["a", "abc", "ab"])
+    assert scores.tolist() == [1.0, 3.0, 2.0]
+    await reranker.close()
+
+
+@pytest.mark.asyncio
+async def test_rerank_bypassed_on_timeout_and_saturation():
+    def slow(pairs):
+        time.sleep(0.2)
+        return [1.0] * len(pairs)
+
+    reranker = CrossEncoderReranker(score_fn=slow, enabled=True, timeout_ms=20, max_pending=1)
+    assert await reranker.rerank("q", ["a"]) is None
+    # The timed out batch still holds the only slot
+    assert await reranker.rerank("q", ["a"]) is None
+    await asyncio.sleep(0.3)
+    assert reranker._pending == 0
+    await reranker.close()
@@ -0,0 +1,43 @@
+import os
+import sys
+import json
+import time
+import statistics
+import subprocess
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+HEAVY_MODULES = ["torch", "sentence_transformers", "onnxruntime", "sympy"]
+
+PROBE = (
+    "import sys, time; start = time.perf_counter(); import backend.app.main; "
+    "elapsed = time.perf_counter() - start; import json; "
+    f"print(json.dumps({{'seconds': elapsed, 'loaded': [m for m in {HEAVY_MODULES!r} if m in sys.modules]}}))"
+)
+
+
+def cold_import():
+    """Imports the app in a fresh interpreter, returns (seconds, heavy modules it loaded)."""
+    env = {**os.environ, "WARM_UP_ON_START": "false"}
+    output = subprocess.run([sys.executable, "-c", PROBE], cwd=ROOT, env=env, check=True,
+                            capture_output=True, text=True).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    return result["seconds"], result["loaded"]
+
+
+def test_importing_the_app_loads_no_model_or_sympy():
+    _, loaded = cold_import()
+    assert loaded == []
+
+
+if __name__ == "__main__":
+    # python -m tests.test_startup [runs]: cold start benchmark, track it across changes
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    timings = [cold_import()[0] for _ in range(runs)]
+    print(f"import backend.app.main: median {statistics.median(timings):.3f}s, "
+          f"min {min(timings):.3f}s over {runs} runs")
+
+    from backend.app.main import warm_up
+    start = time.perf_counter()
+    warm_up()
+    print(f"warm up (index + model + first forward pass): {time.perf_counter() - start:.3f}s")
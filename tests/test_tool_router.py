@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from backend.app.tools.router import Tool, ToolRouter, build_router
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("query, route", [
+    ("2 * (3 + 4)", "math"),
+    ("what is 15 % 4?", "math"),
+    ("solve x^2 - 4 = 0", "math"),
+    ("derivative of x^3", "math"),
+    ("sin(30 degrees)", "math"),
+    ("how many days between 2024-01-01 and 2024-03-01", "date"),
+    # Document questions the old keyword scan sent to sympy
+    ("what is the root cause of the outage?", None),
+    ("what angle does the report take on costs?", None),
+    ("is there a single solution using the import data?", None),
+    ("what happened in 2024?", None),
+])
+async def test_patterns_route_only_tool_queries(query, route):
+    tool, matcher = await build_router().route(query)
+    assert (tool.name if tool else None) == route
+    assert matcher == ("pattern" if route else None)
+
+
+@pytest.mark.asyncio
+async def test_dispatch_answers_and_falls_through():
+    router = build_router()
+    assert await router.dispatch("calculate 6 * 7") == "42"
+    assert await router.dispatch("days between 2024-01-01 and 2024-01-31") is not None
+    assert await router.dispatch("summarize the uploaded contract") is None
+
+
+@pytest.mark.asyncio
+async def test_intent_classifier_routes_by_example_similarity():
+    vectors = {"convert units": np.array([1.0, 0.0]), "how many metres in a mile": np.array([0.9, 0.1]),
+               "who signed the lease": np.array([0.0, 1.0])}
+
+    async def embed(text):
+        return vectors[text]
+
+    router = ToolRouter(embed_fn=embed, use_classifier=True, threshold=0.8)
+    router.register(Tool("units", lambda query: "1609 m", [], examples=["convert units"]))
+    assert await router.dispatch("how many metres in a mile") == "1609 m"
+    assert await router.dispatch("who signed the lease") is None
+
+    # Without a loaded model the classifier is skipped rather than loading it
+    router.ready = lambda: False
+    assert await router.dispatch("how many metres in a mile") is None
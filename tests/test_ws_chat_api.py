@@ -1,22 +1,28 @@
 import pytest
 from fastapi.testclient import TestClient
 from backend.app.main import app
+from backend.app.api.ws_chat import INCOMPLETE_NOTE
 from unittest.mock import AsyncMock, patch
 
 client = TestClient(app)
 
 @patch("backend.app.api.ws_chat.get_session", new_callable=AsyncMock)
 @patch("backend.app.api.ws_chat.create_session", new_callable=AsyncMock)
-@patch("backend.app.api.ws_chat.get_messages_by_session", new_callable=AsyncMock)
-@patch("backend.app.api.ws_chat.create_message", new_callable=AsyncMock)
-@patch("backend.app.api.ws_chat.rag_answer", new_callable=AsyncMock)
-def test_websocket_chat(mock_rag_answer, mock_create_message, mock_get_messages, mock_create_session, mock_get_session):
+@patch("backend.app.api.ws_chat.get_messages_page", new_callable=AsyncMock)
+@patch("backend.app.api.ws_chat.enqueue_message", new_callable=AsyncMock)
+@patch("backend.app.api.ws_chat.rag_answer_stream")
+def test_websocket_chat(mock_rag_answer_stream, mock_enqueue_message, mock_get_messages, mock_create_session, mock_get_session):
     session_id = "test-session"
     mock_get_session.return_value = {"id": session_id}
     mock_create_session.return_value = session_id
-    mock_get_messages.return_value = [{"role": "user", "content": "hi"}]
-    mock_create_message.return_value = None
-    mock_rag_answer.return_value = "response"
+    mock_get_messages.return_value = ([{"id": "m1", "role": "user", "content": "hi"}], None)
+    mock_enqueue_message.return_value = "message-id"
+
+    async def fake_stream(query, session_id=None):
+        yield "resp"
+        yield "onse"
+
+    mock_rag_answer_stream.side_effect = fake_stream
 
     with client.websocket_connect(f"/ws/chat?session_id={session_id}") as websocket:
         data = websocket.receive_json()
@@ -27,7 +33,41 @@ def test_websocket_chat(mock_rag_answer, mock_create_message, mock_get_messages,
         assert data["type"] == "history"
         assert len(data["messages"]) > 0
 
-        websocket.send_json({"query": "hello"})
+        websocket.send_json({"type": "query", "query": "hello"})
+        deltas = [websocket.receive_json(), websocket.receive_json()]
+        assert [d["type"] for d in deltas] == ["assistant_delta", "assistant_delta"]
+        assert "".join(d["content"] for d in deltas) == "response"
+
+        response = websocket.receive_json()
+        assert response["type"] == "assistant_message"
+        assert response["content"] == "response"
+        assert response["streamed"] is True
+        mock_enqueue_message.assert_any_await(session_id=session_id, content="response", role="assistant")
+
+@patch("backend.app.api.ws_chat.get_session", new_callable=AsyncMock)
+@patch("backend.app.api.ws_chat.get_messages_page", new_callable=AsyncMock)
+@patch("backend.app.api.ws_chat.enqueue_message", new_callable=AsyncMock)
+@patch("backend.app.api.ws_chat.rag_answer_stream")
+def test_websocket_chat_marks_broken_stream(mock_rag_answer_stream, mock_enqueue_message, mock_get_messages, mock_get_session):
+    session_id = "test-session"
+    mock_get_session.return_value = {"id": session_id}
+    mock_get_messages.return_value = ([], None)
+
+    async def broken_stream(query, session_id=None):
+        yield "partial"
+        raise RuntimeError("connection reset")
+
+    mock_rag_answer_stream.side_effect = broken_stream
+
+    with client.websocket_connect(f"/ws/chat?session_id={session_id}") as websocket:
+        websocket.receive_json()
+        websocket.receive_json()
+        websocket.send_json({"type": "query", "query": "hello"})
+        assert websocket.receive_json()["content"] == "partial"
+
         response = websocket.receive_json()
         assert response["type"] == "assistant_message"
-        assert "response" in response["content"]
+        assert response["incomplete"] is True
+        assert response["content"] == "partial" + INCOMPLETE_NOTE
+        mock_enqueue_message.assert_any_await(session_id=session_id, content="partial" + INCOMPLETE_NOTE,
+                                              role="assistant")